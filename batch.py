@@ -0,0 +1,194 @@
+# batch.py
+"""
+Headless batch mode: scrapes, summarizes, spins and reviews a range of chapters without an
+editor present, stores the results as the chapters' v0 original / v1 spin / v1 review in
+ChromaDB and adds them to the ready queue, so a HITL session can start straight away.
+
+    python batch.py The_Gates_of_Morning --book 1 --chapters 1-12 --concurrency 2
+"""
+import argparse
+import asyncio
+import datetime
+import json
+import os
+import time
+
+import chapter_state
+import chroma_writer
+import config
+import embedding_cache
+import llm_cache
+import llm_resilience
+import llm_scheduler
+import pipeline
+import review
+import scrape
+import search
+import spin_write
+import version_store
+
+logger = config.logger
+
+
+def load_ready_queue(path: str = None) -> list:
+    """Returns the prepared chapters waiting for an editor, oldest first."""
+    path = path or config.READY_QUEUE_PATH
+    if not os.path.exists(path):
+        return []
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (json.JSONDecodeError, OSError) as e:
+        logger.warning(f"  [Batch] Could not read ready queue {path}: {e}")
+        return []
+
+def save_ready_queue(entries: list, path: str = None):
+    path = path or config.READY_QUEUE_PATH
+    tmp_path = path + ".tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(entries, f, indent=4)
+    os.replace(tmp_path, path)
+
+def add_to_ready_queue(entry: dict, path: str = None):
+    """Adds (or replaces) the entry for a chapter."""
+    entries = [e for e in load_ready_queue(path) if e["chapter_id"] != entry["chapter_id"]]
+    entries.append(entry)
+    save_ready_queue(entries, path)
+
+def remove_from_ready_queue(chapter_id: str, path: str = None):
+    save_ready_queue([e for e in load_ready_queue(path) if e["chapter_id"] != chapter_id], path)
+
+
+def parse_chapter_range(text: str) -> list:
+    """'3' -> [3]; '1-12' -> [1, ..., 12]."""
+    first, _, last = text.partition("-")
+    first = int(first)
+    last = int(last) if last else first
+    if last < first:
+        raise argparse.ArgumentTypeError(f"empty chapter range: {text}")
+    return list(range(first, last + 1))
+
+
+def store_chapter(collection, chapter: dict, book_title: str):
+    """
+    Writes the chapter's original, spin and review to ChromaDB under the ids the HITL
+    workflow uses, and its spin and review to the files the workflow loads.
+    """
+    chapter_base_id = f"{book_title.replace(' ', '_')}_Book{chapter['book_num']}_Chapter{chapter['chap_num']}"
+    original_path, spun_path, review_path = scrape.chapter_file_paths(
+        chapter['book_name_slug'], chapter['book_num'], chapter['chap_num'])
+    timestamp = datetime.datetime.now().isoformat()
+    common = {"book_title": book_title, "book_num": chapter["book_num"], "chapter_num": chapter["chap_num"],
+              "timestamp": timestamp}
+
+    documents = [chapter["text"], chapter["spun_text"], chapter["review_text"]]
+    metadatas = [
+        {**common, "version": 0, "type": "original", "source_file": original_path},
+        {**common, "version": 1, "type": "ai_spin", "model_used": spin_write.spin_write_model,
+         "prompt_template_name": chapter["prompt_name"]},
+        {**common, "version": 1, "type": "ai_review", "model_used": review.review_model,
+         "reviewed_version_id": f"{chapter_base_id}_v1_ai_spin"},
+    ]
+    ids = [f"{chapter_base_id}_v0_original", f"{chapter_base_id}_v1_ai_spin", f"{chapter_base_id}_v1_ai_review"]
+    # Through the write buffer, so the versions reach the version store and only the
+    # searchable ones are embedded
+    writes = chroma_writer.get_write_buffer(collection)
+    writes.add(documents=documents, metadatas=metadatas, ids=ids)
+    writes.flush()
+    head_index = chapter_state.get_head_index()
+    head_index.on_flush(ids, documents, metadatas)
+    head_index.set_summary(chapter_base_id, chapter["summary"])
+    with open(spun_path, 'w', encoding='utf-8') as f:
+        f.write(chapter["spun_text"])
+    with open(review_path, 'w', encoding='utf-8') as f:
+        f.write(chapter["review_text"])
+
+    add_to_ready_queue({
+        "chapter_id": chapter_base_id,
+        "book_name_slug": chapter["book_name_slug"],
+        "book_title": book_title,
+        "book_num": chapter["book_num"],
+        "chapter_num": chapter["chap_num"],
+        "title": chapter["title"],
+        "original_path": original_path,
+        "spun_path": spun_path,
+        "review_path": review_path,
+        "prompt_name": chapter["prompt_name"],
+        "prepared_at": timestamp,
+    })
+
+
+async def run_batch(book_name_slug: str, book_num: int, chap_nums: list, concurrency: int = None,
+                    queue_size: int = None, force: bool = False) -> dict:
+    """Prepares the chapters and returns counts of prepared, skipped and failed chapters."""
+    import chromadb # Imported here so that importing this module (as intervention.py does) stays cheap
+    book_title = book_name_slug.replace('_', ' ')
+    chroma_client = chromadb.PersistentClient(path=config.CHROMA_DB_PATH)
+    collection = chroma_client.get_or_create_collection(
+        name=config.CHROMA_COLLECTION_NAME, embedding_function=embedding_cache.get_embedding_function())
+    # Prepared originals are chunked for search as they are stored
+    search_index = search.get_search_index(chroma_client, collection, chroma_writer.get_write_buffer(collection))
+
+    if not force:
+        # Chapters that already have a v1 spin were prepared before (or are being edited)
+        ids = [f"{book_name_slug}_Book{book_num}_Chapter{c}_v1_ai_spin" for c in chap_nums]
+        existing = set(version_store.get_version_store().stored_ids(ids)) | set(collection.get(ids=ids, include=[])['ids'])
+        todo = [c for c, doc_id in zip(chap_nums, ids) if doc_id not in existing]
+    else:
+        todo = list(chap_nums)
+    counts = {"prepared": 0, "skipped": len(chap_nums) - len(todo), "failed": 0}
+    if counts["skipped"]:
+        print(f"[Batch] Skipping {counts['skipped']} chapters that are already prepared (use --force to redo them).")
+
+    async def on_result(chapter):
+        if chapter.get("spun_text") is None or chapter.get("review_text") is None:
+            counts["failed"] += 1
+            print(f"[Batch] Book {chapter['book_num']} Chapter {chapter['chap_num']}: failed, not queued.")
+            return
+        store_chapter(collection, chapter, book_title)
+        counts["prepared"] += 1
+        print(f"[Batch] Book {chapter['book_num']} Chapter {chapter['chap_num']}: ready ({chapter['prompt_name']}).")
+
+    spin_writer = spin_write.SpinWrite()
+    reviewer = review.Review()
+    batch_pipeline = pipeline.ChapterPipeline(spin_writer, reviewer, queue_size=queue_size,
+                                              workers=concurrency, on_result=on_result)
+    start = time.perf_counter()
+    try:
+        await batch_pipeline.run(pipeline.chapter_range(book_name_slug, book_num, todo))
+    finally:
+        await scrape.close_scraper()
+
+    print(f"\n[Batch] {counts['prepared']} prepared, {counts['skipped']} skipped, {counts['failed']} failed "
+          f"in {time.perf_counter() - start:.1f}s")
+    print(batch_pipeline.summary())
+    print(f"ChromaDB writes: {chroma_writer.write_buffer_summary()}")
+    print(f"Version store: {version_store.get_version_store().summary()}")
+    print(f"Search index: {search_index.summary()}")
+    print(f"Embedding cache: {embedding_cache.embedding_cache_summary()}")
+    if config.LLM_CACHE_ENABLED:
+        print(f"LLM response cache: {llm_cache.get_llm_cache().summary()}")
+    if config.LLM_SCHEDULER_ENABLED:
+        print(f"LLM scheduler: {llm_scheduler.get_scheduler().summary()}")
+    if config.LLM_RESILIENCE_ENABLED:
+        clients = [spin_writer.client, spin_writer.summarize_client, reviewer.client]
+        print(f"LLM resilience: {llm_resilience.resilience_summary(clients)}")
+    return counts
+
+async def main():
+    parser = argparse.ArgumentParser(description="Pre-spin and pre-review a range of chapters without an editor.")
+    parser.add_argument("book_name_slug", help="Wikisource book slug, e.g. The_Gates_of_Morning")
+    parser.add_argument("--book", type=int, default=1, help="Book number (default 1)")
+    parser.add_argument("--chapters", type=parse_chapter_range, required=True, help="Chapter or range, e.g. 4 or 1-12")
+    parser.add_argument("--concurrency", type=int, default=None,
+                        help=f"Chapters each LLM stage works on at once (default {config.PIPELINE_STAGE_WORKERS})")
+    parser.add_argument("--queue-size", type=int, default=None,
+                        help=f"Chapters buffered between stages (default {config.PIPELINE_QUEUE_SIZE})")
+    parser.add_argument("--force", action="store_true", help="Redo chapters that already have a v1 spin")
+    args = parser.parse_args()
+
+    await run_batch(args.book_name_slug, args.book, args.chapters, args.concurrency, args.queue_size, args.force)
+
+if __name__ == "__main__":
+    config.setup_logging()
+    asyncio.run(main())
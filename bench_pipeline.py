@@ -0,0 +1,67 @@
+# bench_pipeline.py
+"""
+Measures spin/review pipeline throughput against the fake LLM backend, so it runs offline.
+
+    python bench_pipeline.py --chapters 20 --concurrency 1 4 16 --latency 0.5 --error-rate 0.05
+"""
+import argparse
+import asyncio
+import contextlib
+import io
+import time
+
+import config
+import llm_client
+import spin_write
+import review
+
+
+def make_chapter(index: int, paragraphs: int = 40) -> str:
+    return "\n\n".join(
+        f"Chapter {index}, paragraph {p}: the ship rode the long swell toward the island." for p in range(paragraphs)
+    )
+
+async def process_chapter(spin_writer, reviewer, chapter_text: str) -> bool:
+    """Runs the same LLM steps as a fresh HITL session: summarize, spin, review."""
+    await spin_writer.ai_summarize(chapter_text)
+    spun_text, _ = await spin_writer.ai_spin_content(chapter_text, None)
+    review_text = await reviewer.ai_review_content(spun_text)
+    return not spin_write.spin_failed(spun_text) and not review.review_failed(review_text)
+
+async def run_benchmark(chapters: int, concurrency: int, latency: float, jitter: float, error_rate: float):
+    def fake(model_name):
+        return llm_client.FakeLLMClient(model_name, latency_s=latency, jitter_s=jitter, error_rate=error_rate)
+
+    spin_writer = spin_write.SpinWrite(client=fake(spin_write.spin_write_model),
+                                       summarize_client=fake(spin_write.summarize_model))
+    reviewer = review.Review(client=fake(review.review_model))
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def bounded(index):
+        async with semaphore:
+            return await process_chapter(spin_writer, reviewer, make_chapter(index))
+
+    start = time.perf_counter()
+    # The model classes print progress for every call; keep the benchmark output readable.
+    with contextlib.redirect_stdout(io.StringIO()):
+        outcomes = await asyncio.gather(*(bounded(i) for i in range(chapters)))
+    elapsed = time.perf_counter() - start
+    succeeded = sum(outcomes)
+    print(f"concurrency={concurrency:<4} chapters={chapters:<4} elapsed={elapsed:7.2f}s "
+          f"throughput={chapters / elapsed:6.2f} chapters/s ok={succeeded} failed={chapters - succeeded}")
+
+async def main():
+    parser = argparse.ArgumentParser(description="Benchmark summarize/spin/review throughput on the fake LLM backend.")
+    parser.add_argument("--chapters", type=int, default=20)
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 4, 16])
+    parser.add_argument("--latency", type=float, default=0.5, help="Mean fake call latency in seconds")
+    parser.add_argument("--jitter", type=float, default=0.1, help="Uniform +/- jitter in seconds")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Probability that a fake call fails")
+    args = parser.parse_args()
+
+    for concurrency in args.concurrency:
+        await run_benchmark(args.chapters, concurrency, args.latency, args.jitter, args.error_rate)
+
+if __name__ == "__main__":
+    config.setup_logging()
+    asyncio.run(main())
@@ -0,0 +1,68 @@
+# bench_startup.py
+"""
+Measures cold import time of the app's modules, each in a fresh interpreter, so startup
+regressions (a heavy import or client built at module level) show up in numbers.
+
+    python bench_startup.py --runs 5 --budget 1.5 --top 10
+"""
+import argparse
+import statistics
+import subprocess
+import sys
+
+DEFAULT_MODULES = ["config", "llm_client", "spin_write", "review", "scrape", "pipeline", "batch", "intervention"]
+
+IMPORT_SNIPPET = "import time; t = time.perf_counter(); import {module}; print(time.perf_counter() - t)"
+
+
+def time_import(module: str) -> float:
+    """Seconds to import module in a new interpreter, as measured inside it."""
+    result = subprocess.run([sys.executable, "-c", IMPORT_SNIPPET.format(module=module)],
+                            capture_output=True, text=True)
+    if result.returncode != 0:
+        raise RuntimeError(f"importing {module} failed:\n{result.stderr.strip()}")
+    return float(result.stdout.strip().splitlines()[-1])
+
+def slowest_imports(module: str, top: int) -> list:
+    """The `top` slowest imports (cumulative microseconds, name) from python -X importtime."""
+    result = subprocess.run([sys.executable, "-X", "importtime", "-c", f"import {module}"],
+                            capture_output=True, text=True)
+    rows = []
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:"):
+            continue
+        _, cumulative_us, name = (part.strip() for part in line.split(":", 1)[1].split("|"))
+        if cumulative_us.isdigit(): # Skips the header row
+            rows.append((int(cumulative_us), name))
+    return sorted(rows, reverse=True)[:top]
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark cold import time of the app's modules.")
+    parser.add_argument("modules", nargs="*", default=DEFAULT_MODULES)
+    parser.add_argument("--runs", type=int, default=5, help="Fresh interpreters per module")
+    parser.add_argument("--budget", type=float, default=None,
+                        help="Fail (exit 1) if any module's median import time exceeds this many seconds")
+    parser.add_argument("--top", type=int, default=0, help="Also list the N slowest imports behind each module")
+    args = parser.parse_args()
+
+    over_budget = []
+    for module in args.modules:
+        try:
+            times = [time_import(module) for _ in range(args.runs)]
+        except RuntimeError as e:
+            print(e)
+            over_budget.append(module)
+            continue
+        median = statistics.median(times)
+        print(f"{module:<14} median={median:6.3f}s min={min(times):6.3f}s max={max(times):6.3f}s")
+        if args.budget is not None and median > args.budget:
+            over_budget.append(module)
+        for cumulative_us, name in slowest_imports(module, args.top):
+            print(f"    {cumulative_us / 1e6:6.3f}s  {name}")
+
+    if over_budget:
+        print(f"Over budget or failing: {', '.join(over_budget)}")
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,217 @@
+# chapter_state.py
+import datetime
+import json
+import os
+import config
+import version_store
+
+logger = config.logger
+
+
+class ChapterState:
+    """
+    Every stored version of one chapter, read from the version store with a single indexed
+    query when the workflow starts, so later existence checks and reads of the original are
+    answered from memory instead of one round-trip each. The first time a chapter is loaded,
+    the versions ChromaDB holds for it from before the version store existed are copied in
+    (one metadata-filtered get), so they are neither lost nor written again.
+    """
+    def __init__(self, chapter_base_id: str, documents: dict = None):
+        self.chapter_base_id = chapter_base_id
+        self.documents = documents or {} # id -> (document, metadata)
+
+    @classmethod
+    def load(cls, collection, book_title: str, book_num: int, chapter_num: int) -> "ChapterState":
+        chapter_base_id = f"{book_title.replace(' ', '_')}_Book{book_num}_Chapter{chapter_num}"
+        store = version_store.get_version_store()
+        if not store.is_imported(chapter_base_id):
+            results = collection.get(
+                where={"$and": [{"book_title": book_title}, {"book_num": book_num}, {"chapter_num": chapter_num}]},
+                include=["documents", "metadatas"],
+            )
+            imported = store.import_chapter(chapter_base_id, {
+                doc_id: (document, metadata) for doc_id, document, metadata
+                in zip(results['ids'], results['documents'], results['metadatas'])})
+            if imported:
+                logger.info(f"  [Chapter State] Imported {imported} versions of {chapter_base_id} from ChromaDB")
+        documents = store.chapter_documents(chapter_base_id)
+        logger.info(f"  [Chapter State] Loaded {len(documents)} stored versions for {chapter_base_id}")
+        return cls(chapter_base_id, documents)
+
+    @classmethod
+    def fetch(cls, collection, chapter_base_id: str, ids: list) -> "ChapterState":
+        """Like load(), but reads only the given ids (e.g. a resumed chapter's head and its review)."""
+        ids = [doc_id for doc_id in ids if doc_id]
+        documents = version_store.get_version_store().get_many(ids)
+        missing = [doc_id for doc_id in ids if doc_id not in documents]
+        if missing:
+            results = collection.get(ids=missing, include=["documents", "metadatas"])
+            documents.update({doc_id: (document, metadata) for doc_id, document, metadata
+                              in zip(results['ids'], results['documents'], results['metadatas'])})
+        logger.info(f"  [Chapter State] Fetched {len(documents)} stored documents for {chapter_base_id}")
+        return cls(chapter_base_id, documents)
+
+    def has(self, doc_id: str) -> bool:
+        return doc_id in self.documents
+
+    def document(self, doc_id: str):
+        entry = self.documents.get(doc_id)
+        return entry[0] if entry else None
+
+    def metadata(self, doc_id: str) -> dict:
+        entry = self.documents.get(doc_id)
+        return entry[1] if entry else None
+
+    def latest_version(self) -> int:
+        """The highest version number stored for the chapter (0 if only the original, -1 if nothing)."""
+        versions = [int(match.group("version")) for match in map(VERSION_ID_PATTERN.match, self.documents) if match]
+        return max(versions, default=-1)
+
+    def session_start(self, spin_text: str) -> int:
+        """
+        The version a new (not resumed) session's opening spin takes: 1 for a chapter with
+        nothing past the original, the latest version again if it is an AI spin of exactly
+        this text (the same spin file opened again), otherwise the one after the latest, so
+        no stored version is replaced or stored twice.
+        """
+        latest = self.latest_version()
+        if latest < 1:
+            return 1
+        if self.document(f"{self.chapter_base_id}_v{latest}_ai_spin") == spin_text:
+            return latest
+        return latest + 1
+
+    @property
+    def original_id(self) -> str:
+        return f"{self.chapter_base_id}_v0_original"
+
+    @property
+    def original(self) -> str:
+        """The stored original text, kept in memory for the whole session."""
+        return self.document(self.original_id)
+
+    def ensure(self, writes, doc_id: str, document: str, metadata: dict) -> bool:
+        """
+        Queues the document on the write buffer unless the chapter already has it, so
+        stored versions (and metadata added to them later) are never overwritten.
+        Returns True if it was queued.
+        """
+        if self.has(doc_id):
+            return False
+        writes.add(documents=[document], metadatas=[metadata], ids=[doc_id])
+        self.documents[doc_id] = (document, metadata)
+        return True
+
+
+VERSION_ID_PATTERN = version_store.VERSION_ID_PATTERN
+HEAD_TYPES = ("original", "ai_spin", "human_edit", "final_version")
+REVIEW_TYPES = version_store.REVIEW_TYPES
+
+
+HEAD_INDEX_FORMAT = 2 # {"format", "rebuilt_at", "heads"}; format 1 was the bare heads dict
+
+
+class ChapterHeadIndex:
+    """
+    Small JSON index of each chapter's latest stored version ("head"): its id, type and
+    version number, the review of it, the prompt behind it, the editor and the chapter
+    summary. It is kept current from the write buffer's flushes, so resuming a chapter
+    needs no metadata scan: the head's ids are read back with one get.
+
+    rebuilt_at records when the index was last backfilled from every stored version; until
+    it is set, chapters written before the index existed may be missing.
+    """
+    def __init__(self, path: str = None):
+        self.path = path or config.CHAPTER_HEAD_INDEX_PATH
+        self.heads = {}
+        self.rebuilt_at = None
+        if os.path.exists(self.path):
+            try:
+                with open(self.path, 'r', encoding='utf-8') as f:
+                    data = json.load(f)
+                if data.get("format") == HEAD_INDEX_FORMAT:
+                    self.heads = data.get("heads", {})
+                    self.rebuilt_at = data.get("rebuilt_at")
+                else:
+                    self.heads = data # Format 1: heads only, never known to be rebuilt
+            except (json.JSONDecodeError, OSError) as e:
+                logger.warning(f"  [Chapter State] Could not read head index {self.path}: {e}")
+
+    def save(self):
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump({"format": HEAD_INDEX_FORMAT, "rebuilt_at": self.rebuilt_at, "heads": self.heads}, f, indent=4)
+        os.replace(tmp_path, self.path)
+
+    def head(self, chapter_base_id: str) -> dict:
+        return self.heads.get(chapter_base_id)
+
+    def resumable(self) -> list:
+        """Chapters with at least one version past the original that are not finalized, newest first."""
+        heads = [h for h in self.heads.values() if h.get("version", 0) > 0 and h.get("type") != "final_version"]
+        return sorted(heads, key=lambda h: h.get("updated_at", ""), reverse=True)
+
+    def set_summary(self, chapter_base_id: str, summary: str):
+        """Keeps the chapter summary with its head, so a resumed session does not summarize again."""
+        head = self.heads.setdefault(chapter_base_id, {"chapter_base_id": chapter_base_id, "version": -1})
+        if head.get("summary") != summary:
+            head["summary"] = summary
+            self.save()
+
+    def on_flush(self, ids: list, documents: list, metadatas: list):
+        """Write-buffer flush listener: moves heads forward for the versions just written."""
+        changed = False
+        for doc_id, metadata in zip(ids, metadatas):
+            match = VERSION_ID_PATTERN.match(doc_id)
+            doc_type = metadata.get("type")
+            if not match or doc_type not in HEAD_TYPES + REVIEW_TYPES:
+                continue
+            chapter_base_id = match.group("chapter")
+            version = int(metadata.get("version", match.group("version")))
+            head = self.heads.setdefault(chapter_base_id, {"chapter_base_id": chapter_base_id, "version": -1})
+            for key in ("book_title", "book_num", "chapter_num"):
+                head.setdefault(key, metadata.get(key))
+            if doc_type in HEAD_TYPES and version >= head["version"]:
+                head.update({
+                    "version": version,
+                    "type": doc_type,
+                    "doc_id": doc_id,
+                    "review_id": None,
+                    "prompt_name": metadata.get("prompt_template_name")
+                                   or metadata.get("prompt_used_for_spin_before_edit")
+                                   or metadata.get("prompt_used_for_spin_before_finalize")
+                                   or head.get("prompt_name"),
+                    "editor": metadata.get("editor", head.get("editor")),
+                })
+            elif doc_type in REVIEW_TYPES and version == head["version"]:
+                head["review_id"] = doc_id
+            else:
+                continue
+            if doc_type == "original":
+                head["original_id"] = doc_id
+            head.setdefault("original_id", f"{chapter_base_id}_v0_original")
+            head["updated_at"] = metadata.get("timestamp", "")
+            changed = True
+        if changed:
+            self.save()
+
+    def rebuild(self, collection):
+        """One-off backfill from every stored version, for chapters written before the index existed."""
+        results = collection.get(include=["metadatas"])
+        stored = version_store.get_version_store().all_metadata()
+        rows = sorted(list(zip(results['ids'], results['metadatas'])) + stored,
+                      key=lambda row: (row[1].get("version", 0), row[1].get("type") in REVIEW_TYPES))
+        self.on_flush([doc_id for doc_id, _ in rows], None, [metadata for _, metadata in rows])
+        self.rebuilt_at = datetime.datetime.now().isoformat()
+        self.save()
+        logger.info(f"  [Chapter State] Rebuilt head index for {len(self.heads)} chapters")
+
+
+_head_index = None
+
+def get_head_index() -> ChapterHeadIndex:
+    """Returns the process-wide chapter head index."""
+    global _head_index
+    if _head_index is None:
+        _head_index = ChapterHeadIndex()
+    return _head_index
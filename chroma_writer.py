@@ -0,0 +1,160 @@
+# chroma_writer.py
+import asyncio
+import atexit
+import time
+import config
+import version_store
+
+logger = config.logger
+
+
+class WriteBehindBuffer:
+    """
+    Collects version documents for a ChromaDB collection and writes them in batches.
+
+    add() takes the same documents/metadatas/ids lists as collection.add() but only records
+    them; a later write to the same id replaces the pending one. flush() sends everything
+    pending to the version store, and the searchable ones (config.SEARCHABLE_VERSION_TYPES)
+    to ChromaDB as a single upsert, so embeddings are computed and persisted once per batch
+    and only for versions worth searching.
+    Flushes happen when asked (the workflow flushes at every iteration boundary and before
+    reads), once max_pending documents are waiting, every flush_interval_s seconds while an
+    event loop is running, and at interpreter exit.
+
+    Listeners registered with add_flush_listener(fn) are called as fn(ids, documents,
+    metadatas) after every successful flush, and after a metadata update of a stored
+    document (with its full merged metadata), e.g. to keep derived indexes in sync.
+    """
+    def __init__(self, collection, flush_interval_s: float = None, max_pending: int = None):
+        self.collection = collection
+        self.flush_interval_s = config.CHROMA_FLUSH_INTERVAL_S if flush_interval_s is None else flush_interval_s
+        self.max_pending = config.CHROMA_MAX_PENDING if max_pending is None else max_pending
+        self._pending = {} # id -> (document, metadata), in insertion order
+        self._listeners = []
+        self._timer = None
+        self.stats = {"adds": 0, "deduped": 0, "flushes": 0, "documents": 0, "max_batch": 0,
+                      "flush_s": 0.0, "max_flush_s": 0.0, "errors": 0, "embedded": 0}
+        atexit.register(self.flush)
+
+    def add(self, documents: list, metadatas: list, ids: list):
+        for doc_id, document, metadata in zip(ids, documents, metadatas):
+            if doc_id in self._pending:
+                self.stats["deduped"] += 1
+                del self._pending[doc_id] # Re-inserted below so flush order follows the latest write
+            self._pending[doc_id] = (document, dict(metadata))
+            self.stats["adds"] += 1
+        self._start_timer()
+        if len(self._pending) >= self.max_pending:
+            self.flush()
+
+    upsert = add
+
+    def update_metadata(self, doc_id: str, metadata: dict):
+        """Merges metadata into a document, whether it is still pending or already stored."""
+        if doc_id in self._pending:
+            document, pending_metadata = self._pending[doc_id]
+            pending_metadata.update(metadata)
+            return
+        store = version_store.get_version_store()
+        merged = store.update_metadata(doc_id, metadata)
+        if merged is None or version_store.is_searchable(merged):
+            # Searchable, or stored before the version store existed
+            self.collection.update(ids=[doc_id], metadatas=[metadata])
+        if merged is not None:
+            document = store.get(doc_id)[0]
+        else:
+            found = self.collection.get(ids=[doc_id], include=["documents", "metadatas"])
+            if not found['ids']:
+                return
+            document, merged = found['documents'][0], found['metadatas'][0]
+        # Derived indexes and cached results hold the old metadata
+        self._notify([doc_id], [document], [merged])
+
+    def pending(self, doc_id: str):
+        """The pending (document, metadata) for doc_id, or None if nothing is waiting for it."""
+        return self._pending.get(doc_id)
+
+    def add_flush_listener(self, listener):
+        self._listeners.append(listener)
+
+    def flush(self) -> int:
+        """Writes all pending documents, the searchable ones in one upsert. Returns how many were written."""
+        if not self._pending:
+            return 0
+        ids = list(self._pending)
+        documents = [self._pending[doc_id][0] for doc_id in ids]
+        metadatas = [self._pending[doc_id][1] for doc_id in ids]
+        searchable = [i for i, metadata in enumerate(metadatas) if version_store.is_searchable(metadata)]
+        start = time.perf_counter()
+        try:
+            version_store.get_version_store().put_many(ids, documents, metadatas)
+            if searchable:
+                self.collection.upsert(ids=[ids[i] for i in searchable],
+                                       documents=[documents[i] for i in searchable],
+                                       metadatas=[metadatas[i] for i in searchable])
+        except Exception as e:
+            # Keep everything pending; the next flush retries it
+            self.stats["errors"] += 1
+            logger.error(f"  [Chroma Writer] Flush of {len(ids)} documents failed: {e}")
+            return 0
+        elapsed = time.perf_counter() - start
+        for doc_id in ids:
+            del self._pending[doc_id]
+        self.stats["flushes"] += 1
+        self.stats["documents"] += len(ids)
+        self.stats["embedded"] += len(searchable)
+        self.stats["max_batch"] = max(self.stats["max_batch"], len(ids))
+        self.stats["flush_s"] += elapsed
+        self.stats["max_flush_s"] = max(self.stats["max_flush_s"], elapsed)
+        logger.info(f"  [Chroma Writer] Flushed {len(ids)} documents in {elapsed:.2f}s")
+        self._notify(ids, documents, metadatas)
+        return len(ids)
+
+    def _notify(self, ids: list, documents: list, metadatas: list):
+        for listener in self._listeners:
+            try:
+                listener(ids, documents, metadatas)
+            except Exception as e:
+                logger.error(f"  [Chroma Writer] Flush listener {listener!r} failed: {e}")
+
+    def _start_timer(self):
+        if self._timer is not None and not self._timer.done():
+            return
+        if not self.flush_interval_s:
+            return
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            return # No event loop; rely on explicit and exit flushes
+        self._timer = loop.create_task(self._flush_periodically())
+
+    async def _flush_periodically(self):
+        while self._pending:
+            await asyncio.sleep(self.flush_interval_s)
+            self.flush()
+
+    def summary(self) -> str:
+        flushes = self.stats["flushes"]
+        avg_batch = self.stats["documents"] / flushes if flushes else 0.0
+        avg_flush = self.stats["flush_s"] / flushes if flushes else 0.0
+        return (f"flushes={flushes} documents={self.stats['documents']} embedded={self.stats['embedded']} "
+                f"avg_batch={avg_batch:.1f} "
+                f"max_batch={self.stats['max_batch']} deduped={self.stats['deduped']} "
+                f"avg_flush={avg_flush:.3f}s max_flush={self.stats['max_flush_s']:.3f}s "
+                f"pending={len(self._pending)} errors={self.stats['errors']}")
+
+
+_buffers = {}
+
+def get_write_buffer(collection) -> WriteBehindBuffer:
+    """Returns the process-wide write buffer for a collection."""
+    key = id(collection)
+    if key not in _buffers:
+        _buffers[key] = WriteBehindBuffer(collection)
+    return _buffers[key]
+
+def flush_all() -> int:
+    return sum(buffer.flush() for buffer in _buffers.values())
+
+def write_buffer_summary() -> str:
+    return "; ".join(buffer.summary() for buffer in _buffers.values()) or "no writes"
@@ -5,6 +5,70 @@ import logging
 
 GEMINI_API_KEY_ENV_VAR = "GEMINI_API_KEY"
 
+# LLM backend used by SpinWrite, Review and PromptGenerator: 'gemini' or 'fake' (local, no network)
+LLM_BACKEND = os.environ.get("LLM_BACKEND", "gemini")
+# Fake backend behaviour, for benchmarks and load tests
+FAKE_LLM_LATENCY_S = float(os.environ.get("FAKE_LLM_LATENCY_S", "0.5"))
+FAKE_LLM_JITTER_S = float(os.environ.get("FAKE_LLM_JITTER_S", "0.1"))
+FAKE_LLM_ERROR_RATE = float(os.environ.get("FAKE_LLM_ERROR_RATE", "0.0"))
+FAKE_LLM_MODE = os.environ.get("FAKE_LLM_MODE", "echo") # 'echo' returns the prompt, 'canned' fixed responses
+FAKE_LLM_SEED = 1234
+FAKE_LLM_STREAM_CHUNK_CHARS = 80     # Streamed fake responses arrive in chunks of this size
+FAKE_LLM_STREAM_CHUNK_DELAY_S = 0.02 # ...this far apart
+
+# Print spins and reviews in the HITL workflow as they are generated
+STREAM_LLM_OUTPUT = True
+
+# Chapters longer than this are spun as parallel sections (0 = always in one call)
+SPIN_CHUNK_THRESHOLD_CHARS = 12000
+SPIN_SECTION_MAX_CHARS = 5000 # Sections are packed from whole paragraphs up to this size
+
+# Scrape -> summarize -> spin -> review pipeline used when crawling a whole book
+PIPELINE_QUEUE_SIZE = 2     # Chapters waiting between two stages; a full queue pauses the stage before it
+PIPELINE_STAGE_WORKERS = 2  # Chapters each LLM stage works on at once
+
+# Chapters prepared by batch.py, waiting for an editor
+READY_QUEUE_PATH = "ready_queue.json"
+
+# Start the next adaptive spin and review in the background while the editor reads a version.
+# Off by default: every speculation that the re-spin does not use is a wasted spin and review call.
+SPECULATIVE_SPIN_ENABLED = False
+
+# Multi-candidate re-spins (re-spin option 'd')
+SPIN_CANDIDATES = 3
+SPIN_CANDIDATE_RANKING = "similarity" # 'similarity' to past finals (free) or 'review' (one review-model call each)
+SPIN_SIMILARITY_SAMPLE_CHARS = 4000   # Characters compared per text when ranking by similarity
+CANDIDATE_PICK_REWARD = 1.0           # Bandit reward for the template of the candidate the editor picks
+CANDIDATE_REJECT_REWARD = -0.5        # ...and for each template whose candidate was passed over
+
+# Persistent cache of LLM responses keyed by model, prompt and generation config
+LLM_CACHE_ENABLED = True
+LLM_CACHE_PATH = "./llm_cache/responses.sqlite3"
+LLM_CACHE_MAX_ENTRIES = 5000
+LLM_CACHE_TTL_SECONDS = 30 * 24 * 3600 # Responses older than this are refetched
+
+# Process-wide request/token budgets per model (requests and tokens per minute)
+LLM_SCHEDULER_ENABLED = True
+LLM_RATE_LIMITS = {
+    'gemini-1.5-flash': {"rpm": 15, "tpm": 1_000_000},
+    'gemini-2.5-flash': {"rpm": 10, "tpm": 250_000},
+    'gemini-1.5-pro': {"rpm": 2, "tpm": 32_000},
+    'gemini-1.5-pro-latest': {"rpm": 2, "tpm": 32_000},
+}
+LLM_DEFAULT_RATE_LIMIT = {"rpm": 10, "tpm": 250_000}
+LLM_ESTIMATED_OUTPUT_TOKENS = 2048 # Output budget assumed when a call does not set max_output_tokens
+
+# Retries, deadlines and hedging for model calls
+LLM_RESILIENCE_ENABLED = True
+LLM_MAX_RETRIES = 4          # Retries for transient errors (429/5xx/timeouts) before giving up
+LLM_BACKOFF_BASE_S = 1.0     # Backoff is uniform in [0, base * 2**attempt], capped below
+LLM_BACKOFF_MAX_S = 30.0
+LLM_CALL_TIMEOUT_S = 180.0   # Deadline for a single backend call (time queued for budget not included)
+# Send a second identical request if the first has not answered after this many seconds
+LLM_HEDGE_AFTER_S = {
+    'gemini-1.5-flash': 25.0,
+}
+
 
 SPIN_WRITE_MODEL = 'gemini-1.5-flash'
 SUMMARIZE_MODEL = 'gemini-2.5-flash' 
@@ -16,9 +80,38 @@ REVIEW_MODEL = 'gemini-1.5-pro'
 PROMPT_GENERATOR_MODEL = 'gemini-1.5-pro-latest'
 
 
-CHROMA_DB_PATH = "./chroma_data"
-
-CHROMA_COLLECTION_NAME = "book_chapter_versions"
+CHROMA_DB_PATH = "main/chroma_data"
+
+CHROMA_COLLECTION_NAME = "data"
+# Version documents are buffered and written in batches (see chroma_writer.py)
+CHROMA_FLUSH_INTERVAL_S = 5.0 # Pending documents are flushed at least this often
+CHROMA_MAX_PENDING = 32       # ...or as soon as this many are waiting
+# Every version is kept in the version store (snapshots plus deltas, see version_store.py);
+# only these types are also embedded in ChromaDB and so found by semantic search
+SEARCHABLE_VERSION_TYPES = ("original", "final_version")
+VERSION_STORE_PATH = "./version_store/versions.sqlite3"
+VERSION_SNAPSHOT_INTERVAL = 8  # At most this many versions in a delta chain before a full snapshot
+VERSION_DELTA_MAX_RATIO = 0.5  # Store a snapshot instead when the delta is at least this share of the text
+VERSION_CACHE_SIZE = 32        # Materialized versions kept in memory
+# Ranking of search results: 'hybrid' (vector and BM25 lexical, merged by reciprocal-rank
+# fusion), 'vector' or 'lexical' (fast, exact words and "quoted phrases", no embedding model)
+SEARCH_RANKING = "hybrid"
+SEARCH_RRF_K = 60
+SEARCH_CACHE_SIZE = 128 # Search results kept per process; all are invalidated by the next write
+LEXICAL_INDEX_PATH = "./search_index/lexical.sqlite3"
+# Persistent cache of embeddings keyed by text hash, in front of ChromaDB's embedding function
+EMBEDDING_CACHE_ENABLED = True
+EMBEDDING_CACHE_PATH = "./embedding_cache/embeddings.sqlite3"
+EMBEDDING_CACHE_MAX_ENTRIES = 100_000
+# Semantic search: 'chunks' searches overlapping paragraph chunks of each searchable version
+# (kept in their own collection and indexed incrementally), 'documents' whole versions
+SEARCH_MODE = "chunks"
+CHROMA_CHUNK_COLLECTION_NAME = "data_chunks"
+SEARCH_CHUNK_MAX_CHARS = 1200         # Chunks are packed from whole paragraphs up to about this size
+SEARCH_CHUNK_OVERLAP_PARAGRAPHS = 1   # Paragraphs repeated from the previous chunk
+SEARCH_CHUNK_CANDIDATES = 4           # Chunks fetched per requested result, before grouping by version
+# Latest stored version of every chapter, kept current on each flush, for resuming sessions
+CHAPTER_HEAD_INDEX_PATH = "chapter_heads.json"
 
 
 BASE_URL = "https://en.wikisource.org/wiki/"
@@ -32,6 +125,26 @@ DEFAULT_URL_TO_SCRAPE = f"{BASE_URL}{DEFAULT_BOOK_NAME_SLUG}/Book_{DEFAULT_BOOK_
 
 PLAYWRIGHT_HEADLESS = False# Set to False for visible browser during scraping/screenshots
 PLAYWRIGHT_TIMEOUT_MS = 30000 
+# Maximum number of browser pages the shared scraper pool keeps open at once
+SCRAPER_MAX_PAGES = 4
+# Chapter screenshots: 'deferred' (captured in the background after the text is returned),
+# 'inline' (browser render before returning) or 'off'. Every valid chapter still gets its
+# screenshot by default; only 'inline' makes the text wait for the browser.
+# Screenshots need a real browser; without inline ones chapters are fetched over plain HTTP
+SCREENSHOT_MODE = "deferred"
+SCREENSHOT_FORMAT = "jpeg"   # 'png', 'jpeg' or 'webp' (webp needs Pillow)
+SCREENSHOT_QUALITY = 70      # jpeg/webp quality, 0-100
+SCREENSHOT_MAX_HEIGHT = 4000 # Crop full-page captures to this height in pixels (None for no limit)
+SCREENSHOT_FULL_PAGE = True  # False captures only the viewport
+SCREENSHOT_MAX_CONCURRENCY = 2 # Deferred captures rendered at once
+SCRAPER_USER_AGENT = "rl-writer-bot/1.0 (Wikisource chapter scraper)"
+# On-disk cache of raw Wikisource responses (revalidated with ETag/Last-Modified)
+PAGE_CACHE_DIR = "./page_cache"
+# Serve chapters only from the page cache, never touching the network (set SCRAPER_OFFLINE=1)
+SCRAPER_OFFLINE = os.environ.get("SCRAPER_OFFLINE", "0") == "1"
+# Whole-book crawling: chapters fetched at once and requests started per second per host
+CRAWL_MAX_CONCURRENCY = 4
+CRAWL_REQUESTS_PER_SECOND = 2.0
 
 
 # File to store prompt scores
@@ -86,8 +199,8 @@ def setup_logging():
 
     logger.info("Configuration and logging initialized.")
 
-# Call setup_logging when config.py is imported
-setup_logging()
+# setup_logging() is called by the entry points (intervention.py, batch.py, ...), not on
+# import, so that importing a module stays cheap and free of side effects.
 
 # Get the logger instance to be used by other modules
 
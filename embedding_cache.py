@@ -0,0 +1,155 @@
+# embedding_cache.py
+import array
+import hashlib
+import os
+import sqlite3
+import time
+import config
+
+logger = config.logger
+
+SQLITE_MAX_PARAMS = 900 # Keys per "IN (...)" lookup, under SQLite's bound-parameter limit
+
+
+class CachedEmbeddingFunction:
+    """
+    ChromaDB embedding function that remembers every vector it has computed, in SQLite,
+    keyed by the SHA-256 of (embedding function name, text).
+
+    Each call looks all its texts up at once, embeds only the distinct texts it has never
+    seen (in a single call to the wrapped function) and stores them, so an unchanged
+    paragraph, a repeated original or a final that matches its last edit is embedded once
+    however many versions, chapters or collections it appears in. Queries go through the
+    same cache. The least recently used vectors are evicted beyond max_entries.
+
+    It reports the wrapped function's name and config to ChromaDB, since the vectors are
+    exactly the wrapped function's, so collections created before the cache keep working.
+    """
+    def __init__(self, embedding_function=None, path: str = None, max_entries: int = None):
+        self._embedding_function = embedding_function
+        self.path = path or config.EMBEDDING_CACHE_PATH
+        self.max_entries = max_entries if max_entries is not None else config.EMBEDDING_CACHE_MAX_ENTRIES
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._conn = sqlite3.connect(self.path)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS embeddings ("
+            " key TEXT PRIMARY KEY, vector BLOB, created_at REAL, last_access REAL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS embeddings_last_access ON embeddings(last_access)")
+        self._conn.commit()
+        self.stats = {"hits": 0, "misses": 0, "deduped": 0, "batches": 0, "embedded": 0, "embed_s": 0.0,
+                      "evictions": 0}
+
+    @property
+    def embedding_function(self):
+        if self._embedding_function is None:
+            # ChromaDB's own default (a local ONNX model), built on first use
+            from chromadb.utils.embedding_functions import DefaultEmbeddingFunction
+            self._embedding_function = DefaultEmbeddingFunction()
+        return self._embedding_function
+
+    def make_key(self, text: str) -> str:
+        return hashlib.sha256(f"{self.name()}\0{text}".encode("utf-8")).hexdigest()
+
+    def __call__(self, input: list) -> list:
+        keys = [self.make_key(text) for text in input]
+        vectors = self._lookup(set(keys))
+        self.stats["hits"] += sum(1 for key in keys if key in vectors)
+
+        # Distinct texts not seen before, embedded together
+        missing = {}
+        for key, text in zip(keys, input):
+            if key in vectors:
+                continue
+            if key in missing:
+                self.stats["deduped"] += 1
+            else:
+                missing[key] = text
+        self.stats["misses"] += len(missing)
+        if missing:
+            start = time.perf_counter()
+            embedded = self.embedding_function(list(missing.values()))
+            self.stats["embed_s"] += time.perf_counter() - start
+            self.stats["batches"] += 1
+            self.stats["embedded"] += len(missing)
+            now = time.time()
+            rows = []
+            for key, vector in zip(missing, embedded):
+                # Rounded to the stored float32 now, so a text gets the same vector on a miss and a hit
+                vector = array.array("f", (float(x) for x in vector))
+                vectors[key] = vector.tolist()
+                rows.append((key, vector.tobytes(), now, now))
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO embeddings (key, vector, created_at, last_access) VALUES (?, ?, ?, ?)", rows)
+            self._evict()
+            self._conn.commit()
+        return [vectors[key] for key in keys]
+
+    def embed_query(self, input: list) -> list:
+        return self(input)
+
+    def _lookup(self, keys: set) -> dict:
+        keys = list(keys)
+        vectors = {}
+        for i in range(0, len(keys), SQLITE_MAX_PARAMS):
+            batch = keys[i:i + SQLITE_MAX_PARAMS]
+            marks = ",".join("?" * len(batch))
+            for key, blob in self._conn.execute(f"SELECT key, vector FROM embeddings WHERE key IN ({marks})", batch):
+                vectors[key] = array.array("f", blob).tolist()
+        if vectors:
+            now = time.time()
+            self._conn.executemany("UPDATE embeddings SET last_access = ? WHERE key = ?",
+                                   [(now, key) for key in vectors])
+            self._conn.commit()
+        return vectors
+
+    def _evict(self):
+        if self.max_entries:
+            self.stats["evictions"] += self._conn.execute(
+                "DELETE FROM embeddings WHERE key IN ("
+                " SELECT key FROM embeddings ORDER BY last_access DESC LIMIT -1 OFFSET ?)",
+                (self.max_entries,),
+            ).rowcount
+
+    # ChromaDB's embedding function interface, answered by the wrapped function
+    def name(self) -> str:
+        return self.embedding_function.name()
+
+    def get_config(self) -> dict:
+        return self.embedding_function.get_config()
+
+    def is_legacy(self) -> bool:
+        return False
+
+    def default_space(self):
+        return self.embedding_function.default_space()
+
+    def supported_spaces(self):
+        return self.embedding_function.supported_spaces()
+
+    def summary(self) -> str:
+        lookups = self.stats["hits"] + self.stats["misses"] + self.stats["deduped"]
+        hit_rate = self.stats["hits"] / lookups if lookups else 0.0
+        return (f"hits={self.stats['hits']} misses={self.stats['misses']} deduped={self.stats['deduped']} "
+                f"hit_rate={hit_rate:.0%} batches={self.stats['batches']} embedded={self.stats['embedded']} "
+                f"embed_time={self.stats['embed_s']:.1f}s evictions={self.stats['evictions']}")
+
+
+_embedding_function = None
+
+def get_embedding_function():
+    """
+    The process-wide cached embedding function to pass to get_or_create_collection, or
+    None (ChromaDB's default, uncached) when the cache is disabled.
+    """
+    global _embedding_function
+    if not config.EMBEDDING_CACHE_ENABLED:
+        return None
+    if _embedding_function is None:
+        _embedding_function = CachedEmbeddingFunction()
+    return _embedding_function
+
+def embedding_cache_summary() -> str:
+    return _embedding_function.summary() if _embedding_function is not None else "not used"
@@ -1,34 +1,79 @@
 import os
-import chromadb
 import datetime
 import uuid
 import asyncio
-from gtts import gTTS
-import vlc
 import time 
 
-import Levenshtein
-
+import config
+import llm_cache
+import llm_resilience
+import llm_scheduler
 import review, spin_write,scrape, prompt_generator, prompt_manager
+import speculation
+import pipeline
+import batch
+import chroma_writer
+import chapter_state
+import version_store
+import search
+import embedding_cache
 
 url_to_scrape = "https://en.wikisource.org/wiki/The_Gates_of_Morning/Book_1/Chapter_1"
 
-spin_write_instance = spin_write.SpinWrite()
-review_instance = review.Review()
-prompt_gen_instance = prompt_generator.PromptGenerator()
-
-sw_model= spin_write_instance.model_name
-r_model= review_instance.model_name
-pg_model = prompt_gen_instance.model_name
+# Model clients, the ChromaDB collection and the audio stack are built on first use, so the
+# menu comes up without importing the Gemini SDK or ChromaDB.
+_spin_writer = None
+_reviewer = None
+_prompt_generator = None
+_chroma_client = None
+_chroma_collection = None
+
+def get_spin_writer() -> spin_write.SpinWrite:
+    global _spin_writer
+    if _spin_writer is None:
+        _spin_writer = spin_write.SpinWrite()
+    return _spin_writer
+
+def get_reviewer() -> review.Review:
+    global _reviewer
+    if _reviewer is None:
+        _reviewer = review.Review()
+    return _reviewer
+
+def get_prompt_generator() -> prompt_generator.PromptGenerator:
+    global _prompt_generator
+    if _prompt_generator is None:
+        _prompt_generator = prompt_generator.PromptGenerator()
+    return _prompt_generator
+
+def get_chroma_collection():
+    """Opens the ChromaDB collection on first use."""
+    global _chroma_client, _chroma_collection
+    if _chroma_collection is None:
+        import chromadb
+        _chroma_client = chromadb.PersistentClient(path=CHROMA_DB_PATH)
+        _chroma_collection = _chroma_client.get_or_create_collection(
+            name=config.CHROMA_COLLECTION_NAME, embedding_function=embedding_cache.get_embedding_function())
+        writes = chroma_writer.get_write_buffer(_chroma_collection)
+        # Every flushed version moves its chapter's head forward, for resuming sessions later
+        writes.add_flush_listener(chapter_state.get_head_index().on_flush)
+        search.get_search_index(_chroma_client, _chroma_collection, writes)
+        print(f"ChromaDB initialized at: {CHROMA_DB_PATH}")
+    return _chroma_collection
+
+def get_search_index() -> search.SearchIndex:
+    """Semantic search over the ChromaDB collection, opened with it."""
+    collection = get_chroma_collection()
+    return search.get_search_index(_chroma_client, collection)
+
+sw_model = spin_write.spin_write_model
+r_model = review.review_model
+pg_model = prompt_generator.prompt_generator_model
 
 DEFAULT_BOOK_NAME_SLUG = "The_Gates_of_Morning"
 book_name, book_num, chap_num=scrape.book_chapter_info(url_to_scrape)
 #set path to chroma data directory
-CHROMA_DB_PATH="main/chroma_data"
-client = chromadb.PersistentClient(path=CHROMA_DB_PATH)
-
-collection = client.get_or_create_collection(name="data")
-print(f"ChromaDB initialized at: {CHROMA_DB_PATH}") 
+CHROMA_DB_PATH=config.CHROMA_DB_PATH
 
 
 #reward calculation
@@ -101,6 +146,9 @@ def speak_text(text, filename="output.mp3"):
             print("No text to speak.")
             return
 
+        from gtts import gTTS
+        import vlc
+
         print(f"Generating speech for: '{text[:50]}...'")
         tts = gTTS(text=text, lang='en', slow=False)
         tts.save(filename)
@@ -123,6 +171,98 @@ def speak_text(text, filename="output.mp3"):
         print(f"Error speaking text: {e}")
         print("Please Ensure VLC Media Player is installed and accessible to python-vlc")
 
+async def ainput(prompt: str = "") -> str:
+    """input() on a worker thread, so background tasks keep running while the editor reads and types."""
+    return await asyncio.to_thread(input, prompt)
+
+def stream_printer(header: str = None):
+    """
+    on_chunk callback that prints model output as it arrives (header first, on the first
+    chunk), or None when config.STREAM_LLM_OUTPUT is off. Finish with end_stream().
+    """
+    if not config.STREAM_LLM_OUTPUT:
+        return None
+    started = False
+
+    def print_chunk(text):
+        nonlocal started
+        if not started:
+            started = True
+            if header:
+                print(header)
+        print(text, end="", flush=True)
+    return print_chunk
+
+def end_stream(text: str, on_chunk):
+    """Ends a streamed print with a newline; without streaming, prints the text in full."""
+    if on_chunk is None:
+        print(text)
+    else:
+        print()
+
+
+def recent_final_versions(chroma_collection, book_title: str, chapter_num: int, limit: int = 3) -> list:
+    """Returns up to `limit` accepted final versions from this book, this chapter's first, newest next."""
+    results = chroma_collection.get(
+        where={"$and": [{"type": "final_version"}, {"book_title": book_title}]},
+        include=["documents", "metadatas"],
+    )
+    finals = sorted(
+        zip(results['documents'], results['metadatas']),
+        key=lambda item: (item[1].get("chapter_num") == chapter_num, item[1].get("timestamp", "")),
+        reverse=True,
+    )
+    return [document for document, _ in finals[:limit]]
+
+async def choose_spin_candidate(original_chapter_content: str, chroma_collection, book_title: str,
+                                chapter_num: int, chapter_summary: str = None) -> (str, str, int):
+    """
+    Generates config.SPIN_CANDIDATES spins in parallel from different templates, pre-ranks
+    them (config.SPIN_CANDIDATE_RANKING) and lets the editor pick one. Every candidate's
+    template gets bandit feedback: a reward for the pick, a penalty for the others.
+    Returns (spun_text, prompt_name, candidates_generated); spun_text is a spin failure
+    message if no candidate could be generated.
+    """
+    spin_write_instance = get_spin_writer()
+    review_instance = get_reviewer()
+    print(f"\nGenerating {config.SPIN_CANDIDATES} candidate spins in parallel...")
+    candidates = await spin_write_instance.ai_spin_candidates(
+        original_chapter_content, config.SPIN_CANDIDATES, summary=chapter_summary)
+    if not candidates:
+        return spin_write.SPIN_ERROR_MESSAGE, None, 0
+
+    if config.SPIN_CANDIDATE_RANKING == "review":
+        scores = await asyncio.gather(*(review_instance.ai_score_content(text) for text, _ in candidates))
+        ranked = sorted(zip(scores, candidates), key=lambda item: -1.0 if item[0] is None else item[0], reverse=True)
+        score_label = "review score"
+    else:
+        chroma_writer.get_write_buffer(chroma_collection).flush()
+        references = recent_final_versions(chroma_collection, book_title, chapter_num)
+        if references:
+            ranked = spin_write.rank_by_similarity(candidates, references)
+        else:
+            ranked = [(None, candidate) for candidate in candidates] # Nothing accepted yet; keep bandit order
+        score_label = "similarity to past finals"
+
+    for rank, (score, (text, name)) in enumerate(ranked, start=1):
+        score_text = f"{score:.2f}" if score is not None else "n/a"
+        print(f"\nCandidate {rank} (prompt: '{name}', {score_label}: {score_text})")
+        print(text[:600] + "..." if len(text) > 600 else text)
+
+    pick = (await ainput(f"\nPick a candidate (1-{len(ranked)}, Enter for 1): ")).strip()
+    index = int(pick) - 1 if pick.isdigit() and 1 <= int(pick) <= len(ranked) else 0
+    chosen_text, chosen_name = ranked[index][1]
+
+    for _, (_, name) in ranked:
+        prompt_manager.update_prompt_score(
+            prompt_name=name,
+            reward=config.CANDIDATE_PICK_REWARD if name == chosen_name else config.CANDIDATE_REJECT_REWARD,
+            current_scores=spin_write_instance.prompt_scores
+        )
+    spin_write_instance.save_current_prompt_scores()
+    return chosen_text, chosen_name, len(ranked)
+
+
 def load_content(filepath):
     try:
         with open(filepath, 'r', encoding='utf-8') as f:
@@ -139,13 +279,13 @@ async def scrape_new(chroma_collection):
     """
     print("\n Scrape New Chapter")
     print(f"Current default book: '{DEFAULT_BOOK_NAME_SLUG.replace('_',' ')}'")
-    book_name_input = input("Enter Book Title or leave blank for default: ").strip()
+    book_name_input = (await ainput("Enter Book Title or leave blank for default: ")).strip()
     book_name_slug = book_name_input.replace(' ', '_') if book_name_input else DEFAULT_BOOK_NAME_SLUG
 
     while True:
         try:
-            book_num_input = int(input("enter book number: "))
-            chap_num_input = int(input("Enter chapter number: "))
+            book_num_input = int(await ainput("enter book number: "))
+            chap_num_input = int(await ainput("Enter chapter number: "))
             break
         except ValueError:
             print("Invalid number. Please Enter integers")
@@ -162,14 +302,25 @@ async def scrape_new(chroma_collection):
     
     print("Chapter Scraped successfully! ")
     print(f"Title: {page_title}")
-    print(f"Saved to: scraped_content_{book_name_slug}_Book{book_num_input}_Chapter{chap_num_input}.txt")
+    new_chapter_original_file, new_chapter_spun_file, new_chapter_review_file = scrape.chapter_file_paths(
+        book_name_slug, book_num_input, chap_num_input)
+    print(f"Saved to: {new_chapter_original_file}")
 
     print("\n Generating initial AI spin and review for new chapter")
-    spun_content_for_init,initial_prompt_name = await spin_write_instance.ai_spin_content(scraped_content,None)
-    review_comments_for_init = await review_instance.ai_review_content(spun_content_for_init)
-
-    new_chapter_spun_file = f"spun_content_{book_name_slug}_Book{book_name_slug}_Chapter{chap_num_input}.txt"
-    new_chapter_review_file = f"reviewer_comments_{book_name_slug}_Book{book_name_slug}_Chapter{chap_num_input}.txt"
+    spin_write_instance = get_spin_writer()
+    review_instance = get_reviewer()
+    llm_scheduler.current_owner.set(f"{book_name_slug}_Book{book_num_input}_Chapter{chap_num_input}")
+    print("\nInitial AI Spin")
+    spin_printer = stream_printer()
+    spun_content_for_init,initial_prompt_name = await spin_write_instance.ai_spin_content(scraped_content,None, on_chunk=spin_printer)
+    end_stream(spun_content_for_init, spin_printer)
+    if spin_write.spin_failed(spun_content_for_init):
+        print("The initial AI spin failed even after retries. Please try again later.")
+        return
+    print("\nInitial AI Review")
+    review_printer = stream_printer()
+    review_comments_for_init = await review_instance.ai_review_content(spun_content_for_init, on_chunk=review_printer)
+    end_stream(review_comments_for_init, review_printer)
 
     with open(new_chapter_spun_file,'w',encoding='utf-8') as f:
         f.write(spun_content_for_init)
@@ -179,14 +330,13 @@ async def scrape_new(chroma_collection):
     print(f"initial spin used prompt:\n {initial_prompt_name}")
 
     await human_in_the_loop_workflow(
-        original_content_path=f"scraped_content_{book_name_slug}_Book{book_num_input}_Chapter{chap_num_input}.txt",
+        original_content_path=new_chapter_original_file,
         initial_spun_content_path=new_chapter_spun_file,
         initial_review_comments_path=new_chapter_review_file,
         book_title=book_name_slug.replace('_',' '),
         book_num= book_num_input,
         chapter_num=chap_num_input,
         chroma_collection=chroma_collection,
-        current_version_num=1,
         prompt_used_for_current_spin_on_start=initial_prompt_name,
         original_chapter_content=scraped_content
 
@@ -194,39 +344,190 @@ async def scrape_new(chroma_collection):
             
     print(f"\nFinished workflow for {book_name_slug.replace('_', ' ')} Book {book_num_input} Chapter {chap_num_input} ")
 
+async def crawl_whole_book():
+    """
+    Prompts for a book title and starting book number, then crawls every chapter
+    concurrently and saves them all to disk. Optionally runs every chapter through the
+    summarize/spin/review pipeline while later chapters are still being scraped.
+    """
+    print("\n Crawl Entire Book")
+    print(f"Current default book: '{DEFAULT_BOOK_NAME_SLUG.replace('_',' ')}'")
+    book_name_input = (await ainput("Enter Book Title or leave blank for default: ")).strip()
+    book_name_slug = book_name_input.replace(' ', '_') if book_name_input else DEFAULT_BOOK_NAME_SLUG
+
+    start_book_input = (await ainput("Enter the book number to start from (default 1): ")).strip()
+    try:
+        start_book_num = int(start_book_input) if start_book_input else 1
+    except ValueError:
+        print("Invalid number. Starting from book 1.")
+        start_book_num = 1
+
+    pregenerate = (await ainput("Also generate the initial AI spin and review for every chapter? (y/N): ")).strip().lower() == 'y'
+
+    start = time.perf_counter()
+    if pregenerate:
+        book_pipeline = pipeline.ChapterPipeline(get_spin_writer(), get_reviewer(), on_result=save_pipeline_result)
+        chapters = await book_pipeline.run(pipeline.walk_book_chapters(book_name_slug, start_book_num))
+    else:
+        chapters = await scrape.crawl_book(book_name_slug, start_book_num)
+    elapsed = time.perf_counter() - start
+
+    if not chapters:
+        print("No valid chapters found. Check the book title and number and try again.")
+        return
+
+    print(f"Crawled {len(chapters)} chapters in {elapsed:.1f}s:")
+    for chapter in chapters:
+        print(f"  Book {chapter['book_num']} Chapter {chapter['chap_num']}: {chapter['title']}")
+    if pregenerate:
+        print("\nPipeline stages:")
+        print(book_pipeline.summary())
+
+async def save_pipeline_result(chapter: dict):
+    """Writes a pipelined chapter's spin and review where the chapter workflow looks for them."""
+    if chapter.get("spun_text") is None or chapter.get("review_text") is None:
+        return
+    _, spun_path, review_path = scrape.chapter_file_paths(chapter['book_name_slug'], chapter['book_num'], chapter['chap_num'])
+    with open(spun_path, 'w', encoding='utf-8') as f:
+        f.write(chapter["spun_text"])
+    with open(review_path, 'w', encoding='utf-8') as f:
+        f.write(chapter["review_text"])
+
+def built_head_index(chroma_collection) -> chapter_state.ChapterHeadIndex:
+    """The chapter head index, backfilled from every stored version the first time it is used."""
+    head_index = chapter_state.get_head_index()
+    if head_index.rebuilt_at is None:
+        print("Building the chapter index from stored versions (first run only)...")
+        head_index.rebuild(chroma_collection)
+    return head_index
+
+async def start_from_ready_queue(chroma_collection):
+    """
+    Lists the chapters batch.py has prepared and starts the workflow on the chosen one.
+    Its original, spin and review are already stored, so no model call is needed to begin.
+    """
+    entries = batch.load_ready_queue()
+    if not entries:
+        print("The ready queue is empty. Prepare chapters with: python batch.py <book_slug> --chapters 1-10")
+        return
+
+    print("\n Ready Queue")
+    for i, entry in enumerate(entries, start=1):
+        print(f"{i}. {entry['book_title']} Book {entry['book_num']} Chapter {entry['chapter_num']}: "
+              f"{entry['title']} (prepared {entry['prepared_at'][:16]})")
+    pick = (await ainput(f"Choose a chapter (1-{len(entries)}, Enter for 1): ")).strip()
+    entry = entries[int(pick) - 1] if pick.isdigit() and 1 <= int(pick) <= len(entries) else entries[0]
+
+    original_chapter_content = load_content(entry["original_path"])
+    if original_chapter_content is None:
+        print("The prepared chapter's files are missing. Removing it from the ready queue.")
+        batch.remove_from_ready_queue(entry["chapter_id"])
+        return
+
+    # Claimed by this editor; take it off the queue before the session starts
+    batch.remove_from_ready_queue(entry["chapter_id"])
+    await human_in_the_loop_workflow(
+        original_content_path=entry["original_path"],
+        initial_spun_content_path=entry["spun_path"],
+        initial_review_comments_path=entry["review_path"],
+        book_title=entry["book_title"],
+        book_num=entry["book_num"],
+        chapter_num=entry["chapter_num"],
+        chroma_collection=chroma_collection,
+        prompt_used_for_current_spin_on_start=entry["prompt_name"],
+        original_chapter_content=original_chapter_content
+    )
+
+async def resume_chapter(chroma_collection, head: dict):
+    """Continues a chapter at its stored head; see human_in_the_loop_workflow's resume_from."""
+    await human_in_the_loop_workflow(
+        original_content_path=None,
+        initial_spun_content_path=None,
+        initial_review_comments_path=None,
+        book_title=head["book_title"],
+        book_num=head["book_num"],
+        chapter_num=head["chapter_num"],
+        chroma_collection=chroma_collection,
+        prompt_used_for_current_spin_on_start=head.get("prompt_name") or "unknown_initial_prompt",
+        resume_from=head
+    )
+
+async def choose_chapter_to_resume(chroma_collection):
+    """Lists the chapters with unfinished sessions, newest first, and resumes the chosen one."""
+    heads = built_head_index(chroma_collection).resumable()
+    if not heads:
+        print("No chapters in progress.")
+        return
+
+    print("\n Chapters In Progress")
+    for i, head in enumerate(heads, start=1):
+        editor = f", last editor {head['editor']}" if head.get("editor") else ""
+        print(f"{i}. {head['book_title']} Book {head['book_num']} Chapter {head['chapter_num']}: "
+              f"v{head['version']} {head['type']}{editor} ({(head.get('updated_at') or '')[:16]})")
+    pick = (await ainput(f"Choose a chapter (1-{len(heads)}, Enter for 1): ")).strip()
+    head = heads[int(pick) - 1] if pick.isdigit() and 1 <= int(pick) <= len(heads) else heads[0]
+    await resume_chapter(chroma_collection, head)
+
 async def human_in_the_loop_workflow(
     
     original_content_path: str,
     initial_spun_content_path: str,
     initial_review_comments_path: str,
-    current_version_num: int = 1,
     book_title: str = book_name,
     book_num: int=book_num,
     chapter_num: int = chap_num,
     chroma_collection= None,
     prompt_used_for_current_spin_on_start: str = "unknown_initial_prompt",
-    original_chapter_content: str = ""
+    original_chapter_content: str = "",
+    resume_from: dict = None
     
 ):
+    """
+    resume_from, a chapter head from chapter_state.ChapterHeadIndex, continues a chapter at
+    its latest stored version instead of starting at v1: the working content, review,
+    prompt name and summary come from the store (one get by id) and new versions are
+    numbered after the head. The content paths are not read in that case.
+
+    Otherwise the session starts at chapter_state.ChapterState.session_start(): after the
+    chapter's stored versions, or at its latest AI spin again if that is the spin given.
+    """
     print("\nStarting Human-in-the-Loop process")
+    import Levenshtein
+    spin_write_instance = get_spin_writer()
+    review_instance = get_reviewer()
+    prompt_gen_instance = get_prompt_generator()
 
     if chroma_collection is None:
         print("Error: ChromaDB collection not provided. Exiting.")
         return
+    # Version documents are batched and written at iteration boundaries (see chroma_writer)
+    writes = chroma_writer.get_write_buffer(chroma_collection)
 
     chapter_base_id = f"{book_title.replace(' ', '_')}_Book{book_num}_Chapter{chapter_num}"
+    # LLM calls made for this chapter share the scheduler's fair queue under its id
+    llm_scheduler.current_owner.set(chapter_base_id)
+
+
+    head_index = chapter_state.get_head_index()
+    if resume_from:
+        # The head index names the documents to restore, so this is one get by id, not a scan
+        chapter = chapter_state.ChapterState.fetch(
+            chroma_collection, chapter_base_id,
+            [resume_from["original_id"], resume_from["doc_id"], resume_from.get("review_id")])
+        if not chapter.original or not chapter.has(resume_from["doc_id"]):
+            print(f"Error: the stored versions for {chapter_base_id} could not be read. Cannot resume.")
+            return
+        original_content = chapter.original
+        original_chapter_content = original_chapter_content or original_content
+    else:
+       # One query for everything already stored for this chapter; no per-id existence probes
+        chapter = chapter_state.ChapterState.load(chroma_collection, book_title, book_num, chapter_num)
 
+       # Load and add ORIGINAL content to ChromaDB (if not already there)
+        original_content = load_content(original_content_path)
+        if original_content is None: return
 
-   # Load and add ORIGINAL content to ChromaDB (if not already there)
-    original_content = load_content(original_content_path)
-    if original_content is None: return
-
-     # Check if original is already added to avoid duplicates on restart
-    results = chroma_collection.get(ids=[f"{chapter_base_id}_v0_original"])
-    if not results['ids']:
-        chroma_collection.add(
-                documents=[original_content],
-                metadatas=[{
+    if chapter.ensure(writes, chapter.original_id, original_content, {
                     "book_title": book_title,
                     "book_num": book_num,
                     "chapter_num": chapter_num,
@@ -234,91 +535,100 @@ async def human_in_the_loop_workflow(
                     "type": "original",
                     "timestamp": datetime.datetime.now().isoformat(),
                     "source_file": original_content_path
-                }],
-                ids=[f"{chapter_base_id}_v0_original"]
-        )
-
-        print(f"Original content added to ChromaDB: {chapter_base_id}_v0_original")
+                }):
+        print(f"Original content added to ChromaDB: {chapter.original_id}")
     else:
-        print(f"Original content already exists in ChromaDB: {chapter_base_id}_v0_original")
+        print(f"Original content already exists in ChromaDB: {chapter.original_id}")
     
-    spun_content_current = load_content(initial_spun_content_path)
-    if spun_content_current is None: return
+    if resume_from:
+        current_version_num = resume_from["version"]
+        spun_content_current = chapter.document(resume_from["doc_id"])
+        review_comments_current = chapter.document(resume_from.get("review_id")) or "No review stored for this version."
+        prompt_used_for_current_spin = resume_from.get("prompt_name") or prompt_used_for_current_spin_on_start
+        print(f"Resuming {chapter_base_id} at v{current_version_num} ({resume_from['type']}, "
+              f"prompt '{prompt_used_for_current_spin}').")
+    else:
+        spun_content_current = load_content(initial_spun_content_path)
+        if spun_content_current is None: return
 
-    review_comments_current = load_content(initial_review_comments_path)
-    if review_comments_current is None: return
+        review_comments_current = load_content(initial_review_comments_path)
+        if review_comments_current is None: return
 
-    prompt_used_for_current_spin = prompt_used_for_current_spin_on_start
-    
-    results = chroma_collection.get(ids=[f"{chapter_base_id}_v{current_version_num}_ai_spin"])
-    if not results['ids']:
-        chroma_collection.add(
-            documents=[spun_content_current],
-            metadatas=[{
-                "book_title": book_title,
-                "book_num": book_num,
-                "chapter_num": chapter_num,
-                "version": current_version_num,
-                "type": "ai_spin",
-                "timestamp": datetime.datetime.now().isoformat(),
-                "model_used": sw_model,
-                "prompt_template_name": prompt_used_for_current_spin_on_start
-            }],
-            ids=[f"{chapter_base_id}_v{current_version_num}_ai_spin"]
-        )
-        print(f"Initial AI-spun content added to ChromaDB: {chapter_base_id}_v{current_version_num}_ai_spin")
+        prompt_used_for_current_spin = prompt_used_for_current_spin_on_start
+        current_version_num = chapter.session_start(spun_content_current)
+        # Reopening a stored spin keeps the review stored with it
+        review_comments_current = (chapter.document(f"{chapter_base_id}_v{current_version_num}_ai_review")
+                                   or review_comments_current)
+
+    if not resume_from: # A resumed head and its review are already stored
+        initial_spin_id = f"{chapter_base_id}_v{current_version_num}_ai_spin"
+        if chapter.ensure(writes, initial_spin_id, spun_content_current, {
+                    "book_title": book_title,
+                    "book_num": book_num,
+                    "chapter_num": chapter_num,
+                    "version": current_version_num,
+                    "type": "ai_spin",
+                    "timestamp": datetime.datetime.now().isoformat(),
+                    "model_used": sw_model,
+                    "prompt_template_name": prompt_used_for_current_spin_on_start
+                }):
+            print(f"Initial AI-spun content added to ChromaDB: {initial_spin_id}")
 
-    else: # If the initial spin IS in ChromaDB, retrieve its prompt name
-        print(f"Initial AI-spun content already exists in ChromaDB: {chapter_base_id}_v{current_version_num}_ai_spin")
+        else: # If the initial spin IS in ChromaDB, retrieve its prompt name
+            print(f"Initial AI-spun content already exists in ChromaDB: {initial_spin_id}")
         
-        retrieved_metadata = results['metadatas'][0]
-        if 'prompt_template_name' in retrieved_metadata:
-            prompt_used_for_current_spin = retrieved_metadata['prompt_template_name']
-            print(f"  Retrieved prompt for initial spin: '{prompt_used_for_current_spin}'")
-        else:
-            print("  Warning: Could not retrieve prompt_template_name for existing initial spin. Using 'unknown_initial_prompt'.")
-            prompt_used_for_current_spin = "unknown_initial_prompt"    
+            retrieved_metadata = chapter.metadata(initial_spin_id)
+            if 'prompt_template_name' in retrieved_metadata:
+                prompt_used_for_current_spin = retrieved_metadata['prompt_template_name']
+                print(f"  Retrieved prompt for initial spin: '{prompt_used_for_current_spin}'")
+            else:
+                print("  Warning: Could not retrieve prompt_template_name for existing initial spin. Using 'unknown_initial_prompt'.")
+                prompt_used_for_current_spin = "unknown_initial_prompt"    
     
-    results = chroma_collection.get(ids=[f"{chapter_base_id}_v{current_version_num}_ai_review"])
-    if not results['ids']:
-        chroma_collection.add(
-            documents=[review_comments_current],
-            metadatas=[{
-                "book_title": book_title,
-                "book_num": book_num,
-                "chapter_num": chapter_num,
-                "version": current_version_num,
-                "type": "ai_review",
-                "timestamp": datetime.datetime.now().isoformat(),
-                "model_used": r_model, 
-                "reviewed_version_id": f"{chapter_base_id}_v{current_version_num}_ai_spin"
-            }],
-            ids=[f"{chapter_base_id}_v{current_version_num}_ai_review"]
-        )
-        print(f"Initial AI-review comments added to ChromaDB: {chapter_base_id}_v{current_version_num}_ai_review")
+        initial_review_id = f"{chapter_base_id}_v{current_version_num}_ai_review"
+        if chapter.ensure(writes, initial_review_id, review_comments_current, {
+                    "book_title": book_title,
+                    "book_num": book_num,
+                    "chapter_num": chapter_num,
+                    "version": current_version_num,
+                    "type": "ai_review",
+                    "timestamp": datetime.datetime.now().isoformat(),
+                    "model_used": r_model, 
+                    "reviewed_version_id": initial_spin_id
+                }):
+            print(f"Initial AI-review comments added to ChromaDB: {initial_review_id}")
 
     current_editable_content = spun_content_current
     #prev_content_length = len(current_editable_content)
     previous_content_for_edit_check = current_editable_content
 
-    chapter_summary_for_prompt_gen = await spin_write_instance.ai_summarize(original_chapter_content)
+    chapter_summary_for_prompt_gen = (resume_from or {}).get("summary")
+    if not chapter_summary_for_prompt_gen:
+        chapter_summary_for_prompt_gen = await spin_write_instance.ai_summarize(original_chapter_content)
+        if not spin_write.summary_failed(chapter_summary_for_prompt_gen):
+            head_index.set_summary(chapter_base_id, chapter_summary_for_prompt_gen)
 
     while True:
         
-        name=input("\nplease enter your name:")
+        name=await ainput("\nplease enter your name:")
         if not name.strip():
             print("Name cannot be empty. Please enter a valid name.")
             continue
         break
 
     iteration_count = 0
+    speculative = None # Next adaptive spin, generated in the background while the editor reads
 
     while True:
         iteration_count+=1
+        writes.flush() # Iteration boundary: everything from the last action goes out in one batch
+        if speculative is None and config.SPECULATIVE_SPIN_ENABLED:
+            speculative = speculation.SpeculativeSpin(spin_write_instance, review_instance,
+                                                      original_chapter_content, chapter_summary_for_prompt_gen)
 
         print(f"\nChapter Review (Book: {book_name}, Chapter: {chapter_num}, Current Version: {current_version_num}, Editor: {name})")
         print("\nOriginal Content (for reference)")
-        original_from_db = chroma_collection.get(ids=[f"{chapter_base_id}_v0_original"])['documents'][0]
+        original_from_db = chapter.original # Cached for the session; no read per iteration
         print(original_from_db[:500] + "..." if len(original_from_db) > 500 else original_from_db)
 
         print("\n AI-Spun Content (Current Working Version)")
@@ -329,7 +639,7 @@ async def human_in_the_loop_workflow(
 
         human_rating_input = None
         while True:
-            rating_str = input("Please rate the AI's current spun content (1-5 stars, 5 being excellent, or leave blank): ").strip()
+            rating_str = (await ainput("Please rate the AI's current spun content (1-5 stars, 5 being excellent, or leave blank): ")).strip()
             if not rating_str:
                 print("No rating provided.")
                 break 
@@ -352,9 +662,12 @@ async def human_in_the_loop_workflow(
         print("6. **Listen to AI Reviewer Comments.**") 
         print("7. Exit review process.")  
 
-        choice = input("Enter your choice (1-7): ")
+        choice = await ainput("Enter your choice (1-7): ")
 
         if choice == '1':
+            if speculative:
+                speculative.cancel() # The edit changes the rewards the next spin should be chosen with
+                speculative = None
             # Option 1: Edit directly. Saving current content to a temp file, open editor, then load back.
             temp_edit_file = "temp_edit.txt"
             with open(temp_edit_file, 'w', encoding='utf-8') as f:
@@ -366,7 +679,7 @@ async def human_in_the_loop_workflow(
                 
                 os.system(f"vim {temp_edit_file}")
             
-            input("Press Enter when you have finished editing and saved the file in your text editor...")
+            await ainput("Press Enter when you have finished editing and saved the file in your text editor...")
             edited_content = load_content(temp_edit_file)
             os.remove(temp_edit_file) 
             if edited_content:
@@ -399,7 +712,7 @@ async def human_in_the_loop_workflow(
                 current_editable_content = edited_content 
                 previous_content_for_edit_check = current_editable_content
                 
-                chroma_collection.add(
+                writes.add(
                     documents=[edited_content],
                     metadatas=[{
                         "book_title": book_title,
@@ -419,25 +732,29 @@ async def human_in_the_loop_workflow(
                 print(f"Human-edited content added to ChromaDB: {chapter_base_id}_v{current_version_num}_human_edit")
                 
                 print("\nRe-running AI Reviewer on Human-Edited Content")
-                review_comments_current = await review_instance.ai_review_content(current_editable_content) 
                 print("\nNew AI Reviewer Comments")
-                print(review_comments_current)
+                review_printer = stream_printer()
+                review_comments_current = await review_instance.ai_review_content(current_editable_content, on_chunk=review_printer)
+                end_stream(review_comments_current, review_printer)
                 
-                chroma_collection.add(
-                    documents=[review_comments_current],
-                    metadatas=[{
-                        "book_title": book_title,
-                        "book_num": book_num,
-                        "chapter_num": chapter_num,
-                        "version": current_version_num,
-                        "type": "ai_review_after_human",
-                        "timestamp": datetime.datetime.now().isoformat(),
-                        "model_used": r_model,
-                        "reviewed_version_id":f"{chapter_base_id}_v{current_version_num}_human_edit"
-                    }],
-                    ids=[f"{chapter_base_id}_v{current_version_num}_ai_review_after_human"]
-                )
-                print(f"New AI review comments after human edit added to ChromaDB: f{chapter_base_id}_v{current_version_num}_ai_review_after_human")
+                if review.review_failed(review_comments_current):
+                    print("AI review failed even after retries; it will not be stored.")
+                else:
+                    writes.add(
+                        documents=[review_comments_current],
+                        metadatas=[{
+                            "book_title": book_title,
+                            "book_num": book_num,
+                            "chapter_num": chapter_num,
+                            "version": current_version_num,
+                            "type": "ai_review_after_human",
+                            "timestamp": datetime.datetime.now().isoformat(),
+                            "model_used": r_model,
+                            "reviewed_version_id":f"{chapter_base_id}_v{current_version_num}_human_edit"
+                        }],
+                        ids=[f"{chapter_base_id}_v{current_version_num}_ai_review_after_human"]
+                    )
+                    print(f"New AI review comments after human edit added to ChromaDB: f{chapter_base_id}_v{current_version_num}_ai_review_after_human")
             else:
                 print("No content loaded after edit. Retaining previous version.")
             
@@ -467,7 +784,7 @@ async def human_in_the_loop_workflow(
 
             final_content = current_editable_content
             current_version_num += 1
-            chroma_collection.add(
+            writes.add(
                 documents=[final_content],
                 metadatas=[{
                     "book_title": book_title,
@@ -490,12 +807,12 @@ async def human_in_the_loop_workflow(
 
             original_doc_id = f"{chapter_base_id}_v0_original"
             try:
-                # Using ChromaDB's update method directly for efficiency
-                chroma_collection.update(
-                    ids=[original_doc_id],
-                    metadatas=[{"final_chapter_reward": reward_value,
-                                "finalized_version_id": "f{chapter_base_id}_v{current_version_num}_final",
-                                "finalized_timestamp": datetime.datetime.now().isoformat()}]
+                # Merged into the pending original if it has not been written yet
+                writes.update_metadata(
+                    original_doc_id,
+                    {"final_chapter_reward": reward_value,
+                     "finalized_version_id": "f{chapter_base_id}_v{current_version_num}_final",
+                     "finalized_timestamp": datetime.datetime.now().isoformat()}
                 )
                 print(f"[RL for Scraping] Updated original document '{original_doc_id}' with final_chapter_reward: {reward_value:.2f}")
             except Exception as e:
@@ -521,27 +838,52 @@ async def human_in_the_loop_workflow(
                 )
                 spin_write_instance.save_current_prompt_scores()
 
+            # Re-spins must sample a fresh response, so they skip the LLM response cache
             print("\n Re-spin Options\n")
             print("a. Use system's adaptive prompt (based on learning).")
             print("b. Provide a custom instruction.")
             print("c. Generate a completely new prompt using an AI prompt generator.") 
-            respin_choice = input("Enter your re-spin choice (a, b, c): ").lower()    
+            print(f"d. Generate {config.SPIN_CANDIDATES} candidates from different prompts and pick one.")
+            respin_choice = (await ainput("Enter your re-spin choice (a, b, c, d): ")).lower()
 
             new_instruction_for_spin_writer = None
             generated_prompt_template_name = None 
-
+            prompt_before_respin = prompt_used_for_current_spin
+            respin_printer = stream_printer("\nAI Re-spin (streaming)")
+            candidates_generated = 1
+            speculative_review = None
+            speculative_result = None
+            adaptive_prompt = None
             if respin_choice == 'a':
+                # Chosen after update_prompt_score above, so the reward for this version counts
+                adaptive_prompt = spin_write_instance.choose_prompt()
+            if speculative:
+                if respin_choice == 'a':
+                    if not speculative.ready() and speculative.prompt_name == adaptive_prompt[0]:
+                        print("\nWaiting for the spin that was started in the background...")
+                    speculative_result = await speculative.take(adaptive_prompt[0])
+                else:
+                    speculative.cancel()
+                speculative = None
+
+            if respin_choice == 'a' and speculative_result:
+                spun_content_current, speculative_review = speculative_result
+                prompt_used_for_current_spin = adaptive_prompt[0]
+                print("\nAI Re-spin (generated in the background while you were reading)")
+                print(spun_content_current)
+
+            elif respin_choice == 'a':
                 
-                spun_content_current, prompt_used_for_current_spin =await spin_write_instance.ai_spin_content(original_chapter_content, None)
+                spun_content_current, prompt_used_for_current_spin =await spin_write_instance.ai_spin_content(original_chapter_content, None, bypass_cache=True, on_chunk=respin_printer, summary=chapter_summary_for_prompt_gen, chosen_prompt=adaptive_prompt)
 
             elif respin_choice == 'b':
-                new_instruction_for_spin_writer = input("Enter new custom instruction for AI re-spin: ")
+                new_instruction_for_spin_writer = await ainput("Enter new custom instruction for AI re-spin: ")
                 if not new_instruction_for_spin_writer.strip():
                     print("Custom instruction cannot be empty. Reverting to adaptive prompt.")
-                    spun_content_current, prompt_used_for_current_spin = await spin_write_instance.ai_spin_content(original_chapter_content, None)
+                    spun_content_current, prompt_used_for_current_spin = await spin_write_instance.ai_spin_content(original_chapter_content, None, bypass_cache=True, on_chunk=respin_printer, summary=chapter_summary_for_prompt_gen)
                 else:
                     # If custom instruction, its name for tracking is simply 'custom_instruction_override'
-                    spun_content_current, prompt_used_for_current_spin = await spin_write_instance.ai_spin_content(original_chapter_content, new_instruction_for_spin_writer + "\n\n")
+                    spun_content_current, prompt_used_for_current_spin = await spin_write_instance.ai_spin_content(original_chapter_content, new_instruction_for_spin_writer + "\n\n", bypass_cache=True, on_chunk=respin_printer, summary=chapter_summary_for_prompt_gen)
 
             elif respin_choice == 'c':
                 print("\nRequesting AI to Generate a New Prompt")
@@ -575,20 +917,33 @@ async def human_in_the_loop_workflow(
                     print(f"  [Prompt Generator] New prompt generated and added: '{generated_prompt_template_name}'")
                     print(f"  Generated Template: \"{new_generated_template.strip()}\"")
                     
-                    spun_content_current, prompt_used_for_current_spin = await spin_write_instance.ai_spin_content(original_chapter_content, new_instruction_for_spin_writer)
+                    spun_content_current, prompt_used_for_current_spin = await spin_write_instance.ai_spin_content(original_chapter_content, new_instruction_for_spin_writer, bypass_cache=True, on_chunk=respin_printer, summary=chapter_summary_for_prompt_gen)
                 else:
                     print("Failed to generate a new prompt. Reverting to system's adaptive prompt.")
-                    spun_content_current, prompt_used_for_current_spin =await spin_write_instance.ai_spin_content(original_chapter_content, None)
+                    spun_content_current, prompt_used_for_current_spin =await spin_write_instance.ai_spin_content(original_chapter_content, None, bypass_cache=True, on_chunk=respin_printer, summary=chapter_summary_for_prompt_gen)
+            elif respin_choice == 'd':
+                respin_printer = None # Candidates are shown side by side once all are ready
+                spun_content_current, prompt_used_for_current_spin, candidates_generated = await choose_spin_candidate(
+                    original_chapter_content, chroma_collection, book_title, chapter_num, chapter_summary_for_prompt_gen)
             else:
                 print("Invalid re-spin choice. Reverting to system's adaptive prompt.")
-                spun_content_current, prompt_used_for_current_spin = await spin_write_instance.ai_spin_content(original_chapter_content, None)
+                spun_content_current, prompt_used_for_current_spin = await spin_write_instance.ai_spin_content(original_chapter_content, None, bypass_cache=True, on_chunk=respin_printer, summary=chapter_summary_for_prompt_gen)
+
+            if respin_printer:
+                print()
+
+            if spin_write.spin_failed(spun_content_current):
+                # Never store a failure message as a spin version; keep working on the current one
+                print("AI re-spin failed even after retries. Keeping the current version.")
+                prompt_used_for_current_spin = prompt_before_respin
+                continue
 
-        
             print("\nAI has re-spun the content. Please review again.")
             current_version_num += 1
+            current_editable_content = spun_content_current
             previous_content_for_edit_check = current_editable_content
 
-            chroma_collection.add(
+            writes.add(
                 documents=[current_editable_content],
                 metadatas=[{
                     "book_title": book_title,
@@ -603,37 +958,47 @@ async def human_in_the_loop_workflow(
                     "reward_leading_to_spin": reward_value, # Reward for the action *leading to* this spin
                     "human_rating_leading_to_spin": human_rating_input if human_rating_input is not None else "Not Rated",
                     "generated_by_ai": (respin_choice == 'c'), # Flag if this prompt was AI-generated
-                    "prompt_generator_model": pg_model if (respin_choice == 'c') else ""
+                    "prompt_generator_model": pg_model if (respin_choice == 'c') else "",
+                    "candidates_generated": candidates_generated
                 
                 }],
                 ids=[f"{chapter_base_id}_v{current_version_num}_ai_spin"]
             )
             print(f"New AI-spun content v{current_version_num} added to ChromaDB.")
             
-            print("\n Re-running AI Reviewer on New Spun Content")
-            review_comments_current = await review_instance.ai_review_content(current_editable_content)
-            print("\nNew AI Reviewer Comments")
-            print(review_comments_current)
+            if speculative_review is not None:
+                print("\nNew AI Reviewer Comments (generated in the background)")
+                review_comments_current = speculative_review
+                print(review_comments_current)
+            else:
+                print("\n Re-running AI Reviewer on New Spun Content")
+                print("\nNew AI Reviewer Comments")
+                review_printer = stream_printer()
+                review_comments_current = await review_instance.ai_review_content(current_editable_content, on_chunk=review_printer)
+                end_stream(review_comments_current, review_printer)
             
-            chroma_collection.add(
-                documents=[review_comments_current],
-                metadatas=[{
-                    "book_title": book_title,
-                    "book_num": book_num,
-                    "chapter_num": chapter_num,
-                    "version": current_version_num,
-                    "type": "ai_review",
-                    "timestamp": datetime.datetime.now().isoformat(),
-                    "model_used": r_model,
-                    "reviewed_version_id": f"{chapter_base_id}_v{current_version_num}_ai_spin"
-                }],
-                ids=[f"{chapter_base_id}_v{current_version_num}_ai_review"]
-            )
-            print(f"New AI-review comments v{current_version_num} added to ChromaDB.")
+            if review.review_failed(review_comments_current):
+                print("AI review failed even after retries; it will not be stored.")
+            else:
+                writes.add(
+                    documents=[review_comments_current],
+                    metadatas=[{
+                        "book_title": book_title,
+                        "book_num": book_num,
+                        "chapter_num": chapter_num,
+                        "version": current_version_num,
+                        "type": "ai_review",
+                        "timestamp": datetime.datetime.now().isoformat(),
+                        "model_used": r_model,
+                        "reviewed_version_id": f"{chapter_base_id}_v{current_version_num}_ai_spin"
+                    }],
+                    ids=[f"{chapter_base_id}_v{current_version_num}_ai_review"]
+                )
+                print(f"New AI-review comments v{current_version_num} added to ChromaDB.")
 
    
         elif choice == '4':
-            search_query = input("Enter your search query: ")
+            search_query = await ainput("Enter your search query: ")
             if not search_query.strip():
                 print("Search query cannot be empty.")
                 continue
@@ -648,16 +1013,19 @@ async def human_in_the_loop_workflow(
             print("f. Combinations of the above")
 
             where_clause = []
-            content_type_filter = input("Filter by content type (like final_version, human_edit, ai_spin) or leave blank for all: ").strip().lower()
+            content_type_filter = (await ainput("Filter by content type (like final_version, human_edit, ai_spin) or leave blank for all: ")).strip().lower()
             if content_type_filter:
                 valid_types = ["original", "ai_spin", "human_edit", "ai_review", "final_version", "ai_review_after_human"]
                 if content_type_filter in valid_types:
                     where_clause.append({"type": content_type_filter}) 
                     print(f"Filtering by content type: '{content_type_filter}'")
+                    if content_type_filter not in config.SEARCHABLE_VERSION_TYPES:
+                        print(f"Note: '{content_type_filter}' versions are not embedded for search "
+                              f"(searchable types: {', '.join(config.SEARCHABLE_VERSION_TYPES)}).")
                 else:
                     print(f"Warning: Invalid content type '{content_type_filter}'. Searching all types.")
 
-            book_num_filter_str = input("Filter by specific Book Number or leave blank for all: ").strip()
+            book_num_filter_str = (await ainput("Filter by specific Book Number or leave blank for all: ")).strip()
             if book_num_filter_str:
                 try:
                     book_num_filter = int(book_num_filter_str)
@@ -666,7 +1034,7 @@ async def human_in_the_loop_workflow(
                 except ValueError:
                     print("Invalid Book Number. Ignoring filter.")
 
-            chapter_num_filter_str = input("Filter by specific Chapter Number or leave blank for all: ").strip()
+            chapter_num_filter_str = (await ainput("Filter by specific Chapter Number or leave blank for all: ")).strip()
             if chapter_num_filter_str:
                 try:
                     chapter_num_filter = int(chapter_num_filter_str)
@@ -675,7 +1043,7 @@ async def human_in_the_loop_workflow(
                 except ValueError:
                     print("Invalid Chapter Number. Ignoring filter.")
 
-            version_filter_str = input("Filter by specific Version Number or leave blank for all: ").strip()
+            version_filter_str = (await ainput("Filter by specific Version Number or leave blank for all: ")).strip()
             if version_filter_str:
                 try:
                     version_filter = int(version_filter_str)
@@ -684,51 +1052,33 @@ async def human_in_the_loop_workflow(
                 except ValueError:
                     print("Invalid Version Number. Ignoring filter.")
 
-            editor_filter_str = input("Filter by specific editor or leave blank for all: ").strip()
+            editor_filter_str = (await ainput("Filter by specific editor or leave blank for all: ")).strip()
             if editor_filter_str:
                 
                 where_clause.append({"editor": editor_filter_str}) 
                 print(f"Filtering by editor: {editor_filter_str}")
 
 
-            final_where_clause = None
-            if len(where_clause) == 1:
-                final_where_clause = where_clause[0] 
-            elif len(where_clause) > 1:
-                final_where_clause = {"$and": where_clause} 
-            
+            final_where_clause = search.build_where(where_clause)
 
             print("\n Performing Semantic Search ")
-            results_n = input("How many results do you want to see (default 5)? ").strip()
+            results_n = (await ainput("How many results do you want to see (default 5)? ")).strip()
             try:
                 n_results_int = int(results_n) if results_n else 5
             except ValueError:
                 print("Invalid number of results. Defaulting to 5.")
                 n_results_int = 5
 
-            try:
-                results = chroma_collection.query(
-                    query_texts=[search_query],
-                    n_results=n_results_int,
-                    where=final_where_clause 
-                )
+            rankings = {"h": "hybrid", "v": "vector", "l": "lexical"}
+            ranking_choice = (await ainput(f"Ranking: (h)ybrid, (v)ector or (l)exical for exact words and \"phrases\" "
+                                   f"(default {config.SEARCH_RANKING}): ")).strip().lower()[:1]
+            ranking = rankings.get(ranking_choice, config.SEARCH_RANKING)
 
-                if results['documents'] and results['documents'][0]:
-                    print("Found relevant documents:")
-                    for i, doc_content in enumerate(results['documents'][0]):
-                        metadata = results['metadatas'][0][i]
-                        distance = results['distances'][0][i]
-                        print(f"\n--- Result {i+1} (Distance: {distance:.4f}) ---")
-                        print(f"ID: {results['ids'][0][i]}")
-                        print(f"Metadata: {metadata}")
-                        print("Content Snippet:")
-                        print(doc_content[:500] + "..." if len(doc_content) > 500 else doc_content)
-                else:
-                    print("No relevant documents found matching your criteria.")
+            writes.flush() # Searches must see every stored version
+            try:
+                search.print_results(get_search_index().search(search_query, final_where_clause, n_results_int, ranking))
             except Exception as e:
                 print(f"An error occurred during semantic search: {e}")
-            else:
-                print("Search query cannot be empty.")
 
         elif choice == '5': 
             print("\nPlaying current AI-spun content...")
@@ -746,6 +1096,9 @@ async def human_in_the_loop_workflow(
         else:
             print("Invalid choice. Please enter a number between 1 and 5.")
 
+    if speculative:
+        speculative.cancel() # Finalized or exited; the next spin is not needed
+    writes.flush()
 
 
 async def main():
@@ -754,16 +1107,27 @@ async def main():
         print("\n Main Workflow Menu ")
         print("1. Start/Continue Chapter Workflow (for initial chapter)") 
         print("2. Scrape a NEW Chapter and start its Workflow") 
-        print("3. Exit") 
+        print("3. Crawl an entire book (all chapters)")
+        print("4. Start a prepared chapter from the ready queue (see batch.py)")
+        print("5. Resume a chapter in progress")
+        print("6. Exit") 
 
-        main_choice = input("Enter your choice (1-3): ").strip()
+        main_choice = (await ainput("Enter your choice (1-6): ")).strip()
 
         if main_choice == '1':
+            head_index = built_head_index(get_chroma_collection())
+            default_head = head_index.head(f"{book_name.replace(' ', '_')}_Book{book_num}_Chapter{chap_num}")
+            if default_head in head_index.resumable():
+                answer = (await ainput(f"This chapter was left at v{default_head['version']} ({default_head['type']}). "
+                               "Resume there? (Y/n): ")).strip().lower()
+                if answer != 'n':
+                    await resume_chapter(get_chroma_collection(), default_head)
+                    print("\n Returned to Main Menu after Default Chapter Workflow ")
+                    continue
             
             # Adjust original_chapter_file to match the unique naming convention
-            initial_original_chapter_file = f"scraped_content_{book_name.replace(' ', '_')}_Book{book_num}_Chapter{chap_num}.txt"
-            initial_spun_file_path = f"spun_content_{book_name.replace(' ', '_')}_Book{book_num}_Chapter{chap_num}.txt"
-            initial_review_file_path = f"reviewer_comments_{book_name.replace(' ', '_')}_Book{book_num}_Chapter{chap_num}.txt"
+            initial_original_chapter_file, initial_spun_file_path, initial_review_file_path = scrape.chapter_file_paths(
+                book_name.replace(' ', '_'), book_num, chap_num)
 
 
             if not os.path.exists(initial_original_chapter_file):
@@ -787,9 +1151,20 @@ async def main():
 
             if not os.path.exists(initial_spun_file_path) or not os.path.exists(initial_review_file_path):
                 print("Initial AI spin/review files not found for default chapter. Generating them now using adaptive prompt...")
-                spun_content_for_init, initial_prompt_name_for_workflow = await spin_write_instance.ai_spin_content(original_chapter_content_for_default, None)
+                spin_write_instance = get_spin_writer()
+                review_instance = get_reviewer()
+                print("\nInitial AI Spin")
+                spin_printer = stream_printer()
+                spun_content_for_init, initial_prompt_name_for_workflow = await spin_write_instance.ai_spin_content(original_chapter_content_for_default, None, on_chunk=spin_printer)
+                end_stream(spun_content_for_init, spin_printer)
+                if spin_write.spin_failed(spun_content_for_init):
+                    print("The initial AI spin failed even after retries. Returning to main menu.")
+                    continue
                 with open(initial_spun_file_path, 'w', encoding='utf-8') as f: f.write(spun_content_for_init)
-                review_comments_for_init = await review_instance.ai_review_content(spun_content_for_init)
+                print("\nInitial AI Review")
+                review_printer = stream_printer()
+                review_comments_for_init = await review_instance.ai_review_content(spun_content_for_init, on_chunk=review_printer)
+                end_stream(review_comments_for_init, review_printer)
                 with open(initial_review_file_path, 'w', encoding='utf-8') as f: f.write(review_comments_for_init)
                 print(f"Initial spin for default chapter used prompt: '{initial_prompt_name_for_workflow}'")
             else:
@@ -806,26 +1181,64 @@ async def main():
                 book_title=book_name, # Use global book_name
                 book_num=book_num,   # Use global book_num
                 chapter_num=chap_num, # Use global chap_num
-                chroma_collection=collection,
-                current_version_num=1,
+                chroma_collection=get_chroma_collection(),
                 prompt_used_for_current_spin_on_start=initial_prompt_name_for_workflow,
                 original_chapter_content=original_chapter_content_for_default # Pass the content that was just loaded/scraped
             )
             print("\n Returned to Main Menu after Default Chapter Workflow ")
         
         elif main_choice == '2': 
-            await scrape_new(collection)
+            await scrape_new(get_chroma_collection())
             print("\n Returned to Main Menu after New Chapter Workflow ")
 
 
-        elif main_choice == '3': # Exit option
+        elif main_choice == '3':
+            await crawl_whole_book()
+            print("\n Returned to Main Menu after Book Crawl ")
+
+        elif main_choice == '4':
+            await start_from_ready_queue(get_chroma_collection())
+            print("\n Returned to Main Menu after Prepared Chapter Workflow ")
+
+        elif main_choice == '5':
+            await choose_chapter_to_resume(get_chroma_collection())
+            print("\n Returned to Main Menu after Resumed Chapter Workflow ")
+
+        elif main_choice == '6': # Exit option
             print("Exiting application. Goodbye!")
             break
         else:
-            print("Invalid choice. Please enter 1, 2, or 3.")
+            print("Invalid choice. Please enter 1, 2, 3, 4, 5, or 6.")
+
+async def run():
+    """Runs the interactive menu and makes sure the scraper's HTTP client and browser are shut down on exit."""
+    try:
+        await main()
+    finally:
+        await scrape.close_scraper()
+        chroma_writer.flush_all()
+        print(f"ChromaDB writes: {chroma_writer.write_buffer_summary()}")
+        if version_store._version_store is not None:
+            print(f"Version store: {version_store.get_version_store().summary()}")
+        if search._search_index is not None:
+            print(f"Search index: {search._search_index.summary()}")
+        if _chroma_collection is not None:
+            print(f"Embedding cache: {embedding_cache.embedding_cache_summary()}")
+        if config.LLM_CACHE_ENABLED:
+            print(f"LLM response cache: {llm_cache.get_llm_cache().summary()}")
+        if config.LLM_SCHEDULER_ENABLED:
+            print(f"LLM scheduler: {llm_scheduler.get_scheduler().summary()}")
+        if config.LLM_RESILIENCE_ENABLED:
+            clients = [model.client for model in (_spin_writer, _reviewer, _prompt_generator) if model is not None]
+            if _spin_writer is not None:
+                clients.append(_spin_writer.summarize_client)
+            print(f"LLM resilience: {llm_resilience.resilience_summary(clients)}")
+        if config.SPECULATIVE_SPIN_ENABLED:
+            print(f"Speculative spins: {speculation.speculation_summary()}")
 
 if __name__ == "__main__":
-    asyncio.run(main())
+    config.setup_logging()
+    asyncio.run(run())
 
     
     
\ No newline at end of file
@@ -0,0 +1,142 @@
+# lexical_index.py
+import collections
+import json
+import math
+import os
+import re
+import sqlite3
+import time
+import config
+
+logger = config.logger
+
+TOKEN_PATTERN = re.compile(r"\w+(?:'\w+)*")
+PHRASE_PATTERN = re.compile(r'"([^"]+)"')
+FILTER_COLUMNS = ("type", "book_num", "chapter_num", "version", "editor")
+
+
+def tokenize(text: str) -> list:
+    return TOKEN_PATTERN.findall(text.lower())
+
+def parse_query(query: str):
+    """Returns (terms, phrases): every word of the query, and the "quoted" phrases that must appear as written."""
+    phrases = [" ".join(tokenize(phrase)) for phrase in PHRASE_PATTERN.findall(query)]
+    return tokenize(query), [phrase for phrase in phrases if phrase]
+
+def where_conditions(where: dict) -> list:
+    """Flattens a ChromaDB where clause of equality conditions (as search.build_where makes) into (key, value) pairs."""
+    if not where:
+        return []
+    clauses = where["$and"] if "$and" in where else [where]
+    return [(key, value) for clause in clauses for key, value in clause.items()]
+
+
+class LexicalIndex:
+    """
+    BM25 inverted index over the paragraph chunks of every stored version, in SQLite.
+
+    It holds every version type, not only the embedded ones, so an exact character name
+    or phrase is found in spins, edits and reviews too, and answering a query needs no
+    embedding model. Chunks use the ids and boundaries of the chunk collection
+    ({version_id}_c{i}, see search.split_into_chunks); their text is not stored again,
+    passages are read back from the version store. Re-indexing a version replaces its
+    postings.
+    """
+    def __init__(self, path: str = None, k1: float = 1.2, b: float = 0.75):
+        self.path = path or config.LEXICAL_INDEX_PATH
+        self.k1 = k1
+        self.b = b
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._conn = sqlite3.connect(self.path)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS chunks ("
+            " chunk_id TEXT PRIMARY KEY, version_id TEXT, chunk_index INTEGER, length INTEGER, metadata TEXT,"
+            " type TEXT, book_num INTEGER, chapter_num INTEGER, version INTEGER, editor TEXT)"
+        )
+        self._conn.execute("CREATE TABLE IF NOT EXISTS postings (term TEXT, chunk_id TEXT, tf INTEGER)")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS postings_term ON postings(term)")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS postings_chunk ON postings(chunk_id)")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS chunks_version ON chunks(version_id)")
+        self._conn.commit()
+        self.stats = {"versions_indexed": 0, "chunks_indexed": 0, "queries": 0, "query_s": 0.0}
+
+    def count(self) -> int:
+        return self._conn.execute("SELECT COUNT(*) FROM chunks").fetchone()[0]
+
+    def index_version(self, version_id: str, chunks: list, metadata: dict):
+        old = [(chunk_id,) for (chunk_id,) in
+               self._conn.execute("SELECT chunk_id FROM chunks WHERE version_id = ?", (version_id,))]
+        self._conn.executemany("DELETE FROM postings WHERE chunk_id = ?", old)
+        self._conn.execute("DELETE FROM chunks WHERE version_id = ?", (version_id,))
+        metadata_json = json.dumps(metadata, ensure_ascii=False)
+        for i, chunk in enumerate(chunks):
+            chunk_id = f"{version_id}_c{i}"
+            counts = collections.Counter(tokenize(chunk))
+            self._conn.execute(
+                "INSERT INTO chunks (chunk_id, version_id, chunk_index, length, metadata, type, book_num, chapter_num,"
+                " version, editor) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (chunk_id, version_id, i, sum(counts.values()), metadata_json,
+                 *(metadata.get(column) for column in FILTER_COLUMNS)))
+            self._conn.executemany("INSERT INTO postings (term, chunk_id, tf) VALUES (?, ?, ?)",
+                                   [(term, chunk_id, tf) for term, tf in counts.items()])
+        self._conn.commit()
+        self.stats["versions_indexed"] += 1
+        self.stats["chunks_indexed"] += len(chunks)
+
+    def search(self, terms: list, where: dict = None, limit: int = 50) -> list:
+        """
+        The best-scoring chunks containing any of the terms, as (chunk_id, version_id,
+        chunk_index, metadata, score), best first. where takes the same equality filters
+        as the ChromaDB queries.
+        """
+        start = time.perf_counter()
+        self.stats["queries"] += 1
+        terms = sorted(set(terms))
+        if not terms:
+            return []
+        total, avg_length = self._conn.execute("SELECT COUNT(*), AVG(length) FROM chunks").fetchone()
+        if not total:
+            return []
+        marks = ",".join("?" * len(terms))
+        df = dict(self._conn.execute(
+            f"SELECT term, COUNT(*) FROM postings WHERE term IN ({marks}) GROUP BY term", terms))
+
+        conditions = where_conditions(where)
+        for key, _ in conditions:
+            if key not in FILTER_COLUMNS:
+                raise ValueError(f"Unsupported filter for lexical search: {key}")
+        filter_sql = "".join(f" AND c.{key} = ?" for key, _ in conditions)
+        rows = self._conn.execute(
+            "SELECT c.chunk_id, c.version_id, c.chunk_index, c.length, c.metadata, p.term, p.tf"
+            f" FROM postings p JOIN chunks c ON c.chunk_id = p.chunk_id WHERE p.term IN ({marks}){filter_sql}",
+            terms + [value for _, value in conditions])
+
+        scores = {}
+        info = {}
+        for chunk_id, version_id, chunk_index, length, metadata, term, tf in rows:
+            idf = math.log(1 + (total - df[term] + 0.5) / (df[term] + 0.5))
+            norm = tf + self.k1 * (1 - self.b + self.b * length / (avg_length or 1))
+            scores[chunk_id] = scores.get(chunk_id, 0.0) + idf * tf * (self.k1 + 1) / norm
+            info[chunk_id] = (version_id, chunk_index, metadata)
+        best = sorted(scores, key=scores.get, reverse=True)[:limit]
+        self.stats["query_s"] += time.perf_counter() - start
+        return [(chunk_id, info[chunk_id][0], info[chunk_id][1], json.loads(info[chunk_id][2]), scores[chunk_id])
+                for chunk_id in best]
+
+    def summary(self) -> str:
+        queries = self.stats["queries"]
+        avg_ms = 1000 * self.stats["query_s"] / queries if queries else 0.0
+        return (f"chunks={self.count()} versions_indexed={self.stats['versions_indexed']} "
+                f"queries={queries} avg_query={avg_ms:.1f}ms")
+
+
+_lexical_index = None
+
+def get_lexical_index() -> LexicalIndex:
+    """Returns the process-wide lexical index."""
+    global _lexical_index
+    if _lexical_index is None:
+        _lexical_index = LexicalIndex()
+    return _lexical_index
@@ -0,0 +1,150 @@
+# llm_cache.py
+import hashlib
+import json
+import os
+import sqlite3
+import time
+import config
+import llm_client
+
+logger = config.logger
+
+
+class LLMResponseCache:
+    """
+    Persistent cache of model responses, stored in SQLite.
+
+    Entries are keyed by the SHA-256 of (model name, full prompt, generation config), so any
+    change to the prompt template, the chapter text or the sampling settings is a miss.
+    Entries older than ttl_seconds are ignored and purged; once more than max_entries are
+    stored, the least recently used ones are evicted.
+    """
+    def __init__(self, path: str = None, max_entries: int = None, ttl_seconds: float = None):
+        self.path = path or config.LLM_CACHE_PATH
+        self.max_entries = max_entries if max_entries is not None else config.LLM_CACHE_MAX_ENTRIES
+        self.ttl_seconds = ttl_seconds if ttl_seconds is not None else config.LLM_CACHE_TTL_SECONDS
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._conn = sqlite3.connect(self.path)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS responses ("
+            " key TEXT PRIMARY KEY, model TEXT, response TEXT,"
+            " created_at REAL, last_access REAL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS responses_last_access ON responses(last_access)")
+        self._conn.commit()
+        self.stats = {"hits": 0, "misses": 0, "bypassed": 0, "stores": 0, "evictions": 0}
+
+    @staticmethod
+    def make_key(model_name: str, contents, generation_config: dict = None) -> str:
+        payload = json.dumps(
+            {"model": model_name, "contents": contents, "generation_config": generation_config or {}},
+            sort_keys=True, ensure_ascii=False,
+        )
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def get(self, key: str):
+        row = self._conn.execute("SELECT response, created_at FROM responses WHERE key = ?", (key,)).fetchone()
+        now = time.time()
+        if row is None or (self.ttl_seconds and now - row[1] > self.ttl_seconds):
+            self.stats["misses"] += 1
+            return None
+        self._conn.execute("UPDATE responses SET last_access = ? WHERE key = ?", (now, key))
+        self._conn.commit()
+        self.stats["hits"] += 1
+        return row[0]
+
+    def put(self, key: str, model_name: str, response: str):
+        now = time.time()
+        self._conn.execute(
+            "INSERT OR REPLACE INTO responses (key, model, response, created_at, last_access) VALUES (?, ?, ?, ?, ?)",
+            (key, model_name, response, now, now),
+        )
+        self.stats["stores"] += 1
+        self._evict(now)
+        self._conn.commit()
+
+    def _evict(self, now: float):
+        evicted = 0
+        if self.ttl_seconds:
+            evicted += self._conn.execute(
+                "DELETE FROM responses WHERE created_at < ?", (now - self.ttl_seconds,)
+            ).rowcount
+        if self.max_entries:
+            evicted += self._conn.execute(
+                "DELETE FROM responses WHERE key IN ("
+                " SELECT key FROM responses ORDER BY last_access DESC LIMIT -1 OFFSET ?)",
+                (self.max_entries,),
+            ).rowcount
+        self.stats["evictions"] += evicted
+
+    def clear(self):
+        self._conn.execute("DELETE FROM responses")
+        self._conn.commit()
+
+    def summary(self) -> str:
+        lookups = self.stats["hits"] + self.stats["misses"]
+        hit_rate = self.stats["hits"] / lookups if lookups else 0.0
+        return (f"hits={self.stats['hits']} misses={self.stats['misses']} bypassed={self.stats['bypassed']} "
+                f"hit_rate={hit_rate:.0%} evictions={self.stats['evictions']}")
+
+
+class CachedLLMClient(llm_client.LLMClient):
+    """
+    Wraps another LLMClient and answers repeated requests from an LLMResponseCache.
+    bypass_cache=True skips the lookup (for re-spins that need fresh sampling) but still
+    stores the new response.
+    """
+    def __init__(self, inner: llm_client.LLMClient, cache: LLMResponseCache):
+        super().__init__(inner.model_name)
+        self.inner = inner
+        self.cache = cache
+        self.backend_name = inner.backend_name
+
+    async def generate(self, contents, generation_config: dict = None, bypass_cache: bool = False,
+                       timeout_s: float = None) -> str:
+        key = self.cache.make_key(self.model_name, contents, generation_config)
+        if bypass_cache:
+            self.cache.stats["bypassed"] += 1
+        else:
+            cached = self.cache.get(key)
+            if cached is not None:
+                logger.info(f"  [LLM Cache] Hit for {self.model_name}")
+                return cached
+
+        response = await self.inner.generate(contents, generation_config, timeout_s=timeout_s)
+        if response:
+            self.cache.put(key, self.model_name, response)
+        return response
+
+    async def generate_stream(self, contents, generation_config: dict = None, bypass_cache: bool = False,
+                              timeout_s: float = None):
+        """A hit is yielded as one chunk; a miss is streamed through and cached once complete."""
+        key = self.cache.make_key(self.model_name, contents, generation_config)
+        if bypass_cache:
+            self.cache.stats["bypassed"] += 1
+        else:
+            cached = self.cache.get(key)
+            if cached is not None:
+                logger.info(f"  [LLM Cache] Hit for {self.model_name}")
+                yield cached
+                return
+
+        parts = []
+        async for chunk in self.inner.generate_stream(contents, generation_config, timeout_s=timeout_s):
+            parts.append(chunk)
+            yield chunk
+        response = "".join(parts)
+        if response:
+            self.cache.put(key, self.model_name, response)
+
+
+_llm_cache = None
+
+def get_llm_cache() -> LLMResponseCache:
+    """Returns the process-wide response cache."""
+    global _llm_cache
+    if _llm_cache is None:
+        _llm_cache = LLMResponseCache()
+    return _llm_cache
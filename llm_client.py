@@ -0,0 +1,224 @@
+# llm_client.py
+import asyncio
+import os
+import random
+import time
+import config
+
+logger = config.logger
+
+
+class LLMClient:
+    """
+    The interface SpinWrite, Review and PromptGenerator talk to.
+
+    generate() takes either a prompt string or a list of Gemini-style content dicts
+    ({"role": ..., "parts": [{"text": ...}]}) plus an optional generation config dict
+    (temperature, max_output_tokens, ...). It returns the response text, or None when the
+    model produced no text. Backend errors propagate so callers keep their own handling.
+    bypass_cache asks a caching wrapper for a fresh response; plain backends ignore it.
+    timeout_s bounds the backend call itself (not time spent queued in wrappers) and raises
+    asyncio.TimeoutError when exceeded.
+
+    generate_stream() takes the same arguments and yields the response text in chunks as
+    they arrive; for streams timeout_s bounds the wait for each chunk.
+    """
+    backend_name = "base"
+
+    def __init__(self, model_name: str):
+        self.model_name = model_name
+
+    async def generate(self, contents, generation_config: dict = None, bypass_cache: bool = False,
+                       timeout_s: float = None) -> str:
+        raise NotImplementedError
+
+    async def generate_stream(self, contents, generation_config: dict = None, bypass_cache: bool = False,
+                              timeout_s: float = None):
+        """Backends without native streaming yield the whole response as one chunk."""
+        text = await self.generate(contents, generation_config, bypass_cache=bypass_cache, timeout_s=timeout_s)
+        if text:
+            yield text
+
+
+async def generate_text(client: LLMClient, contents, generation_config: dict = None, bypass_cache: bool = False,
+                        on_chunk=None) -> str:
+    """
+    Returns the full response text. With on_chunk, the response is streamed instead and
+    on_chunk(text) is called for every chunk as it arrives; the assembled text is still
+    returned. Time to first chunk is logged, since that is the latency an editor notices.
+    """
+    if on_chunk is None:
+        return await client.generate(contents, generation_config, bypass_cache=bypass_cache)
+
+    start = time.perf_counter()
+    parts = []
+    async for chunk in client.generate_stream(contents, generation_config, bypass_cache=bypass_cache):
+        if not parts:
+            logger.info(f"  [LLM Client] {client.model_name} first chunk after {time.perf_counter() - start:.2f}s")
+        parts.append(chunk)
+        on_chunk(chunk)
+    return "".join(parts)
+
+
+def contents_to_text(contents) -> str:
+    """Flattens a prompt string or a list of content dicts into plain text."""
+    if isinstance(contents, str):
+        return contents
+    texts = []
+    for item in contents:
+        if isinstance(item, str):
+            texts.append(item)
+        else:
+            texts.extend(part.get("text", "") for part in item.get("parts", []))
+    return "\n".join(texts)
+
+
+_gemini_configured = False
+
+def configure_gemini():
+    """Configures the Gemini SDK from the API key environment variable, once per process."""
+    global _gemini_configured
+    if _gemini_configured:
+        return
+    import google.generativeai as genai
+    try:
+        genai.configure(api_key=os.environ[config.GEMINI_API_KEY_ENV_VAR])
+    except KeyError:
+        print(f"Error: {config.GEMINI_API_KEY_ENV_VAR} environment variable not set.")
+        print("Please set it before running the script, or set LLM_BACKEND=fake to run without the live service.")
+        exit()
+    _gemini_configured = True
+
+
+class GeminiClient(LLMClient):
+    """LLMClient backed by google.generativeai."""
+    backend_name = "gemini"
+
+    def __init__(self, model_name: str):
+        super().__init__(model_name)
+        configure_gemini()
+        import google.generativeai as genai
+        self._genai = genai
+        self._model = genai.GenerativeModel(self.model_name)
+
+    async def generate(self, contents, generation_config: dict = None, bypass_cache: bool = False,
+                       timeout_s: float = None) -> str:
+        return await asyncio.wait_for(self._generate(contents, generation_config), timeout_s)
+
+    def _request_kwargs(self, generation_config: dict = None) -> dict:
+        kwargs = {}
+        if generation_config:
+            kwargs["generation_config"] = self._genai.types.GenerationConfig(**generation_config)
+        return kwargs
+
+    @staticmethod
+    def _response_text(response):
+        # Checking if the response has text content
+        if response.candidates and response.candidates[0].content.parts:
+            return response.candidates[0].content.parts[0].text
+        return None
+
+    async def _generate(self, contents, generation_config: dict = None) -> str:
+        response = await self._model.generate_content_async(contents, **self._request_kwargs(generation_config))
+        return self._response_text(response)
+
+    async def generate_stream(self, contents, generation_config: dict = None, bypass_cache: bool = False,
+                              timeout_s: float = None):
+        response = await asyncio.wait_for(
+            self._model.generate_content_async(contents, stream=True, **self._request_kwargs(generation_config)),
+            timeout_s,
+        )
+        chunks = response.__aiter__()
+        while True:
+            try:
+                chunk = await asyncio.wait_for(chunks.__anext__(), timeout_s)
+            except StopAsyncIteration:
+                break
+            text = self._response_text(chunk)
+            if text:
+                yield text
+
+
+class FakeLLMError(Exception):
+    """Simulated backend failure raised by FakeLLMClient."""
+
+
+class FakeLLMClient(LLMClient):
+    """
+    Deterministic local stand-in for benchmarking and load tests without network access.
+
+    Each call sleeps latency_s +/- jitter_s, fails with FakeLLMError with probability
+    error_rate, and otherwise returns either the flattened prompt ('echo' mode) or the next
+    entry from `responses` ('canned' mode). A fixed seed makes latency and failures repeatable.
+    """
+    backend_name = "fake"
+
+    def __init__(self, model_name: str, latency_s: float = None, jitter_s: float = None, error_rate: float = None,
+                 mode: str = None, responses: list = None, seed: int = None):
+        super().__init__(model_name)
+        self.latency_s = config.FAKE_LLM_LATENCY_S if latency_s is None else latency_s
+        self.jitter_s = config.FAKE_LLM_JITTER_S if jitter_s is None else jitter_s
+        self.error_rate = config.FAKE_LLM_ERROR_RATE if error_rate is None else error_rate
+        self.mode = mode or config.FAKE_LLM_MODE
+        self.responses = responses or [f"[{model_name}] Canned response."]
+        self.stream_chunk_chars = config.FAKE_LLM_STREAM_CHUNK_CHARS
+        self.stream_chunk_delay_s = config.FAKE_LLM_STREAM_CHUNK_DELAY_S
+        self._random = random.Random(config.FAKE_LLM_SEED if seed is None else seed)
+        self.calls = 0
+        self.failures = 0
+
+    async def generate(self, contents, generation_config: dict = None, bypass_cache: bool = False,
+                       timeout_s: float = None) -> str:
+        return await asyncio.wait_for(self._generate(contents), timeout_s)
+
+    async def _generate(self, contents) -> str:
+        call_index = self.calls
+        self.calls += 1
+        delay = max(0.0, self.latency_s + self._random.uniform(-self.jitter_s, self.jitter_s))
+        fail = self._random.random() < self.error_rate
+        await asyncio.sleep(delay)
+        if fail:
+            self.failures += 1
+            raise FakeLLMError(f"Simulated failure from fake backend for {self.model_name}")
+        if self.mode == "echo":
+            return contents_to_text(contents)
+        return self.responses[call_index % len(self.responses)]
+
+    async def generate_stream(self, contents, generation_config: dict = None, bypass_cache: bool = False,
+                              timeout_s: float = None):
+        """The first chunk arrives after the usual call latency, the rest at a steady pace."""
+        text = await asyncio.wait_for(self._generate(contents), timeout_s)
+        for start in range(0, len(text), self.stream_chunk_chars):
+            if start:
+                await asyncio.sleep(self.stream_chunk_delay_s)
+            yield text[start:start + self.stream_chunk_chars]
+
+
+def get_llm_client(model_name: str, backend: str = None, use_cache: bool = None) -> LLMClient:
+    """
+    Builds a client for model_name using config.LLM_BACKEND ('gemini' or 'fake') unless told
+    otherwise. The layers, outermost first, are:
+      response cache  (config.LLM_CACHE_ENABLED)     - repeated requests cost nothing below it
+      resilience      (config.LLM_RESILIENCE_ENABLED) - retries, backoff, deadlines, hedging
+      scheduler       (config.LLM_SCHEDULER_ENABLED)  - every attempt waits for RPM/TPM budget
+      backend
+    """
+    backend = (backend or config.LLM_BACKEND).lower()
+    if backend == "fake":
+        client = FakeLLMClient(model_name)
+    else:
+        if backend != "gemini":
+            logger.warning(f"  [LLM Client] Unknown backend '{backend}'. Using gemini.")
+        client = GeminiClient(model_name)
+
+    # Imported here because these modules build on this one
+    if config.LLM_SCHEDULER_ENABLED:
+        import llm_scheduler
+        client = llm_scheduler.ScheduledLLMClient(client, llm_scheduler.get_scheduler())
+    if config.LLM_RESILIENCE_ENABLED:
+        import llm_resilience
+        client = llm_resilience.ResilientLLMClient(client)
+    if config.LLM_CACHE_ENABLED if use_cache is None else use_cache:
+        import llm_cache
+        client = llm_cache.CachedLLMClient(client, llm_cache.get_llm_cache())
+    return client
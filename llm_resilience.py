@@ -0,0 +1,147 @@
+# llm_resilience.py
+import asyncio
+import random
+import config
+import llm_client
+
+logger = config.logger
+
+# HTTP status codes (as carried by google.api_core exceptions in `.code`) worth retrying
+TRANSIENT_STATUS_CODES = {408, 429, 500, 502, 503, 504}
+# google.api_core exception class names for the same conditions, for errors without a code
+TRANSIENT_ERROR_NAMES = {
+    "ResourceExhausted", "TooManyRequests", "ServiceUnavailable", "InternalServerError",
+    "DeadlineExceeded", "GatewayTimeout", "BadGateway", "Aborted",
+}
+
+
+def is_transient(error: BaseException) -> bool:
+    """
+    True for failures that are likely to succeed on retry: quota (429), server-side errors,
+    timeouts and dropped connections. Bad requests, auth failures and blocked prompts are not.
+    """
+    if isinstance(error, (asyncio.TimeoutError, ConnectionError, llm_client.FakeLLMError)):
+        return True
+    code = getattr(error, "code", None)
+    if isinstance(code, int) and code in TRANSIENT_STATUS_CODES:
+        return True
+    return type(error).__name__ in TRANSIENT_ERROR_NAMES
+
+def backoff_delay(attempt: int, base_s: float, max_s: float) -> float:
+    """Exponential backoff with full jitter: uniform in [0, min(max_s, base_s * 2**attempt)]."""
+    return random.uniform(0, min(max_s, base_s * (2 ** attempt)))
+
+
+class ResilientLLMClient(llm_client.LLMClient):
+    """
+    Wraps an LLMClient with classified retries, jittered exponential backoff, a per-attempt
+    deadline and optional request hedging.
+
+    Transient errors (see is_transient) are retried up to max_retries times; anything else is
+    raised at once. When hedge_after_s is set for the model and an attempt has not answered
+    by then, a second identical request is fired and whichever succeeds first wins; the other
+    is cancelled.
+    """
+    def __init__(self, inner: llm_client.LLMClient, max_retries: int = None, timeout_s: float = None,
+                 hedge_after_s: float = None, backoff_base_s: float = None, backoff_max_s: float = None):
+        super().__init__(inner.model_name)
+        self.inner = inner
+        self.backend_name = inner.backend_name
+        self.max_retries = config.LLM_MAX_RETRIES if max_retries is None else max_retries
+        self.timeout_s = config.LLM_CALL_TIMEOUT_S if timeout_s is None else timeout_s
+        self.hedge_after_s = hedge_after_s if hedge_after_s is not None else config.LLM_HEDGE_AFTER_S.get(inner.model_name)
+        self.backoff_base_s = config.LLM_BACKOFF_BASE_S if backoff_base_s is None else backoff_base_s
+        self.backoff_max_s = config.LLM_BACKOFF_MAX_S if backoff_max_s is None else backoff_max_s
+        self.stats = {"calls": 0, "retries": 0, "timeouts": 0, "hedges_fired": 0, "hedges_won": 0, "failures": 0}
+
+    async def generate(self, contents, generation_config: dict = None, bypass_cache: bool = False,
+                       timeout_s: float = None) -> str:
+        self.stats["calls"] += 1
+        timeout_s = timeout_s or self.timeout_s
+        attempt = 0
+        while True:
+            try:
+                return await self._attempt(contents, generation_config, timeout_s)
+            except Exception as e:
+                if isinstance(e, asyncio.TimeoutError):
+                    self.stats["timeouts"] += 1
+                if not is_transient(e) or attempt >= self.max_retries:
+                    self.stats["failures"] += 1
+                    raise
+                delay = backoff_delay(attempt, self.backoff_base_s, self.backoff_max_s)
+                attempt += 1
+                self.stats["retries"] += 1
+                logger.warning(f"  [LLM Resilience] {self.model_name} attempt {attempt} failed "
+                               f"({type(e).__name__}: {e}). Retrying in {delay:.1f}s.")
+                await asyncio.sleep(delay)
+
+    async def generate_stream(self, contents, generation_config: dict = None, bypass_cache: bool = False,
+                              timeout_s: float = None):
+        """
+        Streams with the same retry policy, but only until the first chunk has been yielded:
+        after that the caller has already shown partial output, so errors are raised. Streams
+        are not hedged.
+        """
+        self.stats["calls"] += 1
+        timeout_s = timeout_s or self.timeout_s
+        attempt = 0
+        while True:
+            started = False
+            try:
+                async for chunk in self.inner.generate_stream(contents, generation_config, timeout_s=timeout_s):
+                    started = True
+                    yield chunk
+                return
+            except Exception as e:
+                if isinstance(e, asyncio.TimeoutError):
+                    self.stats["timeouts"] += 1
+                if started or not is_transient(e) or attempt >= self.max_retries:
+                    self.stats["failures"] += 1
+                    raise
+                delay = backoff_delay(attempt, self.backoff_base_s, self.backoff_max_s)
+                attempt += 1
+                self.stats["retries"] += 1
+                logger.warning(f"  [LLM Resilience] {self.model_name} stream attempt {attempt} failed "
+                               f"({type(e).__name__}: {e}). Retrying in {delay:.1f}s.")
+                await asyncio.sleep(delay)
+
+    async def _attempt(self, contents, generation_config: dict, timeout_s: float) -> str:
+        if not self.hedge_after_s:
+            return await self.inner.generate(contents, generation_config, timeout_s=timeout_s)
+
+        primary = asyncio.ensure_future(self.inner.generate(contents, generation_config, timeout_s=timeout_s))
+        done, _ = await asyncio.wait({primary}, timeout=self.hedge_after_s)
+        if done:
+            return primary.result()
+
+        self.stats["hedges_fired"] += 1
+        logger.info(f"  [LLM Resilience] {self.model_name} slower than {self.hedge_after_s:.0f}s, sending a hedged request")
+        hedge = asyncio.ensure_future(self.inner.generate(contents, generation_config, timeout_s=timeout_s))
+        pending = {primary, hedge}
+        error = None
+        try:
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        if task is hedge:
+                            self.stats["hedges_won"] += 1
+                        return task.result()
+                    error = task.exception()
+            raise error
+        finally:
+            for task in pending:
+                task.cancel()
+
+
+def resilience_summary(clients) -> str:
+    """Aggregates ResilientLLMClient counters across the given clients (others are skipped)."""
+    totals = {}
+    for client in clients:
+        while client is not None and not isinstance(client, ResilientLLMClient):
+            client = getattr(client, "inner", None)
+        if client is None:
+            continue
+        for key, value in client.stats.items():
+            totals[key] = totals.get(key, 0) + value
+    return " ".join(f"{key}={value}" for key, value in totals.items()) or "no calls"
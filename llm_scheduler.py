@@ -0,0 +1,201 @@
+# llm_scheduler.py
+import asyncio
+import contextvars
+import time
+from collections import OrderedDict, deque
+import config
+import llm_client
+
+logger = config.logger
+
+# Who an LLM call is made on behalf of (normally a chapter id). Calls are queued fairly
+# between owners, so one busy chapter cannot starve the others. Tasks inherit the value.
+current_owner = contextvars.ContextVar("llm_owner", default="default")
+
+
+def estimate_tokens(contents, generation_config: dict = None) -> int:
+    """Rough token cost of a call: ~4 characters per prompt token plus the output budget."""
+    prompt_tokens = len(llm_client.contents_to_text(contents)) // 4 + 1
+    output_tokens = (generation_config or {}).get("max_output_tokens", config.LLM_ESTIMATED_OUTPUT_TOKENS)
+    return prompt_tokens + output_tokens
+
+
+class TokenBucket:
+    """Classic token bucket: holds up to `capacity` tokens and refills at `rate` tokens per second."""
+    def __init__(self, capacity: float, rate: float):
+        self.capacity = capacity
+        self.rate = rate
+        self.tokens = capacity
+        self.updated = time.monotonic()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def time_until(self, amount: float) -> float:
+        """Seconds until `amount` tokens are available (0 if they already are)."""
+        self._refill()
+        if self.tokens >= amount:
+            return 0.0
+        return (amount - self.tokens) / self.rate
+
+    def consume(self, amount: float):
+        self._refill()
+        self.tokens -= amount
+
+
+class ModelBudget:
+    """
+    Requests-per-minute and tokens-per-minute budget for one model.
+
+    Waiters are grouped by owner and served round-robin: the dispatcher takes the head
+    request of the next owner in turn, sleeps until both buckets can pay for it, then lets
+    it through. Queue depth and wait times are tracked for sizing concurrency.
+    """
+    def __init__(self, model_name: str, rpm: int, tpm: int):
+        self.model_name = model_name
+        self.requests = TokenBucket(rpm, rpm / 60.0)
+        self.tokens = TokenBucket(tpm, tpm / 60.0)
+        self._queues = OrderedDict()
+        self._wakeup = None
+        self._dispatcher = None
+        self.stats = {"granted": 0, "queue_depth": 0, "max_queue_depth": 0,
+                      "total_wait_s": 0.0, "max_wait_s": 0.0}
+
+    async def acquire(self, tokens: int, owner: str):
+        """Waits until this call fits in the model's budget. Returns the time spent waiting."""
+        loop = asyncio.get_running_loop()
+        tokens = min(tokens, self.tokens.capacity) # An oversized request still has to run eventually
+        future = loop.create_future()
+        enqueued_at = time.monotonic()
+        self._queues.setdefault(owner, deque()).append((future, tokens))
+        self._set_depth(self.stats["queue_depth"] + 1)
+
+        if self._dispatcher is None or self._dispatcher.done():
+            self._wakeup = asyncio.Event()
+            self._dispatcher = loop.create_task(self._dispatch())
+        self._wakeup.set()
+
+        try:
+            await future
+        finally:
+            if not future.done():
+                future.cancel() # Caller gave up; the dispatcher skips cancelled waiters
+
+        waited = time.monotonic() - enqueued_at
+        self.stats["granted"] += 1
+        self.stats["total_wait_s"] += waited
+        self.stats["max_wait_s"] = max(self.stats["max_wait_s"], waited)
+        return waited
+
+    def _set_depth(self, depth: int):
+        self.stats["queue_depth"] = depth
+        self.stats["max_queue_depth"] = max(self.stats["max_queue_depth"], depth)
+
+    def _next_waiter(self):
+        """
+        Pops the head request of the next owner in round-robin order, skipping cancelled ones.
+        The waiter returned still counts toward queue_depth until the dispatcher is done with it.
+        """
+        while self._queues:
+            owner, queue = next(iter(self._queues.items()))
+            future, tokens = queue.popleft()
+            if queue:
+                self._queues.move_to_end(owner)
+            else:
+                del self._queues[owner]
+            if not future.cancelled():
+                return future, tokens
+            self._set_depth(self.stats["queue_depth"] - 1)
+        return None, 0
+
+    async def _dispatch(self):
+        while True:
+            if not self._queues:
+                self._wakeup.clear()
+                await self._wakeup.wait()
+                continue
+            future, tokens = self._next_waiter()
+            if future is None:
+                continue
+            delay = max(self.requests.time_until(1), self.tokens.time_until(tokens))
+            if delay > 0:
+                await asyncio.sleep(delay)
+            self._set_depth(self.stats["queue_depth"] - 1) # Granted or given up: no longer waiting
+            if future.cancelled():
+                continue
+            self.requests.consume(1)
+            self.tokens.consume(tokens)
+            future.set_result(None)
+
+    def snapshot(self) -> dict:
+        granted = self.stats["granted"]
+        return {
+            "model": self.model_name,
+            "queue_depth": self.stats["queue_depth"],
+            "max_queue_depth": self.stats["max_queue_depth"],
+            "granted": granted,
+            "avg_wait_s": self.stats["total_wait_s"] / granted if granted else 0.0,
+            "max_wait_s": self.stats["max_wait_s"],
+        }
+
+
+class LLMScheduler:
+    """Process-wide registry of per-model budgets, configured from config.LLM_RATE_LIMITS."""
+    def __init__(self, limits: dict = None):
+        self.limits = limits if limits is not None else config.LLM_RATE_LIMITS
+        self._budgets = {}
+
+    def budget(self, model_name: str) -> ModelBudget:
+        if model_name not in self._budgets:
+            limits = self.limits.get(model_name, config.LLM_DEFAULT_RATE_LIMIT)
+            self._budgets[model_name] = ModelBudget(model_name, limits["rpm"], limits["tpm"])
+        return self._budgets[model_name]
+
+    async def acquire(self, model_name: str, tokens: int, owner: str = None) -> float:
+        return await self.budget(model_name).acquire(tokens, owner or current_owner.get())
+
+    def snapshot(self) -> list:
+        return [budget.snapshot() for budget in self._budgets.values()]
+
+    def summary(self) -> str:
+        return "; ".join(
+            f"{s['model']}: calls={s['granted']} queued={s['queue_depth']} max_queued={s['max_queue_depth']} "
+            f"avg_wait={s['avg_wait_s']:.2f}s max_wait={s['max_wait_s']:.2f}s"
+            for s in self.snapshot()
+        ) or "no calls"
+
+
+class ScheduledLLMClient(llm_client.LLMClient):
+    """Wraps an LLMClient so every call first waits for its model's RPM/TPM budget."""
+    def __init__(self, inner: llm_client.LLMClient, scheduler: LLMScheduler):
+        super().__init__(inner.model_name)
+        self.inner = inner
+        self.scheduler = scheduler
+        self.backend_name = inner.backend_name
+
+    async def generate(self, contents, generation_config: dict = None, bypass_cache: bool = False,
+                       timeout_s: float = None) -> str:
+        waited = await self.scheduler.acquire(self.model_name, estimate_tokens(contents, generation_config))
+        if waited > 1.0:
+            logger.info(f"  [LLM Scheduler] Waited {waited:.1f}s for {self.model_name} budget")
+        return await self.inner.generate(contents, generation_config, timeout_s=timeout_s)
+
+    async def generate_stream(self, contents, generation_config: dict = None, bypass_cache: bool = False,
+                              timeout_s: float = None):
+        waited = await self.scheduler.acquire(self.model_name, estimate_tokens(contents, generation_config))
+        if waited > 1.0:
+            logger.info(f"  [LLM Scheduler] Waited {waited:.1f}s for {self.model_name} budget")
+        async for chunk in self.inner.generate_stream(contents, generation_config, timeout_s=timeout_s):
+            yield chunk
+
+
+_scheduler = None
+
+def get_scheduler() -> LLMScheduler:
+    """Returns the process-wide scheduler shared by every model client."""
+    global _scheduler
+    if _scheduler is None:
+        _scheduler = LLMScheduler()
+    return _scheduler
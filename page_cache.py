@@ -0,0 +1,146 @@
+# page_cache.py
+import hashlib
+import json
+import os
+import datetime
+import config
+
+logger = config.logger
+
+
+class PageCacheMiss(Exception):
+    """Raised in offline mode when a URL has never been cached."""
+
+
+class PageCache:
+    """
+    Content-addressed on-disk cache for raw Wikisource responses.
+
+    Response bodies are stored once under objects/<sha256 of body>, and index.json maps
+    each URL to its body hash, status code, encoding and HTTP validators (ETag /
+    Last-Modified). The validators are sent back as If-None-Match / If-Modified-Since so an
+    unchanged page costs a 304 with no body. In offline mode the network is never touched:
+    cached entries are served as-is and missing ones raise PageCacheMiss.
+    """
+    def __init__(self, cache_dir: str = None, offline: bool = None):
+        self.cache_dir = cache_dir or config.PAGE_CACHE_DIR
+        self.offline = config.SCRAPER_OFFLINE if offline is None else offline
+        self.objects_dir = os.path.join(self.cache_dir, "objects")
+        self.index_path = os.path.join(self.cache_dir, "index.json")
+        os.makedirs(self.objects_dir, exist_ok=True)
+        self._index = self._load_index()
+        self.stats = {"hits_offline": 0, "revalidated": 0, "fetched": 0, "misses_offline": 0}
+
+    def _load_index(self) -> dict:
+        if os.path.exists(self.index_path):
+            try:
+                with open(self.index_path, 'r', encoding='utf-8') as f:
+                    return json.load(f)
+            except json.JSONDecodeError:
+                logger.warning(f"  [Page Cache] {self.index_path} is corrupted. Starting with an empty cache index.")
+        return {}
+
+    def _save_index(self):
+        tmp_path = self.index_path + ".tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(self._index, f, indent=2)
+        os.replace(tmp_path, self.index_path)
+
+    def _object_path(self, body_hash: str) -> str:
+        return os.path.join(self.objects_dir, body_hash)
+
+    def lookup(self, url: str):
+        """Returns the index entry for url, or None if it is not cached (or its body went missing)."""
+        entry = self._index.get(url)
+        if entry and os.path.exists(self._object_path(entry["body_sha256"])):
+            return entry
+        return None
+
+    def read_text(self, entry: dict) -> str:
+        with open(self._object_path(entry["body_sha256"]), 'rb') as f:
+            body = f.read()
+        return body.decode(entry.get("encoding") or "utf-8", errors="replace")
+
+    def conditional_headers(self, entry: dict) -> dict:
+        """Builds the revalidation headers for a cached entry."""
+        headers = {}
+        if entry is None:
+            return headers
+        if entry.get("etag"):
+            headers["If-None-Match"] = entry["etag"]
+        if entry.get("last_modified"):
+            headers["If-Modified-Since"] = entry["last_modified"]
+        return headers
+
+    def store(self, url: str, status_code: int, body: bytes, encoding: str, headers) -> dict:
+        """Writes the body under its content hash (if new) and records the URL's validators."""
+        body_hash = hashlib.sha256(body).hexdigest()
+        object_path = self._object_path(body_hash)
+        if not os.path.exists(object_path):
+            tmp_path = object_path + ".tmp"
+            with open(tmp_path, 'wb') as f:
+                f.write(body)
+            os.replace(tmp_path, object_path)
+
+        entry = {
+            "body_sha256": body_hash,
+            "status_code": status_code,
+            "encoding": encoding,
+            "etag": headers.get("ETag"),
+            "last_modified": headers.get("Last-Modified"),
+            "fetched_at": datetime.datetime.now().isoformat(),
+        }
+        self._index[url] = entry
+        self._save_index()
+        return entry
+
+    def mark_revalidated(self, url: str, headers) -> dict:
+        """Refreshes validators after a 304 so the next conditional request uses the newest ones."""
+        entry = self._index[url]
+        entry["etag"] = headers.get("ETag") or entry.get("etag")
+        entry["last_modified"] = headers.get("Last-Modified") or entry.get("last_modified")
+        entry["revalidated_at"] = datetime.datetime.now().isoformat()
+        self._save_index()
+        return entry
+
+    async def fetch(self, client, url: str, rate_limiter=None):
+        """
+        Returns (status_code, html) for url, going to the network only when needed.
+        Cached pages are revalidated with a conditional GET; a 304 is answered from disk.
+        Raises httpx.HTTPStatusError for statuses other than 200/304/404.
+        """
+        entry = self.lookup(url)
+        if self.offline:
+            if entry is None:
+                self.stats["misses_offline"] += 1
+                raise PageCacheMiss(f"{url} is not in the page cache and offline mode is enabled.")
+            self.stats["hits_offline"] += 1
+            return entry["status_code"], self.read_text(entry)
+
+        if rate_limiter is not None:
+            await rate_limiter.wait(url)
+        response = await client.get(url, headers=self.conditional_headers(entry))
+
+        if response.status_code == 304 and entry is not None:
+            self.stats["revalidated"] += 1
+            entry = self.mark_revalidated(url, response.headers)
+            logger.info(f"  [Page Cache] Not modified, served from disk: {url}")
+            return entry["status_code"], self.read_text(entry)
+
+        # Missing pages come back as 404 with a normal MediaWiki layout; the scraper's validity
+        # rules decide what they mean, so they are cached too. Anything else is an error.
+        if response.status_code not in (200, 404):
+            response.raise_for_status()
+        self.stats["fetched"] += 1
+        self.store(url, response.status_code, response.content, response.encoding, response.headers)
+        return response.status_code, response.text
+
+
+_page_cache = None
+
+def get_page_cache() -> PageCache:
+    """Returns the process-wide page cache."""
+    global _page_cache
+    if _page_cache is None:
+        _page_cache = PageCache()
+    return _page_cache
@@ -0,0 +1,201 @@
+# pipeline.py
+import asyncio
+import time
+import config
+import llm_scheduler
+import review
+import scrape
+import spin_write
+
+logger = config.logger
+
+STAGES = ("scrape", "summarize", "spin", "review")
+
+
+def chapter_id(chapter: dict) -> str:
+    return f"{chapter['book_name_slug']}_Book{chapter['book_num']}_Chapter{chapter['chap_num']}"
+
+
+async def walk_book_chapters(book_name_slug: str, start_book_num: int = 1, rate_limiter: scrape.HostRateLimiter = None):
+    """
+    Yields chapter dicts for Book_N/Chapter_M in reading order, with the same stop rules as
+    scrape.crawl_book: a book ends at its first invalid chapter, the walk at the first book
+    whose Chapter_1 is invalid. Chapters are fetched one at a time and saved to disk, so a
+    full pipeline downstream pauses the scraper instead of piling pages up in memory.
+    'screenshot_path' is None for chapters without a screenshot (see scrape.scrape_content).
+    """
+    rate_limiter = rate_limiter or scrape.HostRateLimiter()
+    book_num = start_book_num
+    while True:
+        chap_num = 1
+        while True:
+            text, title, screenshot_path, is_valid = await scrape.scrape_content(
+                book_name_slug, book_num, chap_num, rate_limiter=rate_limiter)
+            if not is_valid:
+                break
+            yield {"book_name_slug": book_name_slug, "book_num": book_num, "chap_num": chap_num,
+                   "title": title, "text": text, "screenshot_path": screenshot_path}
+            chap_num += 1
+        if chap_num == 1:
+            return
+        book_num += 1
+
+
+async def chapter_range(book_name_slug: str, book_num: int, chap_nums, rate_limiter: scrape.HostRateLimiter = None):
+    """Yields the given chapters of one book in order. Chapters that fail to scrape are logged and skipped."""
+    rate_limiter = rate_limiter or scrape.HostRateLimiter()
+    for chap_num in chap_nums:
+        text, title, screenshot_path, is_valid = await scrape.scrape_content(
+            book_name_slug, book_num, chap_num, rate_limiter=rate_limiter)
+        if not is_valid:
+            logger.warning(f"  [Pipeline] {book_name_slug} Book {book_num} Chapter {chap_num} is not a valid chapter. Skipping.")
+            continue
+        yield {"book_name_slug": book_name_slug, "book_num": book_num, "chap_num": chap_num,
+               "title": title, "text": text, "screenshot_path": screenshot_path}
+
+
+class StageStats:
+    """Per-stage counters: items done/failed, time spent working, and the deepest input queue seen."""
+    def __init__(self, name: str):
+        self.name = name
+        self.processed = 0
+        self.failed = 0
+        self.busy_s = 0.0
+        self.max_queue_depth = 0
+        self.started_at = None
+        self.finished_at = None
+
+    def throughput(self) -> float:
+        if self.started_at is None:
+            return 0.0
+        elapsed = (self.finished_at or time.perf_counter()) - self.started_at
+        return self.processed / elapsed if elapsed > 0 else 0.0
+
+    def summary(self) -> str:
+        return (f"{self.name}: done={self.processed} failed={self.failed} "
+                f"throughput={self.throughput():.2f}/s busy={self.busy_s:.1f}s max_queued={self.max_queue_depth}")
+
+
+class ChapterPipeline:
+    """
+    Runs chapters through scrape -> summarize -> spin -> review, with every stage working
+    on a different chapter at the same time. Stages are connected by asyncio.Queues of at
+    most queue_size items, so a slow stage holds back the ones before it (backpressure)
+    and memory stays bounded however long the book is.
+
+    Each chapter dict gains 'summary', 'spun_text', 'prompt_name' and 'review_text'. A
+    chapter whose spin fails skips the review; a failed review leaves 'review_text' None.
+    A stage that raises counts as a failure for that chapter, which still travels on.
+    on_result(chapter), if given, is awaited for every chapter as it leaves the pipeline.
+    """
+    def __init__(self, spin_writer: spin_write.SpinWrite, reviewer: review.Review, queue_size: int = None,
+                 workers: int = None, on_result=None):
+        self.spin_writer = spin_writer
+        self.reviewer = reviewer
+        self.queue_size = queue_size or config.PIPELINE_QUEUE_SIZE
+        self.workers = workers or config.PIPELINE_STAGE_WORKERS
+        self.on_result = on_result
+        self.stats = {name: StageStats(name) for name in STAGES}
+
+    async def run(self, chapters) -> list:
+        """Feeds the chapters (an async iterable, e.g. walk_book_chapters) through every stage. Returns them in order."""
+        to_summarize = asyncio.Queue(self.queue_size)
+        to_spin = asyncio.Queue(self.queue_size)
+        to_review = asyncio.Queue(self.queue_size)
+        done = asyncio.Queue()
+        results = []
+
+        async def collect():
+            while True:
+                chapter = await done.get()
+                if chapter is None:
+                    return
+                if self.on_result:
+                    await self.on_result(chapter)
+                results.append(chapter)
+
+        await asyncio.gather(
+            self._source_stage(chapters, to_summarize),
+            self._stage("summarize", self._summarize, to_summarize, to_spin),
+            self._stage("spin", self._spin, to_spin, to_review),
+            self._stage("review", self._review, to_review, done, final=True),
+            collect(),
+        )
+        return sorted(results, key=lambda c: (c["book_num"], c["chap_num"]))
+
+    async def _source_stage(self, chapters, out_queue: asyncio.Queue):
+        stats = self.stats["scrape"]
+        stats.started_at = time.perf_counter()
+        try:
+            fetch_start = time.perf_counter()
+            async for chapter in chapters:
+                stats.busy_s += time.perf_counter() - fetch_start
+                stats.processed += 1
+                await out_queue.put(chapter)
+                fetch_start = time.perf_counter()
+        except Exception as e:
+            # The chapters already fed still go through every stage
+            logger.error(f"  [Pipeline] Chapter source raised {type(e).__name__}: {e}. No more chapters will be fed.",
+                         exc_info=True)
+        finally:
+            stats.finished_at = time.perf_counter()
+            for _ in range(self.workers):
+                await out_queue.put(None)
+
+    async def _stage(self, name: str, handler, in_queue: asyncio.Queue, out_queue: asyncio.Queue, final: bool = False):
+        stats = self.stats[name]
+        stats.started_at = time.perf_counter()
+
+        async def worker():
+            while True:
+                stats.max_queue_depth = max(stats.max_queue_depth, in_queue.qsize())
+                chapter = await in_queue.get()
+                if chapter is None:
+                    return
+                llm_scheduler.current_owner.set(chapter_id(chapter))
+                work_start = time.perf_counter()
+                try:
+                    ok = await handler(chapter)
+                except Exception as e:
+                    # A raising handler must not take the worker down: its chapter and the sentinels would never arrive
+                    logger.error(f"  [Pipeline] {name} raised {type(e).__name__} for {chapter_id(chapter)}: {e}",
+                                 exc_info=True)
+                    ok = False
+                stats.busy_s += time.perf_counter() - work_start
+                if ok:
+                    stats.processed += 1
+                else:
+                    stats.failed += 1
+                    logger.warning(f"  [Pipeline] {name} failed for {chapter_id(chapter)}")
+                # Chapters that failed a stage still travel on, so every chapter is reported
+                await out_queue.put(chapter)
+
+        await asyncio.gather(*(worker() for _ in range(self.workers)))
+        stats.finished_at = time.perf_counter()
+        for _ in range(1 if final else self.workers):
+            await out_queue.put(None)
+
+    async def _summarize(self, chapter: dict) -> bool:
+        chapter["summary"] = await self.spin_writer.ai_summarize(chapter["text"])
+        return not spin_write.summary_failed(chapter["summary"])
+
+    async def _spin(self, chapter: dict) -> bool:
+        chapter["spun_text"], chapter["prompt_name"] = await self.spin_writer.ai_spin_content(
+            chapter["text"], None, summary=chapter.get("summary"))
+        if spin_write.spin_failed(chapter["spun_text"]):
+            chapter["spun_text"] = None
+            return False
+        return True
+
+    async def _review(self, chapter: dict) -> bool:
+        chapter["review_text"] = None
+        if chapter.get("spun_text") is None:
+            return False
+        review_text = await self.reviewer.ai_review_content(chapter["spun_text"])
+        if review.review_failed(review_text):
+            return False
+        chapter["review_text"] = review_text
+        return True
+
+    def summary(self) -> str:
+        return "\n".join(self.stats[name].summary() for name in STAGES)
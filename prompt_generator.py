@@ -1,21 +1,13 @@
 # prompt_generator.py
-import google.generativeai as genai
-import os
-import asyncio
+import llm_client
 
+prompt_generator_model = 'gemini-1.5-pro-latest'
 
 
-try:
-    genai.configure(api_key=os.environ["GEMINI_API_KEY"])
-except KeyError:
-    print("Error: GEMINI_API_KEY environment variable not set in prompt_generator.py.")
-    print("Please set it before running the script.")
-    exit()
-
 class PromptGenerator:
-    def __init__(self, model_name='gemini-1.5-pro-latest'): 
+    def __init__(self, model_name=prompt_generator_model, client: llm_client.LLMClient = None): 
         self.model_name = model_name
-        self.model = genai.GenerativeModel(self.model_name)
+        self.client = client or llm_client.get_llm_client(self.model_name)
         print(f"[Prompt Generator] Initialized with model: {self.model_name}")
 
     async def generate_new_prompt_instruction(self,
@@ -72,19 +64,19 @@ class PromptGenerator:
 
         try:
             print(f"  [Prompt Generator] Requesting new prompt from model: {self.model_name}...")
-            response = await self.model.generate_content_async(
-                contents=[
+            response_text = await self.client.generate(
+                [
                     {"role": "user", "parts": [{"text": system_instruction}]},
                     {"role": "user", "parts": [{"text": full_user_prompt}]}
                 ],
-                generation_config=genai.types.GenerationConfig(
-                    temperature=0.7, # Higher temperature for more creative prompts
-                    max_output_tokens=250
-                )
+                generation_config={
+                    "temperature": 0.7, # Higher temperature for more creative prompts
+                    "max_output_tokens": 250
+                }
             )
             
-            if response.candidates and response.candidates[0].content.parts:
-                generated_prompt = response.candidates[0].content.parts[0].text.strip()
+            if response_text:
+                generated_prompt = response_text.strip()
                 
                 if not generated_prompt.endswith("\n\n"):
                     generated_prompt += "\n\n"
@@ -80,6 +80,39 @@ def get_adaptive_prompt(current_scores: dict, exploration_rate: float = 0.35):
 
     return chosen_name, current_scores[chosen_name]["template"]
 
+def get_best_prompt(current_scores: dict):
+    """
+    The prompt get_adaptive_prompt picks when it exploits, without printing or resetting the
+    scores. Returns (name, template), or (None, None) if no prompt is eligible.
+    """
+    prompt_names = [name for name, data in current_scores.items() if data['score'] > -5.0]
+    if not prompt_names:
+        return None, None
+    chosen_name = max(prompt_names, key=lambda name: current_scores[name]["score"])
+    return chosen_name, current_scores[chosen_name]["template"]
+
+def get_candidate_prompts(current_scores: dict, count: int, exploration_rate: float = 0.35) -> list:
+    """
+    Picks up to `count` distinct templates for parallel candidate spins. Each slot takes the
+    best-scoring remaining prompt, or a random remaining one with probability exploration_rate.
+    Returns [(name, template), ...].
+    """
+    remaining = sorted((name for name, data in current_scores.items() if data['score'] > -5.0),
+                       key=lambda name: current_scores[name]["score"], reverse=True)
+    if not remaining:
+        name, template = get_adaptive_prompt(current_scores, exploration_rate) # Resets to the defaults
+        return [(name, template)] if name else []
+
+    chosen = []
+    while remaining and len(chosen) < count:
+        if chosen and random.random() < exploration_rate:
+            name = remaining.pop(random.randrange(len(remaining)))
+        else:
+            name = remaining.pop(0)
+        chosen.append(name)
+    print(f"  [Prompt Manager] Candidate prompts: {', '.join(chosen)}")
+    return [(name, current_scores[name]["template"]) for name in chosen]
+
 def update_prompt_score(prompt_name: str, reward: float, current_scores: dict, learning_rate: float = 0.1):
     """
     Updates the score of a specific prompt based on the received reward.
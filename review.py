@@ -1,26 +1,24 @@
-import google.generativeai as genai
-import os
-import asyncio
+import re
+import llm_client
 
 review_model='gemini-1.5-pro'  #specify model here
 
-try:
-    genai.configure(api_key=os.environ["GEMINI_API_KEY"])
-except KeyError:
-    print("Error: GEMINI_API_KEY environment variable not set.")
-    print("Please set it before running the script.")
-    exit()
+REVIEW_EMPTY_MESSAGE = "Failed to review content."
+REVIEW_ERROR_MESSAGE = "Failed to review content due to an error."
 
+def review_failed(review_text: str) -> bool:
+    """True if ai_review_content returned one of its failure messages instead of a review."""
+    return review_text in (REVIEW_EMPTY_MESSAGE, REVIEW_ERROR_MESSAGE)
 
 
 class Review:
-    def __init__(self, model_name=review_model):
+    def __init__(self, model_name=review_model, client: llm_client.LLMClient = None):
         self.model_name = model_name
-        self.model = genai.GenerativeModel(self.model_name)
+        self.client = client or llm_client.get_llm_client(self.model_name)
 
 
-    async def ai_review_content(self,content_to_review: str) -> str:
-        
+    async def ai_review_content(self,content_to_review: str, bypass_cache: bool = False, on_chunk=None) -> str:
+        """Returns editorial feedback. With on_chunk, it is streamed and on_chunk(text) is called per chunk."""
         prompt = (
             "You are an experienced book editor. Review the following chapter for clarity, coherence, grammar, spelling, "
             "punctuation, consistency in tone, and overall readability. "
@@ -32,15 +30,16 @@ class Review:
         )
 
         try:
-            response = await self.model.generate_content_async(prompt)
-            if response.candidates and response.candidates[0].content.parts:
-                return response.candidates[0].content.parts[0].text
+            review_text = await llm_client.generate_text(self.client, prompt, bypass_cache=bypass_cache,
+                                                         on_chunk=on_chunk)
+            if review_text:
+                return review_text
             else:
                 print("Warning: Gemini response had no text content for reviewing.")
-                return "Failed to review content."
+                return REVIEW_EMPTY_MESSAGE
         except Exception as e:
             print(f"Error during AI content reviewing: {e}")
-            return "Failed to review content due to an error."
+            return REVIEW_ERROR_MESSAGE
 
 
 
@@ -51,4 +50,22 @@ class Review:
 
     
 
-    
\ No newline at end of file
+    
+
+    async def ai_score_content(self, content_to_score: str) -> float:
+        """
+        Asks the review model for a single 1-10 quality rating, as a cheap way to pre-rank
+        candidate spins. Returns None if the model did not answer with a number.
+        """
+        prompt = (
+            "You are an experienced book editor. Rate the overall quality of the following chapter rewrite "
+            "for clarity, coherence, style and readability on a scale from 1 to 10. "
+            "Answer with the number only.\n\n" + content_to_score
+        )
+        try:
+            answer = await self.client.generate(prompt, generation_config={"temperature": 0.0, "max_output_tokens": 8})
+        except Exception as e:
+            print(f"Error during AI content scoring: {e}")
+            return None
+        match = re.search(r"\d+(\.\d+)?", answer or "")
+        return float(match.group()) if match else None
@@ -1,8 +1,14 @@
-from playwright.async_api import async_playwright
+import httpx
+from bs4 import BeautifulSoup, Comment, NavigableString
 import re
 import os
 import asyncio
+import contextlib
+import time
+from urllib.parse import urlparse
 import config
+import page_cache
+import screenshots
 # BASE_URL = "https://en.wikisource.org/wiki/"
 
 logger = config.logger
@@ -27,114 +33,500 @@ def construct_wikisource_url(book_name_slug: str, book_num: int, chap_num: int)
     """
     return f"{config.BASE_URL}{book_name_slug}/Book_{book_num}/Chapter_{chap_num}"    
 
-async def scrape_content(book_name_slug: str, book_num: int, chap_num: int):
+class BrowserPool:
+    """
+    Owns one long-lived Chromium instance and hands out pages from a bounded pool.
+
+    Launching Playwright and a browser costs far more than scraping a single
+    Wikisource page, so the pool is started once on first use and its pages are
+    reused across chapters until close() is called.
+    """
+    def __init__(self, max_pages: int = None, headless: bool = None, timeout_ms: int = None):
+        self.max_pages = max_pages if max_pages is not None else config.SCRAPER_MAX_PAGES
+        self.headless = headless if headless is not None else config.PLAYWRIGHT_HEADLESS
+        self.timeout_ms = timeout_ms if timeout_ms is not None else config.PLAYWRIGHT_TIMEOUT_MS
+
+        self._playwright = None
+        self._browser = None
+        self._context = None
+        self._idle_pages = []
+        self._semaphore = None
+        self._start_lock = None
+
+    @property
+    def is_running(self) -> bool:
+        return self._browser is not None
+
+    async def start(self):
+        """Launches the browser if it is not running yet. Safe to call concurrently."""
+        if self._start_lock is None:
+            self._start_lock = asyncio.Lock()
+        async with self._start_lock:
+            if self._browser is not None:
+                return
+            logger.info(f"  [Scraper] Launching shared browser (headless={self.headless}, max_pages={self.max_pages})")
+            from playwright.async_api import async_playwright # Imported on first launch; the HTTP path never needs it
+            self._playwright = await async_playwright().start()
+            self._browser = await self._playwright.chromium.launch(headless=self.headless)
+            self._context = await self._browser.new_context()
+            self._context.set_default_timeout(self.timeout_ms)
+            self._semaphore = asyncio.Semaphore(self.max_pages)
+
+    @contextlib.asynccontextmanager
+    async def page(self):
+        """
+        Yields a page from the pool, opening a new one only when no idle page is available.
+        At most max_pages pages are in use at any time; pages that raised are discarded.
+        """
+        await self.start()
+        async with self._semaphore:
+            page = self._idle_pages.pop() if self._idle_pages else await self._context.new_page()
+            healthy = False
+            try:
+                yield page
+                healthy = True
+            finally:
+                if healthy and not page.is_closed():
+                    self._idle_pages.append(page)
+                else:
+                    with contextlib.suppress(Exception):
+                        await page.close()
+
+    async def close(self):
+        """Closes every pooled page, the browser and the Playwright driver."""
+        if self._browser is None:
+            return
+        logger.info("  [Scraper] Shutting down shared browser.")
+        for page in self._idle_pages:
+            with contextlib.suppress(Exception):
+                await page.close()
+        self._idle_pages = []
+        try:
+            await self._context.close()
+            await self._browser.close()
+        finally:
+            await self._playwright.stop()
+            self._playwright = None
+            self._browser = None
+            self._context = None
+
+
+_browser_pool = None
+
+def get_browser_pool() -> BrowserPool:
+    """Returns the process-wide browser pool, creating it (but not launching it) on first use."""
+    global _browser_pool
+    if _browser_pool is None:
+        _browser_pool = BrowserPool()
+    return _browser_pool
+
+async def close_browser_pool():
+    """Shuts down the process-wide browser pool if it was ever started."""
+    global _browser_pool
+    if _browser_pool is not None:
+        await _browser_pool.close()
+        _browser_pool = None
+
+class HostRateLimiter:
+    """
+    Spaces out requests per host so that at most `requests_per_second` start each second.
+    Each caller reserves the next free slot for its host and sleeps until that slot arrives.
+    """
+    def __init__(self, requests_per_second: float = None):
+        rate = requests_per_second if requests_per_second is not None else config.CRAWL_REQUESTS_PER_SECOND
+        self.min_interval = 1.0 / rate if rate and rate > 0 else 0.0
+        self._next_slot = {}
+
+    async def wait(self, url: str):
+        if self.min_interval <= 0:
+            return
+        host = urlparse(url).netloc
+        now = time.monotonic()
+        slot = max(now, self._next_slot.get(host, 0.0))
+        self._next_slot[host] = slot + self.min_interval
+        if slot > now:
+            await asyncio.sleep(slot - now)
+
+
+_http_client = None
+
+def get_http_client() -> httpx.AsyncClient:
+    """Returns the process-wide HTTP client used by the browserless fast path."""
+    global _http_client
+    if _http_client is None:
+        _http_client = httpx.AsyncClient(
+            timeout=config.PLAYWRIGHT_TIMEOUT_MS / 1000,
+            follow_redirects=True,
+            headers={"User-Agent": config.SCRAPER_USER_AGENT},
+        )
+    return _http_client
+
+async def close_scraper():
+    """
+    Shuts down everything the scraper keeps open: deferred screenshots are finished first,
+    then the HTTP client and the shared browser are closed.
+    """
+    global _http_client
+    await screenshots.drain_screenshot_queue()
+    if _http_client is not None:
+        await _http_client.aclose()
+        _http_client = None
+    await close_browser_pool()
+
+
+def _text_content(element) -> str:
+    """Mirrors the DOM's textContent: all descendant text, including <style> contents, but not comments."""
+    return "".join(
+        str(node) for node in element.descendants
+        if isinstance(node, NavigableString) and not isinstance(node, Comment)
+    )
+
+def extract_chapter_from_html(html: str):
+    """
+    Pulls the same fields the browser path reads out of a Wikisource page's static HTML.
+    Returns (metadata_title, paragraph_texts); metadata_title is None if the title element
+    is missing and paragraph_texts is None if there are no content paragraphs.
+    """
+    soup = BeautifulSoup(html, "html.parser")
+    title_element = soup.select_one('h1#firstHeading span.mw-page-title-main')
+    if title_element is None:
+        return None, None
+    paragraph_elements = soup.select('.prp-pages-output p')
+    if not paragraph_elements:
+        return _text_content(title_element), None
+    return _text_content(title_element), [_text_content(p) for p in paragraph_elements]
+
+def build_chapter_text(url: str, metadata_title, raw_paragraphs, log: bool = True):
+    """
+    Applies the chapter validity rules shared by the HTTP and browser paths.
+    Strips paragraphs, drops the '.mw-parser-output' CSS blocks and joins them with blank lines.
+    Returns (scraped_text, is_valid_chapter).
+    """
+    if metadata_title is None:
+        if log:
+            logger.warning(f"  [Scraper] Warning: Page title element not found on {url}. Likely invalid page.")
+        return "", False
+    if "Page not found" in metadata_title or "No such page" in metadata_title:
+        if log:
+            logger.info(f"  [Scraper] Page title indicates invalid chapter: '{metadata_title}'")
+        return "", False
+    if not raw_paragraphs:
+        if log:
+            logger.info(f"  [Scraper] No content paragraphs found on {url}. Possibly invalid chapter or different structure.")
+        return "", False
+
+    paragraph_texts = []
+    for text_content in raw_paragraphs:
+        text = text_content.strip()
+        # Check if the text content looks like CSS rules
+        if not text.startswith('.mw-parser-output'):
+            paragraph_texts.append(text)
+    scraped_text = "\n\n".join(paragraph_texts)
+    if not scraped_text.strip(): # Check if actual content was scraped
+        if log:
+            logger.info("  [Scraper] Scraped paragraphs were empty after stripping. Invalid content.")
+        return scraped_text, False
+    return scraped_text, True
+
+async def _fetch_chapter_http(url: str, rate_limiter: HostRateLimiter = None):
+    """
+    Browserless fast path: one (conditional) GET through the page cache plus an HTML parse.
+    Returns (metadata_title, raw_paragraphs).
+    """
+    _, html = await page_cache.get_page_cache().fetch(get_http_client(), url, rate_limiter)
+    return extract_chapter_from_html(html)
+
+# Reads the title and every paragraph in one in-page call instead of one round-trip per element.
+# Paragraphs come back stripped with the '.mw-parser-output' CSS blocks already removed.
+CHAPTER_EXTRACTION_JS = """
+() => {
+    const title = document.querySelector('h1#firstHeading span.mw-page-title-main');
+    const titleVisible = !!title && !!(title.offsetWidth || title.offsetHeight || title.getClientRects().length);
+    const paragraphs = Array.from(document.querySelectorAll('.prp-pages-output p'));
+    return {
+        title: titleVisible ? title.textContent : null,
+        paragraphCount: paragraphs.length,
+        paragraphs: paragraphs
+            .map(p => p.textContent.trim())
+            .filter(text => !text.startsWith('.mw-parser-output')),
+    };
+}
+"""
+
+async def extract_chapter_from_page(page):
+    """
+    Browser counterpart of extract_chapter_from_html, done in a single page.evaluate.
+    Returns (metadata_title, paragraph_texts) with the same None conventions.
+    """
+    result = await page.evaluate(CHAPTER_EXTRACTION_JS)
+    if result["title"] is None:
+        return None, None
+    if result["paragraphCount"] == 0:
+        return result["title"], None
+    return result["title"], result["paragraphs"]
+
+async def _fetch_chapter_browser(url: str, pool: BrowserPool, rate_limiter: HostRateLimiter = None,
+                                 screenshot_path: str = None, screenshot_options: screenshots.ScreenshotOptions = None):
+    """
+    Renders the page in the shared browser. Used for 'inline' screenshots.
+    Returns (metadata_title, raw_paragraphs, screenshot_taken).
+    """
+    async with pool.page() as page:
+        if rate_limiter is not None:
+            await rate_limiter.wait(url)
+        await page.goto(url, wait_until="domcontentloaded", timeout=pool.timeout_ms)
+        await page.wait_for_load_state('networkidle', timeout=pool.timeout_ms)
+
+        metadata_title, raw_paragraphs = await extract_chapter_from_page(page)
+        if metadata_title is None:
+            return None, None, False
+
+        _, is_valid = build_chapter_text(url, metadata_title, raw_paragraphs, log=False)
+        if is_valid and screenshot_path:
+            # Take screenshot only if chapter is valid and content is found
+            await screenshots.take_page_screenshot(page, screenshot_path, screenshot_options)
+            logger.info(f"  [Scraper] Screenshot saved to {screenshot_path}")
+            return metadata_title, raw_paragraphs, True
+        return metadata_title, raw_paragraphs, False
+
+def chapter_file_paths(book_name_slug: str, book_num: int, chap_num: int) -> tuple:
+    """The (scraped content, AI spin, reviewer comments) files of a chapter."""
+    suffix = f"{book_name_slug}_Book{book_num}_Chapter{chap_num}.txt"
+    return f"scraped_content_{suffix}", f"spun_content_{suffix}", f"reviewer_comments_{suffix}"
+
+def chapter_output_filepath(book_name_slug: str, book_num: int, chap_num: int) -> str:
+    return chapter_file_paths(book_name_slug, book_num, chap_num)[0]
+
+async def scrape_content(book_name_slug: str, book_num: int, chap_num: int, pool: BrowserPool = None,
+                         save_to_file: bool = True, rate_limiter: HostRateLimiter = None,
+                         screenshot_mode: str = None):
     """
     Scrapes content from the constructed Wikisource URL.
-    Saves content to a uniquely named text file.
+    Saves content to a uniquely named text file unless save_to_file is False.
     Returns (scraped_text, metadata_title, screenshot_path, is_valid_chapter).
-    is_valid_chapter is True if content was found, False otherwise.
+    is_valid_chapter is True if content was found, False otherwise; screenshot_path is
+    None when no screenshot was taken or scheduled (mode 'off', offline, or an invalid chapter).
+
+    screenshot_mode (default config.SCREENSHOT_MODE) is one of:
+      'off'      - text only, fetched over plain HTTP through the on-disk page cache.
+      'inline'   - the page is rendered in the shared browser and captured before returning.
+      'deferred' - text is fetched over HTTP and the capture is queued to run in the background.
+    Offline mode never takes screenshots.
     """
     url = construct_wikisource_url(book_name_slug, book_num, chap_num)
-    output_filepath = f"scraped_content_{book_name_slug}_Book{book_num}_Chapter{chap_num}.txt"
-    screenshot_path = f"screenshot_{book_name_slug}_Book{book_num}_Chapter{chap_num}.png"
+    output_filepath = chapter_output_filepath(book_name_slug, book_num, chap_num)
+    screenshot_options = screenshots.ScreenshotOptions()
+    screenshot_path = screenshots.screenshot_path_for(book_name_slug, book_num, chap_num, screenshot_options)
+    screenshot_mode = screenshot_mode or config.SCREENSHOT_MODE
+    if screenshot_mode not in screenshots.SCREENSHOT_MODES:
+        logger.warning(f"  [Scraper] Unknown screenshot mode '{screenshot_mode}'. Screenshots are off.")
+        screenshot_mode = "off"
+    if screenshot_mode != "off" and page_cache.get_page_cache().offline:
+        logger.info(f"  [Scraper] Offline mode: skipping screenshot for {url}")
+        screenshot_mode = "off"
 
     scraped_text = ""
     metadata_title = ""
     is_valid_chapter = False
+    screenshot_taken = False
 
     logger.info(f"Attempting to scrape URL: {url}")
 
-    async with async_playwright() as p:
-        browser = await p.chromium.launch(headless=False) # Keep headless=True for background operation
-        page =await browser.new_page()
+    try:
+        if screenshot_mode == "inline":
+            title, raw_paragraphs, screenshot_taken = await _fetch_chapter_browser(
+                url, pool or get_browser_pool(), rate_limiter, screenshot_path, screenshot_options
+            )
+        else:
+            title, raw_paragraphs = await _fetch_chapter_http(url, rate_limiter)
 
-        try:
-            await page.goto(url, wait_until="domcontentloaded", timeout=30000) # Added timeout
-            await page.wait_for_load_state('networkidle', timeout=30000)
-
-            # Check for "Page not found" indicator in title 
-            page_title_element = page.locator('h1#firstHeading span.mw-page-title-main')
-            if not await page_title_element.is_visible():
-                logger.warning(f"  [Scraper] Warning: Page title element not found on {url}. Likely invalid page.")
-                is_valid_chapter = False
-            else:
-                metadata_title =await page_title_element.text_content()
-                if "Page not found" in metadata_title or "No such page" in metadata_title:
-                    logger.info(f"  [Scraper] Page title indicates invalid chapter: '{metadata_title}'")
-                    is_valid_chapter = False
-                else:
-                    # Attempt to scrape paragraphs
-                    paragraph_elements =await page.locator('.prp-pages-output p').all()
-                    if not paragraph_elements:
-                        logger.info(f"  [Scraper] No content paragraphs found on {url}. Possibly invalid chapter or different structure.")
-                        is_valid_chapter = False
-                    else:
-                        
-                        paragraph_texts = []
-                        for p in paragraph_elements:
-                            text_content =await p.text_content()
-                            text=text_content.strip()
-                        # Check if the text content looks like CSS rules
-                            if not text.startswith('.mw-parser-output'):
-                                paragraph_texts.append(text)
-                        scraped_text = "\n\n".join(paragraph_texts)        
-                        if scraped_text.strip(): # Check if actual content was scraped
-                            is_valid_chapter = True
-                            # Save content to a unique file
-                            with open(output_filepath, 'w', encoding='utf-8') as f:
-                                f.write(scraped_text)
-                            logger.info(f"  [Scraper] Content successfully scraped and saved to {output_filepath}")
-                            
-                            # Take screenshot only if chapter is valid and content is found
-                            await page.screenshot(path=screenshot_path, full_page=True)
-                            logger.info(f"  [Scraper] Screenshot saved to {screenshot_path}")
-                        else:
-                            logger.info(f"  [Scraper] Scraped paragraphs were empty after stripping. Invalid content.")
-                            is_valid_chapter = False
-
-        except Exception as e:
-            logger.error(f"  [Scraper] Error during scraping {url}: {e}", exc_info=True)
-            is_valid_chapter = False # Mark as invalid on error
-        finally:
-            await browser.close()
+        metadata_title = title or ""
+        scraped_text, is_valid_chapter = build_chapter_text(url, title, raw_paragraphs)
+        if is_valid_chapter and save_to_file:
+            # Save content to a unique file
+            with open(output_filepath, 'w', encoding='utf-8') as f:
+                f.write(scraped_text)
+            logger.info(f"  [Scraper] Content successfully scraped and saved to {output_filepath}")
+        if is_valid_chapter and screenshot_mode == "deferred":
+            screenshots.get_screenshot_queue().schedule(pool or get_browser_pool(), url, screenshot_path)
+            screenshot_taken = True
+
+    except Exception as e:
+        logger.error(f"  [Scraper] Error during scraping {url}: {e}", exc_info=True)
+        is_valid_chapter = False # Mark as invalid on error
     
-    return scraped_text, metadata_title, screenshot_path, is_valid_chapter
+    return scraped_text, metadata_title, screenshot_path if screenshot_taken else None, is_valid_chapter
+
+async def crawl_book_chapters(book_name_slug: str, book_num: int, max_concurrency: int,
+                              rate_limiter: HostRateLimiter = None, pool: BrowserPool = None) -> list:
+    """
+    Scrapes Chapter_1, Chapter_2, ... of one book concurrently, with a semaphore keeping at
+    most max_concurrency chapters in flight. Like the single-chapter flow, the book ends
+    at the first invalid chapter: once one is seen, later chapters are cancelled and
+    discarded. Nothing is written to disk here.
+    Returns a list of chapter dicts ordered by chapter number; a chapter's 'screenshot_path'
+    is None when no screenshot was taken (see scrape_content).
+    """
+    window = max(1, max_concurrency)
+    semaphore = asyncio.Semaphore(window)
+    results = {}
+    first_invalid = None
+    next_chap = 1
+    in_flight = {}
+
+    async def fetch(chap_num):
+        async with semaphore:
+            return await scrape_content(book_name_slug, book_num, chap_num, pool=pool,
+                                        save_to_file=False, rate_limiter=rate_limiter)
+
+    while True:
+        while first_invalid is None and len(in_flight) < window:
+            in_flight[asyncio.create_task(fetch(next_chap))] = next_chap
+            next_chap += 1
+        if not in_flight:
+            break
+
+        done, _ = await asyncio.wait(in_flight.keys(), return_when=asyncio.FIRST_COMPLETED)
+        for task in done:
+            chap_num = in_flight.pop(task)
+            scraped_text, title, screenshot_path, is_valid = task.result()
+            if is_valid:
+                results[chap_num] = {
+                    "book_name_slug": book_name_slug,
+                    "book_num": book_num,
+                    "chap_num": chap_num,
+                    "title": title,
+                    "text": scraped_text,
+                    "screenshot_path": screenshot_path,
+                }
+            elif first_invalid is None or chap_num < first_invalid:
+                first_invalid = chap_num
+
+        if first_invalid is not None:
+            for task, chap_num in list(in_flight.items()):
+                if chap_num > first_invalid:
+                    task.cancel()
+                    in_flight.pop(task)
+
+    return [results[c] for c in sorted(results) if first_invalid is None or c < first_invalid]
+
+def save_crawl_results(chapters: list) -> list:
+    """Writes every crawled chapter to its scraped_content_*.txt file in one pass. Returns the paths."""
+    paths = []
+    for chapter in chapters:
+        path = chapter_output_filepath(chapter["book_name_slug"], chapter["book_num"], chapter["chap_num"])
+        with open(path, 'w', encoding='utf-8') as f:
+            f.write(chapter["text"])
+        paths.append(path)
+    logger.info(f"  [Crawler] Saved {len(paths)} chapters to disk.")
+    return paths
+
+async def crawl_book(book_name_slug: str, start_book_num: int = 1, max_concurrency: int = None,
+                     requests_per_second: float = None, pool: BrowserPool = None, save: bool = True) -> list:
+    """
+    Crawls a whole Wikisource book: Book_N/Chapter_M for N = start_book_num, N+1, ...
+    Each book is walked until its first invalid chapter; the crawl stops at the first
+    book whose Chapter_1 is invalid. Chapters are fetched concurrently (bounded by
+    max_concurrency) and rate-limited per host, then written to disk in one pass.
+    Returns the list of chapter dicts in reading order.
+    """
+    max_concurrency = max_concurrency or config.CRAWL_MAX_CONCURRENCY
+    rate_limiter = HostRateLimiter(requests_per_second)
+
+    all_chapters = []
+    book_num = start_book_num
+    start = time.perf_counter()
+    while True:
+        chapters = await crawl_book_chapters(book_name_slug, book_num, max_concurrency, rate_limiter, pool=pool)
+        if not chapters:
+            break
+        logger.info(f"  [Crawler] {book_name_slug} Book {book_num}: {len(chapters)} chapters found.")
+        all_chapters.extend(chapters)
+        book_num += 1
+
+    logger.info(f"  [Crawler] Crawled {len(all_chapters)} chapters of {book_name_slug} in {time.perf_counter() - start:.1f}s "
+                f"(concurrency={max_concurrency}).")
+    if save:
+        save_crawl_results(all_chapters)
+    return all_chapters
 
 
 #Example usage (for testing scrape.py independently)
 
+async def _extract_paragraphs_per_locator(page):
+    """The old extraction loop (one awaited text_content() per paragraph), kept for timing comparisons."""
+    texts = []
+    for p in await page.locator('.prp-pages-output p').all():
+        texts.append((await p.text_content()).strip())
+    return texts
+
+async def compare_paragraph_extraction(book_name_slug: str, book_num: int, chap_num: int):
+    """Times per-locator paragraph extraction against the single-evaluation version on one page."""
+    url = construct_wikisource_url(book_name_slug, book_num, chap_num)
+    pool = get_browser_pool()
+    async with pool.page() as page:
+        await page.goto(url, wait_until="domcontentloaded", timeout=pool.timeout_ms)
+
+        start = time.perf_counter()
+        per_locator = await _extract_paragraphs_per_locator(page)
+        per_locator_s = time.perf_counter() - start
+
+        start = time.perf_counter()
+        _, batched = await extract_chapter_from_page(page)
+        batched_s = time.perf_counter() - start
+
+    print(f"  Per-locator extraction: {len(per_locator)} paragraphs in {per_locator_s * 1000:.1f} ms")
+    print(f"  Single evaluation:      {len(batched or [])} paragraphs in {batched_s * 1000:.1f} ms")
+    if batched_s > 0:
+        print(f"  Speed-up: {per_locator_s / batched_s:.1f}x")
+
 async def main_scrape_test(): # Define an async test function
     test_book_name_slug = "The_Gates_of_Morning"
 
     print("\n Testing Valid Chapter (Book 1, Chapter 1) ")
+    start = time.perf_counter()
     scraped_text_1_1, title_1_1, screenshot_1_1, is_valid_1_1 = await scrape_content(test_book_name_slug, 1, 1) # ADD 'await'
-    print(f"Is Book 1, Chapter 1 Valid? {is_valid_1_1}")
+    print(f"Is Book 1, Chapter 1 Valid? {is_valid_1_1} (scraped in {time.perf_counter() - start:.2f}s)")
     if is_valid_1_1:
         print(f"Content snippet: {scraped_text_1_1[:200]}...")
 
+    print("\n Timing paragraph extraction (Book 1, Chapter 1) ")
+    await compare_paragraph_extraction(test_book_name_slug, 1, 1)
+
     print("\n Testing Invalid Chapter (Book 1, Chapter 99) ")
+    start = time.perf_counter()
     scraped_text_1_99, title_1_99, screenshot_1_99, is_valid_1_99 = await scrape_content(test_book_name_slug, 1, 99) # ADD 'await'
-    print(f"Is Book 1, Chapter 99 Valid? {is_valid_1_99}")
+    print(f"Is Book 1, Chapter 99 Valid? {is_valid_1_99} (scraped in {time.perf_counter() - start:.2f}s)")
     if not is_valid_1_99:
         print("  Expected: Invalid chapter detected.")
 
     print("\n Testing Invalid Book (Book 99, Chapter 1)")
+    start = time.perf_counter()
     scraped_text_99_1, title_99_1, screenshot_99_1, is_valid_99_1 = await scrape_content("NonExistent_Book", 99, 1) # ADD 'await'
-    print(f"Is NonExistent_Book 99, Chapter 1 Valid? {is_valid_99_1}")
+    print(f"Is NonExistent_Book 99, Chapter 1 Valid? {is_valid_99_1} (scraped in {time.perf_counter() - start:.2f}s)")
     if not is_valid_99_1:
         print("  Expected: Invalid book detected.")
 
+    await screenshots.drain_screenshot_queue()
+
     # Clean up test files
     for fn in [
         f"scraped_content_{test_book_name_slug}_Book1_Chapter1.txt",
-        f"screenshot_{test_book_name_slug}_Book1_Chapter1.png",
+        screenshot_1_1,
         f"scraped_content_{test_book_name_slug}_Book1_Chapter99.txt",
-        f"screenshot_{test_book_name_slug}_Book1_Chapter99.png",
+        screenshot_1_99,
         f"scraped_content_NonExistent_Book_Book99_Chapter1.txt",
-        f"screenshot_NonExistent_Book_Book99_Chapter1.png"
+        screenshot_99_1
     ]:
-        if os.path.exists(fn):
+        if fn and os.path.exists(fn):
             os.remove(fn)
 
+async def run_scrape_test():
+    try:
+        await main_scrape_test()
+    finally:
+        await close_scraper()
+
 if __name__ == "__main__":
-    asyncio.run(main_scrape_test())
\ No newline at end of file
+    config.setup_logging()
+    asyncio.run(run_scrape_test())
\ No newline at end of file
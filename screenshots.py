@@ -0,0 +1,140 @@
+# screenshots.py
+import asyncio
+import io
+import time
+import config
+
+try:
+    from PIL import Image  # Only needed for WebP output
+except ImportError:
+    Image = None
+
+logger = config.logger
+
+SCREENSHOT_MODES = ("off", "inline", "deferred")
+_EXTENSIONS = {"png": "png", "jpeg": "jpg", "webp": "webp"}
+
+
+class ScreenshotOptions:
+    """
+    How a chapter screenshot is rendered.
+
+    image_format: 'png', 'jpeg' or 'webp' (WebP is converted from a PNG capture and needs Pillow).
+    quality: 0-100 for jpeg/webp, ignored for png.
+    max_height: crop full-page captures to this many pixels (None for no limit).
+    full_page: False captures only the viewport.
+    """
+    def __init__(self, image_format: str = None, quality: int = None, max_height: int = None, full_page: bool = None):
+        self.image_format = (image_format or config.SCREENSHOT_FORMAT).lower()
+        self.quality = quality if quality is not None else config.SCREENSHOT_QUALITY
+        self.max_height = max_height if max_height is not None else config.SCREENSHOT_MAX_HEIGHT
+        self.full_page = full_page if full_page is not None else config.SCREENSHOT_FULL_PAGE
+
+        if self.image_format not in _EXTENSIONS:
+            logger.warning(f"  [Screenshots] Unknown format '{self.image_format}'. Falling back to png.")
+            self.image_format = "png"
+        if self.image_format == "webp" and Image is None:
+            logger.warning("  [Screenshots] Pillow is not installed, so WebP is unavailable. Falling back to jpeg.")
+            self.image_format = "jpeg"
+
+    @property
+    def extension(self) -> str:
+        return _EXTENSIONS[self.image_format]
+
+
+def screenshot_path_for(book_name_slug: str, book_num: int, chap_num: int, options: ScreenshotOptions = None) -> str:
+    options = options or ScreenshotOptions()
+    return f"screenshot_{book_name_slug}_Book{book_num}_Chapter{chap_num}.{options.extension}"
+
+async def take_page_screenshot(page, path: str, options: ScreenshotOptions = None):
+    """Captures an already loaded page to path according to options."""
+    options = options or ScreenshotOptions()
+    kwargs = {"full_page": options.full_page}
+
+    if options.full_page and options.max_height:
+        page_size = await page.evaluate(
+            "() => ({width: document.documentElement.scrollWidth, height: document.documentElement.scrollHeight})"
+        )
+        if page_size["height"] > options.max_height:
+            kwargs["clip"] = {"x": 0, "y": 0, "width": page_size["width"], "height": options.max_height}
+
+    if options.image_format == "webp":
+        png_bytes = await page.screenshot(type="png", **kwargs)
+        await asyncio.to_thread(_save_webp, png_bytes, path, options.quality)
+    else:
+        if options.image_format == "jpeg":
+            kwargs["quality"] = options.quality
+        await page.screenshot(path=path, type=options.image_format, **kwargs)
+
+def _save_webp(png_bytes: bytes, path: str, quality: int):
+    with Image.open(io.BytesIO(png_bytes)) as image:
+        image.save(path, format="WEBP", quality=quality)
+
+async def capture_url(pool, url: str, path: str, options: ScreenshotOptions = None):
+    """Opens url on a page from the browser pool and screenshots it."""
+    async with pool.page() as page:
+        await page.goto(url, wait_until="domcontentloaded", timeout=pool.timeout_ms)
+        await page.wait_for_load_state('networkidle', timeout=pool.timeout_ms)
+        await take_page_screenshot(page, path, options)
+
+
+class ScreenshotQueue:
+    """
+    Background screenshot stage for the 'deferred' mode.
+
+    schedule() returns immediately and renders the page later, with at most max_concurrency
+    captures running at once, so text ingestion never waits on the browser. drain() waits
+    for everything still pending and must be awaited before the browser pool is closed.
+    """
+    def __init__(self, max_concurrency: int = None, options: ScreenshotOptions = None):
+        self.options = options or ScreenshotOptions()
+        self._semaphore = asyncio.Semaphore(max_concurrency or config.SCREENSHOT_MAX_CONCURRENCY)
+        self._pending = set()
+        self.stats = {"scheduled": 0, "completed": 0, "failed": 0, "total_seconds": 0.0}
+
+    @property
+    def pending_count(self) -> int:
+        return len(self._pending)
+
+    def schedule(self, pool, url: str, path: str):
+        task = asyncio.create_task(self._capture(pool, url, path))
+        self._pending.add(task)
+        task.add_done_callback(self._pending.discard)
+        self.stats["scheduled"] += 1
+        return task
+
+    async def _capture(self, pool, url: str, path: str):
+        async with self._semaphore:
+            start = time.perf_counter()
+            try:
+                await capture_url(pool, url, path, self.options)
+                self.stats["completed"] += 1
+                logger.info(f"  [Screenshots] Deferred screenshot saved to {path}")
+            except Exception as e:
+                self.stats["failed"] += 1
+                logger.error(f"  [Screenshots] Deferred screenshot of {url} failed: {e}")
+            finally:
+                self.stats["total_seconds"] += time.perf_counter() - start
+
+    async def drain(self):
+        """Waits for every scheduled screenshot to finish."""
+        if self._pending:
+            logger.info(f"  [Screenshots] Waiting for {len(self._pending)} deferred screenshots...")
+            await asyncio.gather(*list(self._pending), return_exceptions=True)
+
+
+_screenshot_queue = None
+
+def get_screenshot_queue() -> ScreenshotQueue:
+    """Returns the process-wide deferred screenshot queue."""
+    global _screenshot_queue
+    if _screenshot_queue is None:
+        _screenshot_queue = ScreenshotQueue()
+    return _screenshot_queue
+
+async def drain_screenshot_queue():
+    """Finishes any deferred screenshots still pending."""
+    global _screenshot_queue
+    if _screenshot_queue is not None:
+        await _screenshot_queue.drain()
+        _screenshot_queue = None
@@ -0,0 +1,330 @@
+# search.py
+import hashlib
+import config
+import embedding_cache
+import lexical_index
+import search_cache
+import version_store
+
+logger = config.logger
+
+SNIPPET_CHARS = 500
+BOUNDARY_MODULUS = 3 # About one paragraph in three may end a chunk
+CHUNK_METADATA_KEYS = ("book_title", "book_num", "chapter_num", "version", "type", "editor", "timestamp")
+
+
+def split_into_chunks(text: str, max_chars: int = None, overlap_paragraphs: int = None) -> list:
+    """
+    Splits text into chunks of whole paragraphs of up to about max_chars (a longer
+    paragraph is a chunk of its own). Once a chunk holds a quarter of max_chars it ends
+    after any paragraph whose hash picks it as a boundary, so boundaries follow the text
+    rather than positions: editing a paragraph changes only the chunks around it and the
+    others keep their text, and with it their embeddings. Each chunk after the first also
+    starts with the last overlap_paragraphs paragraphs of the one before, so a passage
+    spanning a boundary is still found in one piece.
+    """
+    max_chars = max_chars or config.SEARCH_CHUNK_MAX_CHARS
+    overlap_paragraphs = config.SEARCH_CHUNK_OVERLAP_PARAGRAPHS if overlap_paragraphs is None else overlap_paragraphs
+    paragraphs = [p.strip() for p in text.split("\n\n") if p.strip()]
+    groups = []
+    current = []
+    size = 0
+    for paragraph in paragraphs:
+        if current and size + len(paragraph) > max_chars:
+            groups.append(current)
+            current, size = [], 0
+        current.append(paragraph)
+        size += len(paragraph) + 2
+        if size >= max_chars // 4 and int(text_hash(paragraph), 16) % BOUNDARY_MODULUS == 0:
+            groups.append(current)
+            current, size = [], 0
+    if current:
+        groups.append(current)
+    return ["\n\n".join((groups[i - 1][-overlap_paragraphs:] if i and overlap_paragraphs else []) + group)
+            for i, group in enumerate(groups)]
+
+def text_hash(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()[:32]
+
+def build_where(filters: list):
+    """ChromaDB where clause from a list of single-key conditions (None for no filter)."""
+    if not filters:
+        return None
+    return filters[0] if len(filters) == 1 else {"$and": filters}
+
+
+class SearchIndex:
+    """
+    Semantic search over the searchable versions (config.SEARCHABLE_VERSION_TYPES).
+
+    In 'chunks' mode every version is also indexed as overlapping paragraph chunks in a
+    second collection, with ids {version_id}_c{i} and the version's filterable metadata,
+    its parent_id and a text_hash. Indexing is incremental: chunks whose text is unchanged
+    keep their stored embedding, and a chunk seen before under any version (an untouched
+    paragraph of an edited final, say) reuses its embedding instead of being embedded
+    again. Queries fetch several chunks per wanted result, group them by parent version
+    and rank versions by their best chunk, which is shown as the matching passage.
+
+    In 'documents' mode queries run against whole versions, as before chunking existed.
+
+    Alongside, every version of every type is kept in a BM25 lexical index (see
+    lexical_index.py). Queries are ranked 'vector' (embeddings only), 'lexical' (BM25
+    only; no embedding model is needed, and "quoted phrases" must appear as written) or
+    'hybrid', which merges the two rankings of versions by reciprocal-rank fusion.
+
+    Results are cached per (query, filters, n_results, ranking) until the next write, and
+    filters on type, book, chapter or editor restrict vector queries by precomputed id
+    sets (see search_cache.py).
+    """
+    def __init__(self, collection, chunk_collection, lexical: lexical_index.LexicalIndex = None,
+                 mode: str = None, ranking: str = None):
+        self.collection = collection
+        self.chunk_collection = chunk_collection
+        self.lexical = lexical or lexical_index.get_lexical_index()
+        self.mode = mode or config.SEARCH_MODE
+        self.ranking = ranking or config.SEARCH_RANKING
+        self.results_cache = search_cache.SearchResultCache()
+        self.filter_sets = search_cache.FilterSets(chunk_collection if self.mode == "chunks" else collection)
+        self.stats = {"versions_indexed": 0, "chunks_embedded": 0, "chunks_reused": 0, "chunks_unchanged": 0,
+                      "chunks_deleted": 0, "queries": 0}
+
+    def on_flush(self, ids: list, documents: list, metadatas: list):
+        """Write-buffer flush listener: indexes the versions just written (and embeds the searchable ones)."""
+        for doc_id, document, metadata in zip(ids, documents, metadatas):
+            self.lexical.index_version(doc_id, split_into_chunks(document), metadata)
+            if version_store.is_searchable(metadata):
+                if self.mode == "chunks":
+                    self.index_version(doc_id, document, metadata)
+                else:
+                    self.filter_sets.add([doc_id], [metadata])
+        self.results_cache.bump()
+
+    def index_version(self, version_id: str, document: str, metadata: dict):
+        chunks = split_into_chunks(document)
+        chunk_ids = [f"{version_id}_c{i}" for i in range(len(chunks))]
+        hashes = [text_hash(chunk) for chunk in chunks]
+        base_metadata = {key: metadata[key] for key in CHUNK_METADATA_KEYS if key in metadata}
+
+        def chunk_metadatas(indices):
+            return [{**base_metadata, "parent_id": version_id, "chunk_index": i, "text_hash": hashes[i]}
+                    for i in indices]
+
+        # Chunks stored for this version before (a re-write of the same id)
+        stored = self.chunk_collection.get(where={"parent_id": version_id}, include=["metadatas"])
+        stored_hashes = {chunk_id: md.get("text_hash") for chunk_id, md in zip(stored['ids'], stored['metadatas'])}
+
+        todo = [i for i in range(len(chunks)) if stored_hashes.get(chunk_ids[i]) != hashes[i]]
+        self.stats["chunks_unchanged"] += len(chunks) - len(todo)
+        # Unchanged chunks keep their embeddings but take the version's current metadata
+        stored_metadatas = dict(zip(stored['ids'], stored['metadatas']))
+        relabel = [i for i in range(len(chunks)) if stored_hashes.get(chunk_ids[i]) == hashes[i] and
+                   any(stored_metadatas[chunk_ids[i]].get(key) != base_metadata.get(key) for key in CHUNK_METADATA_KEYS)]
+        if relabel:
+            self.chunk_collection.update(ids=[chunk_ids[i] for i in relabel], metadatas=chunk_metadatas(relabel))
+            self.filter_sets.add([chunk_ids[i] for i in relabel], chunk_metadatas(relabel))
+        if todo:
+            # Embeddings of identical chunks stored under other versions
+            known = self.chunk_collection.get(where={"text_hash": {"$in": sorted({hashes[i] for i in todo})}},
+                                              include=["metadatas", "embeddings"])
+            embedding_by_hash = {md["text_hash"]: embedding for md, embedding
+                                 in zip(known['metadatas'], known['embeddings'])}
+            reused = [i for i in todo if hashes[i] in embedding_by_hash]
+            fresh = [i for i in todo if hashes[i] not in embedding_by_hash]
+
+            self.filter_sets.add([chunk_ids[i] for i in todo], chunk_metadatas(todo))
+            if reused:
+                self.chunk_collection.upsert(ids=[chunk_ids[i] for i in reused],
+                                             documents=[chunks[i] for i in reused],
+                                             embeddings=[embedding_by_hash[hashes[i]] for i in reused],
+                                             metadatas=chunk_metadatas(reused))
+            if fresh:
+                self.chunk_collection.upsert(ids=[chunk_ids[i] for i in fresh],
+                                             documents=[chunks[i] for i in fresh],
+                                             metadatas=chunk_metadatas(fresh))
+            self.stats["chunks_reused"] += len(reused)
+            self.stats["chunks_embedded"] += len(fresh)
+        # Removed last, so their embeddings could still be reused above
+        stale = [chunk_id for chunk_id in stored_hashes if chunk_id not in chunk_ids]
+        if stale:
+            self.chunk_collection.delete(ids=stale)
+            self.filter_sets.remove(stale)
+            self.stats["chunks_deleted"] += len(stale)
+        self.stats["versions_indexed"] += 1
+        logger.info(f"  [Search] Indexed {version_id}: {len(chunks)} chunks, {len(todo)} changed")
+
+    def backfill(self):
+        """Chunks every searchable version already in the main collection (first run of chunked search)."""
+        results = self.collection.get(where={"type": {"$in": list(config.SEARCHABLE_VERSION_TYPES)}},
+                                      include=["documents", "metadatas"])
+        for doc_id, document, metadata in zip(results['ids'], results['documents'], results['metadatas']):
+            self.index_version(doc_id, document, metadata)
+        logger.info(f"  [Search] Backfilled chunk index with {len(results['ids'])} versions")
+
+    def backfill_lexical(self):
+        """Indexes every stored version lexically (first run of lexical search)."""
+        store = version_store.get_version_store()
+        stored = store.all_metadata()
+        for doc_id, metadata in stored:
+            self.lexical.index_version(doc_id, split_into_chunks(store.get(doc_id)[0]), metadata)
+        # Versions written before the version store existed are only in ChromaDB
+        stored_ids = {doc_id for doc_id, _ in stored}
+        results = self.collection.get(include=["documents", "metadatas"])
+        legacy = 0
+        for doc_id, document, metadata in zip(results['ids'], results['documents'], results['metadatas']):
+            if doc_id not in stored_ids:
+                self.lexical.index_version(doc_id, split_into_chunks(document), metadata)
+                legacy += 1
+        logger.info(f"  [Search] Backfilled lexical index with {len(stored) + legacy} versions")
+
+    def search(self, query: str, where: dict = None, n_results: int = 5, ranking: str = None) -> list:
+        """
+        Returns up to n_results versions, best first, as dicts with id, metadata, score and
+        score_name (a distance for vector ranking, higher-is-better otherwise), passage (the
+        best-matching chunk) and hits (matching chunks in that version).
+        """
+        self.stats["queries"] += 1
+        ranking = ranking or self.ranking
+        key = self.results_cache.make_key(query, where, n_results, ranking)
+        results = self.results_cache.get(key)
+        if results is None:
+            results = self._search(query, where, n_results, ranking)
+            self.results_cache.put(key, results)
+        return results
+
+    def _search(self, query: str, where: dict, n_results: int, ranking: str) -> list:
+        if ranking == "vector":
+            return self._search_vector(query, where, n_results)
+        if not self.lexical.count() and self.collection.count():
+            self.backfill_lexical()
+        if ranking == "lexical":
+            return self._search_lexical(query, where, n_results)
+        return self._fuse([self._search_vector(query, where, n_results * config.SEARCH_CHUNK_CANDIDATES),
+                           self._search_lexical(query, where, n_results * config.SEARCH_CHUNK_CANDIDATES)],
+                          n_results)
+
+    def _restrict(self, where: dict):
+        """(ids, where) for a vector query: ids from the precomputed filter sets (None for no restriction)."""
+        ids, rest_where = self.filter_sets.split(where)
+        return (sorted(ids) if ids is not None else None), rest_where
+
+    def _search_vector(self, query: str, where: dict, n_results: int) -> list:
+        if self.mode != "chunks":
+            return self._search_documents(query, where, n_results)
+        if not self.chunk_collection.count() and self.collection.count():
+            self.backfill()
+        ids, where = self._restrict(where)
+        if ids == []:
+            return []
+        results = self.chunk_collection.query(query_texts=[query], ids=ids, where=where,
+                                              n_results=n_results * config.SEARCH_CHUNK_CANDIDATES)
+        versions = {}
+        for chunk, metadata, distance in zip(results['documents'][0], results['metadatas'][0], results['distances'][0]):
+            parent_id = metadata["parent_id"]
+            if parent_id not in versions:
+                # Results come nearest first, so the first chunk seen is the version's best passage
+                version_metadata = {key: value for key, value in metadata.items()
+                                    if key not in ("parent_id", "chunk_index", "text_hash")}
+                versions[parent_id] = {"id": parent_id, "metadata": version_metadata, "score": distance,
+                                       "score_name": "Distance", "passage": chunk, "hits": 0}
+            versions[parent_id]["hits"] += 1
+        return sorted(versions.values(), key=lambda v: v["score"])[:n_results]
+
+    def _search_documents(self, query: str, where: dict, n_results: int) -> list:
+        ids, where = self._restrict(where)
+        if ids == []:
+            return []
+        results = self.collection.query(query_texts=[query], ids=ids, n_results=n_results, where=where)
+        return [{"id": doc_id, "metadata": metadata, "score": distance, "score_name": "Distance",
+                 "passage": document, "hits": 1}
+                for doc_id, document, metadata, distance
+                in zip(results['ids'][0], results['documents'][0], results['metadatas'][0], results['distances'][0])]
+
+    def _search_lexical(self, query: str, where: dict, n_results: int) -> list:
+        terms, phrases = lexical_index.parse_query(query)
+        versions = {}
+        for chunk_id, version_id, chunk_index, metadata, score in self.lexical.search(
+                terms, where, limit=n_results * config.SEARCH_CHUNK_CANDIDATES * (4 if phrases else 1)):
+            passage = None
+            if phrases:
+                passage = self._passage(version_id, chunk_index)
+                # Padded, so a phrase only matches whole words ("sea" is not in "seaside")
+                words = f" {' '.join(lexical_index.tokenize(passage))} "
+                if not all(f" {phrase} " in words for phrase in phrases):
+                    continue
+            if version_id not in versions:
+                if len(versions) == n_results:
+                    continue
+                # Chunks come best first, so the first one seen is the version's best passage
+                versions[version_id] = {"id": version_id, "metadata": metadata, "score": score,
+                                        "score_name": "BM25", "passage": passage, "chunk_index": chunk_index,
+                                        "hits": 0}
+            versions[version_id]["hits"] += 1
+        for result in versions.values():
+            if result["passage"] is None:
+                result["passage"] = self._passage(result["id"], result["chunk_index"])
+        return list(versions.values())
+
+    def _passage(self, version_id: str, chunk_index: int) -> str:
+        stored = version_store.get_version_store().get(version_id)
+        if stored is not None:
+            text = stored[0]
+        else:
+            results = self.collection.get(ids=[version_id], include=["documents"])
+            text = results['documents'][0] if results['documents'] else ""
+        chunks = split_into_chunks(text)
+        return chunks[chunk_index] if chunk_index < len(chunks) else text
+
+    @staticmethod
+    def _fuse(rankings: list, n_results: int) -> list:
+        """Reciprocal-rank fusion of several best-first result lists of versions."""
+        fused = {}
+        for results in rankings:
+            for rank, result in enumerate(results):
+                score = 1.0 / (config.SEARCH_RRF_K + rank + 1)
+                if result["id"] not in fused:
+                    fused[result["id"]] = {**result, "score": 0.0, "score_name": "RRF", "hits": 0}
+                elif result["score_name"] == "BM25":
+                    # The lexical passage shows the words that matched
+                    fused[result["id"]]["passage"] = result["passage"]
+                fused[result["id"]]["score"] += score
+                fused[result["id"]]["hits"] += result["hits"]
+        return sorted(fused.values(), key=lambda v: v["score"], reverse=True)[:n_results]
+
+    def summary(self) -> str:
+        return (f"mode={self.mode} ranking={self.ranking} versions_indexed={self.stats['versions_indexed']} "
+                f"chunks_embedded={self.stats['chunks_embedded']} chunks_reused={self.stats['chunks_reused']} "
+                f"chunks_unchanged={self.stats['chunks_unchanged']} chunks_deleted={self.stats['chunks_deleted']} "
+                f"queries={self.stats['queries']} result_cache: {self.results_cache.summary()} "
+                f"lexical: {self.lexical.summary()}")
+
+
+def print_results(results: list):
+    if not results:
+        print("No relevant documents found matching your criteria.")
+        return
+    print("Found relevant documents:")
+    for i, result in enumerate(results, start=1):
+        hits = f", {result['hits']} matching passages" if result["hits"] > 1 else ""
+        print(f"\n--- Result {i} ({result['score_name']}: {result['score']:.4f}{hits}) ---")
+        print(f"ID: {result['id']}")
+        print(f"Metadata: {result['metadata']}")
+        print("Matching passage:")
+        passage = result["passage"]
+        print(passage[:SNIPPET_CHARS] + "..." if len(passage) > SNIPPET_CHARS else passage)
+
+
+_search_index = None
+
+def get_search_index(chroma_client, collection, writes=None) -> SearchIndex:
+    """
+    Returns the process-wide search index for the collection, opening its chunk collection.
+    If a write buffer is given, new versions are indexed as they are flushed.
+    """
+    global _search_index
+    if _search_index is None:
+        chunk_collection = chroma_client.get_or_create_collection(
+            name=config.CHROMA_CHUNK_COLLECTION_NAME, embedding_function=embedding_cache.get_embedding_function())
+        _search_index = SearchIndex(collection, chunk_collection)
+        if writes is not None:
+            writes.add_flush_listener(_search_index.on_flush)
+    return _search_index
@@ -0,0 +1,108 @@
+# search_cache.py
+import collections
+import json
+import config
+
+logger = config.logger
+
+FILTER_KEYS = ("type", "book_num", "chapter_num", "editor")
+
+
+class SearchResultCache:
+    """
+    LRU cache of search results keyed by (query, filters, n_results, ranking).
+
+    Every key also carries the generation it was computed in; the generation goes up
+    whenever versions are written (bump() is a write-buffer flush listener), so results
+    are never served from before a write and stale entries simply age out of the LRU.
+    """
+    def __init__(self, max_entries: int = None):
+        self.max_entries = config.SEARCH_CACHE_SIZE if max_entries is None else max_entries
+        self.generation = 0
+        self._entries = collections.OrderedDict()
+        self.stats = {"hits": 0, "misses": 0, "generations": 0}
+
+    def make_key(self, query: str, where: dict, n_results: int, ranking: str) -> tuple:
+        return (query, json.dumps(where, sort_keys=True), n_results, ranking, self.generation)
+
+    def get(self, key: tuple):
+        if key in self._entries:
+            self._entries.move_to_end(key)
+            self.stats["hits"] += 1
+            return self._entries[key]
+        self.stats["misses"] += 1
+        return None
+
+    def put(self, key: tuple, results: list):
+        if not self.max_entries:
+            return
+        self._entries[key] = results
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def bump(self, ids: list = None, documents: list = None, metadatas: list = None):
+        """Write-buffer flush listener: results computed before this write are no longer served."""
+        self.generation += 1
+        self.stats["generations"] += 1
+
+    def summary(self) -> str:
+        lookups = self.stats["hits"] + self.stats["misses"]
+        hit_rate = self.stats["hits"] / lookups if lookups else 0.0
+        return (f"hits={self.stats['hits']} misses={self.stats['misses']} hit_rate={hit_rate:.0%} "
+                f"entries={len(self._entries)} generation={self.generation}")
+
+
+class FilterSets:
+    """
+    Id sets of a collection's records for each value of the common filter fields (type,
+    book_num, chapter_num, editor), built with one metadata read the first time a filter
+    is used and kept current by add()/remove(). A filtered query is then restricted to
+    the intersection of the sets by id instead of having ChromaDB match metadata.
+    """
+    def __init__(self, collection):
+        self.collection = collection
+        self._sets = None # (key, value) -> set of ids
+        self._keys = {} # id -> [(key, value), ...], for remove()
+
+    def _build(self):
+        self._sets = collections.defaultdict(set)
+        results = self.collection.get(include=["metadatas"])
+        self.add(results['ids'], results['metadatas'])
+        logger.info(f"  [Search Cache] Built filter sets for {len(results['ids'])} records")
+
+    def add(self, ids: list, metadatas: list):
+        if self._sets is None:
+            return # Not built yet; the first use reads everything
+        for record_id, metadata in zip(ids, metadatas):
+            self.remove([record_id])
+            pairs = [(key, metadata[key]) for key in FILTER_KEYS if metadata.get(key) is not None]
+            for pair in pairs:
+                self._sets[pair].add(record_id)
+            self._keys[record_id] = pairs
+
+    def remove(self, ids: list):
+        if self._sets is None:
+            return
+        for record_id in ids:
+            for pair in self._keys.pop(record_id, []):
+                self._sets[pair].discard(record_id)
+
+    def split(self, where: dict):
+        """
+        Splits a where clause of equality conditions into the ids matching the conditions
+        on precomputed fields (None if there are none) and a where clause for the rest.
+        """
+        conditions = []
+        if where:
+            clauses = where["$and"] if "$and" in where else [where]
+            conditions = [(key, value) for clause in clauses for key, value in clause.items()]
+        indexed = [(key, value) for key, value in conditions if key in FILTER_KEYS]
+        rest = [{key: value} for key, value in conditions if key not in FILTER_KEYS]
+        rest_where = None if not rest else rest[0] if len(rest) == 1 else {"$and": rest}
+        if not indexed:
+            return None, rest_where
+        if self._sets is None:
+            self._build()
+        ids = set.intersection(*(self._sets.get(pair, set()) for pair in indexed))
+        return ids, rest_where
@@ -0,0 +1,92 @@
+# speculation.py
+import asyncio
+import time
+import config
+import prompt_manager
+import spin_write
+import review
+
+logger = config.logger
+
+# Process-wide counters: how many speculative spins were started, how many a re-spin used
+# (and how many of those were already finished), how many guessed a different prompt than
+# the re-spin chose, how many were thrown away.
+stats = {"started": 0, "used": 0, "used_ready": 0, "missed": 0, "cancelled": 0, "failed": 0, "wait_s": 0.0}
+
+
+class SpeculativeSpin:
+    """
+    A background adaptive spin (and its review) started while the editor reads the current
+    version, so a re-spin with the adaptive prompt can be answered without waiting.
+
+    The bandit only picks the re-spin's prompt after it has seen the reward for the version
+    on screen, so the speculation spins with its guess, the currently best-scoring prompt.
+    The re-spin takes the result only if it then chose that same prompt.
+    """
+    def __init__(self, spin_writer: spin_write.SpinWrite, reviewer: review.Review,
+                 original_content: str, summary: str = None):
+        self.spin_writer = spin_writer
+        self.reviewer = reviewer
+        self.original_content = original_content
+        self.summary = summary
+        self.prompt_name, self.prompt_template = prompt_manager.get_best_prompt(spin_writer.prompt_scores)
+        self.started_at = time.monotonic()
+        self._task = asyncio.ensure_future(self._run())
+        stats["started"] += 1
+
+    async def _run(self):
+        if self.prompt_name is None:
+            return spin_write.SPIN_ERROR_MESSAGE, None
+        spun_text, _ = await self.spin_writer.ai_spin_content(
+            self.original_content, bypass_cache=True, summary=self.summary,
+            chosen_prompt=(self.prompt_name, self.prompt_template))
+        if spin_write.spin_failed(spun_text):
+            return spun_text, None
+        review_text = await self.reviewer.ai_review_content(spun_text)
+        return spun_text, review_text
+
+    def ready(self) -> bool:
+        return self._task.done()
+
+    async def take(self, prompt_name: str):
+        """
+        Called with the prompt the re-spin chose. Waits for the speculative result and returns
+        (spun_text, review_text), or None if the speculation used another prompt (it is
+        dropped) or failed. review_text is None when the review failed.
+        """
+        if prompt_name != self.prompt_name:
+            if not self._task.done():
+                self._task.cancel()
+            stats["missed"] += 1
+            return None
+        was_ready = self.ready()
+        wait_start = time.monotonic()
+        try:
+            spun_text, review_text = await self._task
+        except Exception as e:
+            logger.warning(f"  [Speculation] Background spin raised {type(e).__name__}: {e}")
+            stats["failed"] += 1
+            return None
+        if spin_write.spin_failed(spun_text):
+            stats["failed"] += 1
+            return None
+        stats["used"] += 1
+        stats["used_ready"] += int(was_ready)
+        stats["wait_s"] += time.monotonic() - wait_start
+        if review_text is not None and review.review_failed(review_text):
+            review_text = None
+        return spun_text, review_text
+
+    def cancel(self):
+        """Drops the speculation (the editor edited, finalized or asked for a different re-spin)."""
+        if not self._task.done():
+            self._task.cancel()
+        stats["cancelled"] += 1
+
+
+def speculation_summary() -> str:
+    if not stats["started"]:
+        return "no speculative spins"
+    return (f"started={stats['started']} used={stats['used']} ready_when_used={stats['used_ready']} "
+            f"missed={stats['missed']} cancelled={stats['cancelled']} failed={stats['failed']} "
+            f"hit_rate={stats['used'] / stats['started']:.0%} waited={stats['wait_s']:.1f}s")
@@ -1,47 +1,86 @@
-import google.generativeai as genai
-import os
 import prompt_manager
 import asyncio
+import config
+import llm_client
 
 spin_write_model='gemini-1.5-flash' #can use gemini-1.5-pro 
-try:
-    genai.configure(api_key=os.environ["GEMINI_API_KEY"])
-except KeyError:
-        print("Error: GEMINI_API_KEY environment variable not set.")
-        print("Please set it before running the script.")
-        exit()
-
+summarize_model='gemini-2.5-flash'
+
+SPIN_EMPTY_MESSAGE = "Failed to spin content."
+SPIN_ERROR_MESSAGE = "Failed to spin content due to an error."
+SUMMARY_EMPTY_MESSAGE = "Failed to summarize content."
+SUMMARY_ERROR_MESSAGE = "Failed to summarize content due to an error."
+
+def spin_failed(spun_text: str) -> bool:
+    """True if ai_spin_content returned one of its failure messages instead of a rewrite."""
+    return spun_text in (SPIN_EMPTY_MESSAGE, SPIN_ERROR_MESSAGE)
+
+def summary_failed(summary: str) -> bool:
+    """True if ai_summarize returned one of its failure messages instead of a summary."""
+    return summary in (SUMMARY_EMPTY_MESSAGE, SUMMARY_ERROR_MESSAGE)
+
+def rank_by_similarity(candidates: list, references: list, sample_chars: int = None) -> list:
+    """
+    Orders (spun_text, prompt_name) candidates by their best Levenshtein similarity ratio to
+    any reference text (e.g. previously accepted finals), highest first. Only the first
+    sample_chars of each text are compared to keep this cheap. Returns [(score, candidate), ...].
+    """
+    import Levenshtein
+    sample_chars = sample_chars or config.SPIN_SIMILARITY_SAMPLE_CHARS
+    samples = [reference[:sample_chars] for reference in references]
+    scored = [
+        (max((Levenshtein.ratio(candidate[0][:sample_chars], sample) for sample in samples), default=0.0), candidate)
+        for candidate in candidates
+    ]
+    return sorted(scored, key=lambda item: item[0], reverse=True)
+
+def split_into_sections(text: str, max_chars: int) -> list:
+    """
+    Splits text at paragraph boundaries ('\n\n', as the scraper joins them) into sections of
+    at most max_chars. Paragraphs are never split, so one longer paragraph becomes its own section.
+    """
+    sections, current, current_len = [], [], 0
+    for paragraph in text.split("\n\n"):
+        if current and current_len + len(paragraph) + 2 > max_chars:
+            sections.append("\n\n".join(current))
+            current, current_len = [], 0
+        current.append(paragraph)
+        current_len += len(paragraph) + 2
+    if current:
+        sections.append("\n\n".join(current))
+    return sections
 
 
 class SpinWrite:
-    def __init__(self, model_name=spin_write_model): 
+    def __init__(self, model_name=spin_write_model, client: llm_client.LLMClient = None,
+                 summarize_client: llm_client.LLMClient = None): 
         self.model_name = model_name
-        self.model = genai.GenerativeModel(self.model_name)
-        self.summodel_name="gemini-2.5-flash"
-        self.summodel = genai.GenerativeModel(self.summodel_name)
+        self.client = client or llm_client.get_llm_client(self.model_name)
+        self.summodel_name = summarize_client.model_name if summarize_client else summarize_model
+        self.summarize_client = summarize_client or llm_client.get_llm_client(self.summodel_name)
         
         self.prompt_scores = prompt_manager.load_prompt_scores()
         print("[SpinWrite] Initialized with prompt scores.")
 
-    async def ai_summarize(self,original_content: str) -> str:
+    async def ai_summarize(self,original_content: str, bypass_cache: bool = False) -> str:
         prompt=("Summarize the following text concisely, focusing on the main plot points,characters, and setting.\n\n" 
             )
         full_prompt=prompt + original_content
 
         try:
-            response = await self.summodel.generate_content_async(full_prompt)
-            # Checking if the response has text content
-            if response.candidates and response.candidates[0].content.parts:
-                return response.candidates[0].content.parts[0].text
+            summary = await self.summarize_client.generate(full_prompt, bypass_cache=bypass_cache)
+            if summary:
+                return summary
             else:
                 print("Warning: Gemini response had no text content for summarizing.")
-                return "Failed to summarize content."
+                return SUMMARY_EMPTY_MESSAGE
         except Exception as e:
             print(f"Error during AI content summarization: {e}")
-            return "Failed to summarize content due to an error."
+            return SUMMARY_ERROR_MESSAGE
 
 
-    async def ai_spin_content(self,original_content: str, prompt_instruction: str = None) -> (str, str):
+    def choose_prompt(self, prompt_instruction: str = None) -> (str, str):
+        """Returns (prompt_name, template): prompt_instruction as a custom override, else an adaptive choice."""
 
         chosen_prompt_name = None
         prompt_template_text = None
@@ -65,21 +104,106 @@ class SpinWrite:
             prompt_template_text = "Rewrite the following text:\n\n"
             chosen_prompt_name = "fallback_default"
 
+        return chosen_prompt_name, prompt_template_text
+
+    async def ai_spin_content(self,original_content: str, prompt_instruction: str = None,
+                              bypass_cache: bool = False, on_chunk=None, summary: str = None,
+                              chosen_prompt: tuple = None) -> (str, str):
+        """
+        Rewrites original_content with prompt_instruction, or with an adaptively chosen template
+        when no instruction is given. Identical requests are served from the response cache
+        unless bypass_cache is set (re-spins that need a fresh sample).
+        With on_chunk, the rewrite is streamed and on_chunk(text) is called as chunks arrive.
+        Chapters longer than config.SPIN_CHUNK_THRESHOLD_CHARS are spun section by section
+        (see _spin_sections); summary, if known, saves that path a summarize call.
+        chosen_prompt, a (prompt_name, template) pair from choose_prompt, skips choosing again.
+        Returns (spun_text, prompt_name).
+        """
+        chosen_prompt_name, prompt_template_text = chosen_prompt or self.choose_prompt(prompt_instruction)
+        spun_text = await self._spin_with_template(original_content, prompt_template_text, bypass_cache,
+                                                   on_chunk, summary)
+        return spun_text, chosen_prompt_name
+
+    async def _spin_with_template(self, original_content: str, prompt_template_text: str,
+                                  bypass_cache: bool = False, on_chunk=None, summary: str = None) -> str:
+        if config.SPIN_CHUNK_THRESHOLD_CHARS and len(original_content) > config.SPIN_CHUNK_THRESHOLD_CHARS:
+            return await self._spin_sections(original_content, prompt_template_text, summary,
+                                             bypass_cache, on_chunk)
 
         full_prompt = prompt_template_text  + "Text to rewrite:\n\n" + original_content
 
         try:
-            response = await self.model.generate_content_async(full_prompt)
-           
-            if response.candidates and response.candidates[0].content.parts:
-                spun_text = response.candidates[0].content.parts[0].text
-                return spun_text,chosen_prompt_name
+            spun_text = await llm_client.generate_text(self.client, full_prompt, bypass_cache=bypass_cache,
+                                                       on_chunk=on_chunk)
+            if spun_text:
+                return spun_text
             else:
                 print("Warning: Gemini response had no text content for spinning.")
-                return "Failed to spin content."
+                return SPIN_EMPTY_MESSAGE
+        except Exception as e:
+            print(f"Error during AI content spinning: {e}")
+            return SPIN_ERROR_MESSAGE
+
+    async def ai_spin_candidates(self, original_content: str, count: int, bypass_cache: bool = True,
+                                 summary: str = None) -> list:
+        """
+        Spins count candidates concurrently, each from a different prompt template (see
+        prompt_manager.get_candidate_prompts). Returns [(spun_text, prompt_name), ...] in
+        template order, leaving out candidates that failed.
+        """
+        prompts = prompt_manager.get_candidate_prompts(self.prompt_scores, count)
+        if summary is None and config.SPIN_CHUNK_THRESHOLD_CHARS and len(original_content) > config.SPIN_CHUNK_THRESHOLD_CHARS:
+            summary = await self.ai_summarize(original_content) # Shared by every candidate's sections
+        spins = await asyncio.gather(*(
+            self._spin_with_template(original_content, template, bypass_cache, summary=summary)
+            for _, template in prompts
+        ))
+        return [(spun, name) for spun, (name, _) in zip(spins, prompts) if not spin_failed(spun)]
+
+    async def _spin_sections(self, original_content: str, prompt_template_text: str, summary: str,
+                             bypass_cache: bool, on_chunk, max_section_chars: int = None) -> str:
+        """
+        Map-reduce spin for long chapters: splits the chapter at paragraph boundaries, rewrites
+        all sections concurrently with the same template and the chapter summary as shared
+        context, and joins the results in order. Latency follows the longest section, not the
+        chapter. Streaming emits each section as soon as it and every section before it are
+        done. If any section fails the whole spin fails.
+        """
+        sections = split_into_sections(original_content, max_section_chars or config.SPIN_SECTION_MAX_CHARS)
+        if summary is None:
+            summary = await self.ai_summarize(original_content)
+        context = "" if summary_failed(summary) else f"Summary of the whole chapter, for context:\n{summary}\n\n"
+        # Logged, not printed: background spins (speculation, the pipeline) run while a prompt waits
+        config.logger.info(f"[SpinWrite] Spinning chapter in {len(sections)} sections concurrently.")
+
+        async def spin_section(index: int, section: str) -> str:
+            full_prompt = (
+                prompt_template_text
+                + f"You are rewriting part {index + 1} of {len(sections)} of a chapter. "
+                "Rewrite only this part and keep its place in the story; do not add headings or recap other parts.\n\n"
+                + context + "Text to rewrite:\n\n" + section
+            )
+            spun = await self.client.generate(full_prompt, bypass_cache=bypass_cache)
+            if not spun:
+                raise ValueError(f"no text content for section {index + 1}")
+            return spun.strip()
+
+        tasks = [asyncio.ensure_future(spin_section(i, section)) for i, section in enumerate(sections)]
+        spun_sections = []
+        try:
+            # Awaiting in order lets finished sections stream out while later ones are still running
+            for task in tasks:
+                spun = await task
+                if on_chunk:
+                    on_chunk(spun if not spun_sections else "\n\n" + spun)
+                spun_sections.append(spun)
         except Exception as e:
             print(f"Error during AI content spinning: {e}")
-            return "Failed to spin content due to an error."
+            return SPIN_ERROR_MESSAGE
+        finally:
+            for task in tasks:
+                task.cancel()
+        return "\n\n".join(spun_sections)
         
     def save_current_prompt_scores(self):
         """Saves the current state of prompt scores via prompt_manager."""
@@ -110,4 +234,5 @@ async def main():
     print(f"\nAI-spun content saved to {output_spun_file}")
 
 if __name__ == "__main__":
+    config.setup_logging()
     asyncio.run(main()) # Run the async main function
\ No newline at end of file
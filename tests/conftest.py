@@ -0,0 +1,67 @@
+import hashlib
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import version_store
+
+
+@pytest.fixture
+def store(tmp_path, monkeypatch):
+    """A fresh version store, installed as the process-wide one."""
+    versions = version_store.VersionStore(str(tmp_path / "versions.db"), snapshot_interval=4, cache_size=2)
+    monkeypatch.setattr(version_store, "_version_store", versions)
+    return versions
+
+
+class HashEmbeddingFunction:
+    """Deterministic offline embeddings (bytes of the text's SHA-256), so no model is downloaded."""
+    def __call__(self, input):
+        return [[byte / 255 for byte in hashlib.sha256(text.encode("utf-8")).digest()[:16]] for text in input]
+
+    def embed_query(self, input):
+        return self(input)
+
+    @staticmethod
+    def name():
+        return "test_hash"
+
+    def get_config(self):
+        return {}
+
+    @staticmethod
+    def build_from_config(config):
+        return HashEmbeddingFunction()
+
+    def is_legacy(self):
+        return False
+
+    def default_space(self):
+        return "l2"
+
+    def supported_spaces(self):
+        return ["l2"]
+
+
+@pytest.fixture
+def chroma_client(tmp_path):
+    chromadb = pytest.importorskip("chromadb")
+    return chromadb.PersistentClient(path=str(tmp_path / "chroma"))
+
+
+@pytest.fixture
+def collection(chroma_client):
+    return chroma_client.get_or_create_collection("data", embedding_function=HashEmbeddingFunction())
+
+
+@pytest.fixture
+def search_index(tmp_path, store, chroma_client, collection):
+    """A chunked search index over the test collection, with its own lexical index."""
+    import lexical_index
+    import search
+    chunk_collection = chroma_client.get_or_create_collection("data_chunks", embedding_function=HashEmbeddingFunction())
+    lexical = lexical_index.LexicalIndex(str(tmp_path / "lexical.db"))
+    return search.SearchIndex(collection, chunk_collection, lexical=lexical, mode="chunks", ranking="hybrid")
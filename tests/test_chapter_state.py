@@ -0,0 +1,128 @@
+import json
+
+import chapter_state
+import chroma_writer
+
+BASE_ID = "Test_Book_Book1_Chapter1"
+
+
+def metadata(doc_type, version, **extra):
+    return {"type": doc_type, "book_title": "Test Book", "book_num": 1, "chapter_num": 1, "version": version,
+            **extra}
+
+
+def test_load_imports_versions_stored_only_in_chroma(store, collection):
+    # Written before the version store existed: every version went to ChromaDB only
+    collection.add(ids=[f"{BASE_ID}_v0_original", f"{BASE_ID}_v1_ai_spin", f"{BASE_ID}_v1_ai_review"],
+                   documents=["Original.", "Spin one.", "Review one."],
+                   metadatas=[metadata("original", 0, final_chapter_reward=3.0), metadata("ai_spin", 1),
+                              metadata("ai_review", 1)])
+    # A later session wrote v2 through the version store before the chapter was ever loaded
+    writes = chroma_writer.WriteBehindBuffer(collection, flush_interval_s=0)
+    writes.add(["Edit two."], [metadata("human_edit", 2)], [f"{BASE_ID}_v2_human_edit"])
+    writes.flush()
+
+    chapter = chapter_state.ChapterState.load(collection, "Test Book", 1, 1)
+    assert set(chapter.documents) == {f"{BASE_ID}_v0_original", f"{BASE_ID}_v1_ai_spin", f"{BASE_ID}_v1_ai_review",
+                                      f"{BASE_ID}_v2_human_edit"}
+    assert chapter.latest_version() == 2
+    assert chapter.original == "Original."
+    assert store.is_imported(BASE_ID)
+
+    # The original is not queued again, so its later metadata is kept
+    assert not chapter.ensure(writes, f"{BASE_ID}_v0_original", "Original.", metadata("original", 0))
+    assert writes.pending(f"{BASE_ID}_v0_original") is None
+    assert store.get(f"{BASE_ID}_v0_original")[1]["final_chapter_reward"] == 3.0
+
+    # Imported once: ChromaDB is not read for the chapter again
+    collection.delete(ids=[f"{BASE_ID}_v1_ai_review"])
+    collection.add(ids=[f"{BASE_ID}_v9_ai_spin"], documents=["Not imported."], metadatas=[metadata("ai_spin", 9)])
+    reloaded = chapter_state.ChapterState.load(collection, "Test Book", 1, 1)
+    assert set(reloaded.documents) == set(chapter.documents)
+
+
+def test_session_start_never_replaces_or_duplicates_a_stored_version():
+    def chapter(**documents):
+        return chapter_state.ChapterState(BASE_ID, {f"{BASE_ID}_{suffix}": (text, {}) for suffix, text in documents.items()})
+
+    assert chapter().session_start("Spin.") == 1
+    assert chapter(v0_original="Original.").session_start("Spin.") == 1
+    # The unchanged spin of a declined resume is the stored v1 again, not a new v2
+    assert chapter(v0_original="Original.", v1_ai_spin="Spin.", v1_ai_review="Review.").session_start("Spin.") == 1
+    assert chapter(v0_original="Original.", v1_ai_spin="Spin.").session_start("A new spin.") == 2
+    assert chapter(v0_original="Original.", v1_ai_spin="Spin.", v2_human_edit="Spin.").session_start("Spin.") == 3
+
+
+def flushed(head_index, collection, *versions):
+    """Writes (suffix, metadata) versions through a write buffer that reports its flushes to the index."""
+    writes = chroma_writer.WriteBehindBuffer(collection, flush_interval_s=0)
+    writes.add_flush_listener(head_index.on_flush)
+    for suffix, meta in versions:
+        writes.add([f"text of {suffix}"], [meta], [f"{BASE_ID}_{suffix}"])
+    writes.flush()
+
+
+def test_flushes_move_the_head_forward(tmp_path, store, collection):
+    head_index = chapter_state.ChapterHeadIndex(str(tmp_path / "heads.json"))
+    flushed(head_index, collection,
+            ("v0_original", metadata("original", 0, timestamp="t0")),
+            ("v1_ai_spin", metadata("ai_spin", 1, timestamp="t1", prompt_template_name="vivid")),
+            ("v1_ai_review", metadata("ai_review", 1, timestamp="t1")))
+    head = head_index.head(BASE_ID)
+    assert (head["version"], head["type"], head["review_id"]) == (1, "ai_spin", f"{BASE_ID}_v1_ai_review")
+    assert (head["original_id"], head["prompt_name"]) == (f"{BASE_ID}_v0_original", "vivid")
+
+    flushed(head_index, collection,
+            ("v2_human_edit", metadata("human_edit", 2, timestamp="t2", editor="Ada",
+                                       prompt_used_for_spin_before_edit="vivid")),
+            ("v1_ai_review", metadata("ai_review", 1, timestamp="t1"))) # A late review of an older version
+    head = head_index.head(BASE_ID)
+    assert (head["version"], head["type"], head["review_id"], head["editor"]) == (2, "human_edit", None, "Ada")
+    flushed(head_index, collection, ("v2_ai_review_after_human", metadata("ai_review_after_human", 2, timestamp="t3")))
+    assert head_index.head(BASE_ID)["review_id"] == f"{BASE_ID}_v2_ai_review_after_human"
+
+    # Saved on every change
+    assert chapter_state.ChapterHeadIndex(head_index.path).heads == head_index.heads
+
+
+def test_resumable_lists_unfinished_chapters_newest_first(tmp_path):
+    head_index = chapter_state.ChapterHeadIndex(str(tmp_path / "heads.json"))
+    head_index.heads = {
+        "original_only": {"version": 0, "type": "original", "updated_at": "t4"},
+        "finalized": {"version": 3, "type": "final_version", "updated_at": "t3"},
+        "older": {"version": 1, "type": "ai_spin", "updated_at": "t1"},
+        "newer": {"version": 2, "type": "human_edit", "updated_at": "t2"},
+        "summary_only": {"version": -1, "summary": "A night."},
+    }
+    assert [h["type"] for h in head_index.resumable()] == ["human_edit", "ai_spin"]
+    assert [h["updated_at"] for h in head_index.resumable()] == ["t2", "t1"]
+
+
+def test_rebuild_backfills_from_chroma_and_the_version_store(tmp_path, store, collection):
+    collection.add(ids=[f"{BASE_ID}_v1_ai_review", f"{BASE_ID}_v1_ai_spin", f"{BASE_ID}_v0_original"],
+                   documents=["Review one.", "Spin one.", "Original."],
+                   metadatas=[metadata("ai_review", 1), metadata("ai_spin", 1), metadata("original", 0)])
+    store.put(f"{BASE_ID}_v2_human_edit", "Edit two.", metadata("human_edit", 2, editor="Ada"))
+    head_index = chapter_state.ChapterHeadIndex(str(tmp_path / "heads.json"))
+    head_index.rebuild(collection)
+
+    head = head_index.head(BASE_ID)
+    assert (head["version"], head["type"], head["editor"]) == (2, "human_edit", "Ada")
+    assert head_index.rebuilt_at is not None
+    assert chapter_state.ChapterHeadIndex(head_index.path).rebuilt_at == head_index.rebuilt_at
+
+
+def test_format_1_index_is_read_and_upgraded(tmp_path):
+    path = tmp_path / "heads.json"
+    path.write_text(json.dumps({BASE_ID: {"chapter_base_id": BASE_ID, "version": 1, "type": "ai_spin"}}))
+    head_index = chapter_state.ChapterHeadIndex(str(path))
+    assert head_index.head(BASE_ID)["version"] == 1
+    assert head_index.rebuilt_at is None # Never known to be complete, so the first use rebuilds it
+
+    head_index.save()
+    data = json.loads(path.read_text())
+    assert data["format"] == chapter_state.HEAD_INDEX_FORMAT
+    assert data["heads"] == head_index.heads
+
+    path.write_text("{not json")
+    assert chapter_state.ChapterHeadIndex(str(path)).heads == {}
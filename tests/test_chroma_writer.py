@@ -0,0 +1,60 @@
+import chapter_state
+import chroma_writer
+
+BASE_ID = "Test_Book_Book1_Chapter1"
+
+
+def metadata(doc_type, version, **extra):
+    return {"type": doc_type, "book_title": "Test Book", "book_num": 1, "chapter_num": 1, "version": version,
+            **extra}
+
+
+def test_add_keeps_the_latest_pending_write(store, collection):
+    writes = chroma_writer.WriteBehindBuffer(collection, flush_interval_s=0)
+    writes.add(["first"], [metadata("ai_spin", 1)], [f"{BASE_ID}_v1_ai_spin"])
+    writes.add(["second"], [metadata("ai_spin", 1)], [f"{BASE_ID}_v1_ai_spin"])
+    assert writes.pending(f"{BASE_ID}_v1_ai_spin")[0] == "second"
+    assert writes.stats["deduped"] == 1
+    assert store.get(f"{BASE_ID}_v1_ai_spin") is None
+
+    assert writes.flush() == 1
+    assert store.get(f"{BASE_ID}_v1_ai_spin")[0] == "second"
+    assert writes.pending(f"{BASE_ID}_v1_ai_spin") is None
+
+
+def test_flush_embeds_only_searchable_versions(store, collection):
+    writes = chroma_writer.WriteBehindBuffer(collection, flush_interval_s=0)
+    flushed = []
+    writes.add_flush_listener(lambda ids, documents, metadatas: flushed.extend(ids))
+    writes.add(["original text", "spun text"], [metadata("original", 0), metadata("ai_spin", 1)],
+               [f"{BASE_ID}_v0_original", f"{BASE_ID}_v1_ai_spin"])
+    writes.flush()
+
+    assert flushed == [f"{BASE_ID}_v0_original", f"{BASE_ID}_v1_ai_spin"]
+    assert collection.get()["ids"] == [f"{BASE_ID}_v0_original"]
+    assert store.stored_ids(flushed) == set(flushed)
+
+
+def test_update_metadata_of_a_stored_version_notifies_listeners(store, collection):
+    writes = chroma_writer.WriteBehindBuffer(collection, flush_interval_s=0)
+    writes.add(["original text"], [metadata("original", 0)], [f"{BASE_ID}_v0_original"])
+    writes.flush()
+    updates = []
+    writes.add_flush_listener(lambda ids, documents, metadatas: updates.append((ids, documents, metadatas)))
+
+    writes.update_metadata(f"{BASE_ID}_v0_original", {"final_chapter_reward": 4.5})
+    assert updates == [([f"{BASE_ID}_v0_original"], ["original text"],
+                        [metadata("original", 0, final_chapter_reward=4.5)])]
+    assert collection.get(ids=[f"{BASE_ID}_v0_original"])["metadatas"][0]["final_chapter_reward"] == 4.5
+
+
+def test_latest_version_is_the_highest_stored_version(store, collection):
+    writes = chroma_writer.WriteBehindBuffer(collection, flush_interval_s=0)
+    writes.add(["original", "spin", "edit"],
+               [metadata("original", 0), metadata("ai_spin", 1), metadata("human_edit", 2)],
+               [f"{BASE_ID}_v0_original", f"{BASE_ID}_v1_ai_spin", f"{BASE_ID}_v2_human_edit"])
+    writes.flush()
+
+    chapter = chapter_state.ChapterState.load(collection, "Test Book", 1, 1)
+    assert chapter.latest_version() == 2
+    assert chapter_state.ChapterState("Empty_Book1_Chapter1").latest_version() == -1
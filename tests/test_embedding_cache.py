@@ -0,0 +1,91 @@
+import time
+
+import pytest
+
+import embedding_cache
+from conftest import HashEmbeddingFunction
+
+
+class CountingEmbeddingFunction(HashEmbeddingFunction):
+    def __init__(self):
+        self.batches = []
+
+    def __call__(self, input):
+        self.batches.append(list(input))
+        return super().__call__(input)
+
+
+def cached(tmp_path, max_entries=0):
+    inner = CountingEmbeddingFunction()
+    return embedding_cache.CachedEmbeddingFunction(inner, str(tmp_path / "embeddings.sqlite3"), max_entries), inner
+
+
+def test_only_distinct_unseen_texts_are_embedded_in_one_batch(tmp_path):
+    cache, inner = cached(tmp_path)
+    vectors = cache(["a", "b", "a"])
+    assert inner.batches == [["a", "b"]]
+    assert vectors[0] == vectors[2]
+    assert vectors[1] == pytest.approx(HashEmbeddingFunction()(["b"])[0])
+
+    assert cache(["b", "c", "a"]) == [vectors[1], cache(["c"])[0], vectors[0]]
+    assert inner.batches == [["a", "b"], ["c"]]
+    assert cache.stats["deduped"] == 1
+    assert cache.stats["misses"] == 3
+    assert cache.stats["batches"] == 2
+
+
+def test_queries_are_served_from_the_same_cache(tmp_path):
+    cache, inner = cached(tmp_path)
+    cache(["a"])
+    cache.embed_query(["a"])
+    assert inner.batches == [["a"]]
+
+
+def test_least_recently_used_vectors_are_evicted(tmp_path):
+    cache, inner = cached(tmp_path, max_entries=2)
+    cache(["a"])
+    time.sleep(0.01)
+    cache(["b"])
+    time.sleep(0.01)
+    cache(["a"]) # a is now more recently used than b
+    time.sleep(0.01)
+    cache(["c"])
+    assert cache.stats["evictions"] == 1
+    cache(["a", "c"])
+    cache(["b"])
+    assert inner.batches == [["a"], ["b"], ["c"], ["b"]]
+
+
+def test_vectors_persist_across_reopen(tmp_path):
+    cache, _ = cached(tmp_path)
+    vectors = cache(["a", "b"])
+    reopened, inner = cached(tmp_path)
+    assert reopened(["b", "a"]) == [vectors[1], vectors[0]]
+    assert inner.batches == []
+
+
+def test_keys_and_chroma_interface_follow_the_wrapped_function(tmp_path):
+    class OtherEmbeddingFunction(HashEmbeddingFunction):
+        @staticmethod
+        def name():
+            return "other_hash"
+
+        def get_config(self):
+            return {"dimensions": 16}
+
+    cache, _ = cached(tmp_path)
+    other = embedding_cache.CachedEmbeddingFunction(OtherEmbeddingFunction(), str(tmp_path / "embeddings.sqlite3"))
+    assert (cache.name(), cache.get_config(), cache.default_space()) == ("test_hash", {}, "l2")
+    assert (other.name(), other.get_config()) == ("other_hash", {"dimensions": 16})
+    # Vectors of different models never share a key
+    assert cache.make_key("a") != other.make_key("a")
+
+
+def test_collections_created_without_the_cache_keep_working(tmp_path, chroma_client):
+    chroma_client.get_or_create_collection("data", embedding_function=HashEmbeddingFunction()).add(
+        ids=["x"], documents=["It was a dark night."])
+    cache, inner = cached(tmp_path)
+    collection = chroma_client.get_or_create_collection("data", embedding_function=cache)
+    collection.add(ids=["y"], documents=["The end."])
+    assert collection.query(query_texts=["It was a dark night."], n_results=1)["ids"] == [["x"]]
+    assert inner.batches == [["The end."], ["It was a dark night."]]
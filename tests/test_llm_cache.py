@@ -0,0 +1,88 @@
+import asyncio
+import time
+
+import config
+import llm_cache
+import llm_client
+import llm_scheduler
+
+
+def test_keys_are_stable_and_cover_model_contents_and_config():
+    key = llm_cache.LLMResponseCache.make_key("model-a", "Rewrite this.", {"temperature": 0.7, "top_p": 0.9})
+    assert key == llm_cache.LLMResponseCache.make_key("model-a", "Rewrite this.", {"top_p": 0.9, "temperature": 0.7})
+    assert llm_cache.LLMResponseCache.make_key("model-a", "Rewrite this.") == \
+        llm_cache.LLMResponseCache.make_key("model-a", "Rewrite this.", {})
+    others = {
+        llm_cache.LLMResponseCache.make_key("model-b", "Rewrite this.", {"temperature": 0.7, "top_p": 0.9}),
+        llm_cache.LLMResponseCache.make_key("model-a", "Rewrite that.", {"temperature": 0.7, "top_p": 0.9}),
+        llm_cache.LLMResponseCache.make_key("model-a", "Rewrite this.", {"temperature": 0.8, "top_p": 0.9}),
+    }
+    assert key not in others and len(others) == 3
+
+
+def test_responses_persist_until_their_ttl(tmp_path):
+    path = str(tmp_path / "responses.sqlite3")
+    cache = llm_cache.LLMResponseCache(path, ttl_seconds=0.2)
+    cache.put("key", "model-a", "response")
+    assert llm_cache.LLMResponseCache(path, ttl_seconds=0.2).get("key") == "response"
+
+    time.sleep(0.25)
+    assert cache.get("key") is None
+    cache.put("other", "model-a", "response") # Storing purges expired entries
+    assert cache.stats["evictions"] == 1
+
+
+def test_least_recently_used_entries_are_evicted(tmp_path):
+    cache = llm_cache.LLMResponseCache(str(tmp_path / "responses.sqlite3"), max_entries=2, ttl_seconds=0)
+    cache.put("a", "model-a", "A")
+    time.sleep(0.01)
+    cache.put("b", "model-a", "B")
+    time.sleep(0.01)
+    assert cache.get("a") == "A" # a is now more recently used than b
+    time.sleep(0.01)
+    cache.put("c", "model-a", "C")
+    assert cache.get("b") is None
+    assert (cache.get("a"), cache.get("c")) == ("A", "C")
+
+
+def fake_stack(tmp_path, monkeypatch):
+    """The full client stack on the fake backend, with a fresh response cache. Returns (client, fake)."""
+    monkeypatch.setattr(config, "FAKE_LLM_LATENCY_S", 0)
+    monkeypatch.setattr(config, "FAKE_LLM_JITTER_S", 0)
+    monkeypatch.setattr(config, "FAKE_LLM_ERROR_RATE", 0)
+    monkeypatch.setattr(llm_scheduler, "_scheduler", llm_scheduler.LLMScheduler())
+    monkeypatch.setattr(llm_cache, "_llm_cache", llm_cache.LLMResponseCache(str(tmp_path / "responses.sqlite3")))
+    client = llm_client.get_llm_client("fake-model", backend="fake", use_cache=True)
+    fake = client
+    while not isinstance(fake, llm_client.FakeLLMClient):
+        fake = fake.inner
+    return client, fake
+
+
+def test_repeated_requests_are_answered_from_the_cache(tmp_path, monkeypatch):
+    client, fake = fake_stack(tmp_path, monkeypatch)
+
+    async def run():
+        first = await client.generate("Rewrite this.")
+        again = await client.generate("Rewrite this.")
+        streamed = [chunk async for chunk in client.generate_stream("Rewrite this.")]
+        return first, again, streamed
+
+    first, again, streamed = asyncio.run(run())
+    assert first == again == "".join(streamed)
+    assert fake.calls == 1
+
+
+def test_bypass_cache_always_reaches_the_backend(tmp_path, monkeypatch):
+    # Re-spins rely on this: a bypassed request must never be served the previous response
+    client, fake = fake_stack(tmp_path, monkeypatch)
+
+    async def run():
+        await client.generate("Rewrite this.")
+        await client.generate("Rewrite this.", bypass_cache=True)
+        await llm_client.generate_text(client, "Rewrite this.", bypass_cache=True, on_chunk=lambda chunk: None)
+
+    asyncio.run(run())
+    assert fake.calls == 3
+    assert llm_cache.get_llm_cache().stats["bypassed"] == 2
+    assert llm_cache.get_llm_cache().stats["hits"] == 0
@@ -0,0 +1,149 @@
+import asyncio
+import time
+
+import pytest
+
+import llm_client
+import llm_resilience
+
+
+class ScriptedFakeClient(llm_client.FakeLLMClient):
+    """Fake backend whose calls follow a script: each entry is an exception to raise or a latency in seconds."""
+    def __init__(self, script, responses=("ok",)):
+        super().__init__("fake-model", latency_s=0, jitter_s=0, error_rate=0, mode="canned", responses=list(responses))
+        self.script = list(script)
+        self.started = 0
+        self.cancelled = 0
+
+    async def _generate(self, contents) -> str:
+        step = self.script[self.started] if self.started < len(self.script) else 0
+        self.started += 1
+        if isinstance(step, BaseException):
+            self.calls += 1
+            raise step
+        try:
+            await asyncio.sleep(step)
+        except asyncio.CancelledError:
+            self.cancelled += 1
+            raise
+        return await super()._generate(contents)
+
+
+def resilient(inner, **kwargs):
+    kwargs.setdefault("hedge_after_s", 0)
+    return llm_resilience.ResilientLLMClient(inner, backoff_base_s=0.001, backoff_max_s=0.001, **kwargs)
+
+
+class ServiceUnavailable(Exception):
+    """Named like the google.api_core exception for a 503."""
+
+
+class StatusError(Exception):
+    def __init__(self, code):
+        super().__init__(f"HTTP {code}")
+        self.code = code
+
+
+def test_is_transient_classifies_errors():
+    for error in (asyncio.TimeoutError(), ConnectionResetError(), llm_client.FakeLLMError("flaky"),
+                  ServiceUnavailable(), StatusError(429), StatusError(503)):
+        assert llm_resilience.is_transient(error), error
+    for error in (ValueError("blocked prompt"), StatusError(400), StatusError(403), KeyError("x")):
+        assert not llm_resilience.is_transient(error), error
+
+
+def test_transient_errors_are_retried():
+    inner = ScriptedFakeClient([llm_client.FakeLLMError("1"), StatusError(503)])
+    client = resilient(inner, max_retries=4)
+    assert asyncio.run(client.generate("prompt")) == "ok"
+    assert inner.calls == 3
+    assert client.stats["retries"] == 2
+    assert client.stats["failures"] == 0
+
+
+def test_permanent_errors_are_raised_at_once():
+    inner = ScriptedFakeClient([StatusError(400)])
+    client = resilient(inner, max_retries=4)
+    with pytest.raises(StatusError):
+        asyncio.run(client.generate("prompt"))
+    assert inner.calls == 1
+    assert client.stats["retries"] == 0
+    assert client.stats["failures"] == 1
+
+
+def test_retries_stop_at_the_limit():
+    inner = llm_client.FakeLLMClient("fake-model", latency_s=0, jitter_s=0, error_rate=1.0)
+    client = resilient(inner, max_retries=2)
+    with pytest.raises(llm_client.FakeLLMError):
+        asyncio.run(client.generate("prompt"))
+    assert inner.calls == 3
+    assert client.stats["retries"] == 2
+
+
+def test_attempt_deadline_counts_as_a_timeout():
+    inner = ScriptedFakeClient([1.0])
+    client = resilient(inner, max_retries=1, timeout_s=0.05)
+    assert asyncio.run(client.generate("prompt")) == "ok"
+    assert client.stats["timeouts"] == 1
+    assert client.stats["retries"] == 1
+
+
+def test_hedged_request_wins_and_the_slow_one_is_cancelled():
+    inner = ScriptedFakeClient([1.0, 0.0])
+    client = resilient(inner, hedge_after_s=0.05)
+
+    async def run():
+        start = time.monotonic()
+        result = await client.generate("prompt")
+        elapsed = time.monotonic() - start
+        await asyncio.sleep(0) # Let the cancellation land
+        return result, elapsed
+
+    result, elapsed = asyncio.run(run())
+    assert result == "ok"
+    assert elapsed < 0.5
+    assert client.stats["hedges_fired"] == 1
+    assert client.stats["hedges_won"] == 1
+    assert inner.cancelled == 1
+
+
+def test_fast_primary_fires_no_hedge():
+    inner = ScriptedFakeClient([0.0])
+    client = resilient(inner, hedge_after_s=0.5)
+    assert asyncio.run(client.generate("prompt")) == "ok"
+    assert client.stats["hedges_fired"] == 0
+    assert inner.calls == 1
+
+
+def test_stream_is_retried_before_its_first_chunk():
+    inner = ScriptedFakeClient([llm_client.FakeLLMError("before any output")], responses=["streamed text"])
+    client = resilient(inner, max_retries=2)
+
+    async def collect():
+        return [chunk async for chunk in client.generate_stream("prompt")]
+
+    assert "".join(asyncio.run(collect())) == "streamed text"
+    assert client.stats["retries"] == 1
+
+
+def test_stream_is_not_retried_after_a_chunk_was_emitted():
+    class BreaksMidStream(ScriptedFakeClient):
+        async def generate_stream(self, contents, generation_config=None, bypass_cache=False, timeout_s=None):
+            self.calls += 1
+            yield "partial "
+            raise llm_client.FakeLLMError("connection dropped")
+
+    inner = BreaksMidStream([])
+    client = resilient(inner, max_retries=3)
+    chunks = []
+
+    async def collect():
+        async for chunk in client.generate_stream("prompt"):
+            chunks.append(chunk)
+
+    with pytest.raises(llm_client.FakeLLMError):
+        asyncio.run(collect())
+    assert chunks == ["partial "]
+    assert inner.calls == 1
+    assert client.stats["retries"] == 0
+    assert client.stats["failures"] == 1
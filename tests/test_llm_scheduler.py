@@ -0,0 +1,113 @@
+import asyncio
+import time
+
+import llm_client
+import llm_scheduler
+
+# 600 requests/minute refill one request every 0.1s once the burst is spent
+LIMITS = {"fake-model": {"rpm": 600, "tpm": 1_000_000}}
+
+
+def scheduled_client(scheduler):
+    fake = llm_client.FakeLLMClient("fake-model", latency_s=0, jitter_s=0, error_rate=0, mode="canned",
+                                    responses=["ok"])
+    return llm_scheduler.ScheduledLLMClient(fake, scheduler), fake
+
+
+def test_token_bucket_refills_at_its_rate():
+    bucket = llm_scheduler.TokenBucket(capacity=10, rate=100)
+    assert bucket.time_until(10) == 0.0
+    bucket.consume(10)
+    assert 0.0 < bucket.time_until(5) <= 0.05
+    time.sleep(0.06)
+    assert bucket.time_until(5) == 0.0
+    assert bucket.time_until(11) > 0 # More than the capacity never fits in one go
+
+
+def test_estimate_tokens_counts_prompt_and_output_budget():
+    assert llm_scheduler.estimate_tokens("x" * 400, {"max_output_tokens": 100}) == 201
+    assert llm_scheduler.estimate_tokens("x" * 400) == 101 + llm_scheduler.config.LLM_ESTIMATED_OUTPUT_TOKENS
+
+
+def test_calls_within_the_budget_do_not_wait():
+    async def run():
+        scheduler = llm_scheduler.LLMScheduler(LIMITS)
+        client, fake = scheduled_client(scheduler)
+        start = time.monotonic()
+        results = await asyncio.gather(*(client.generate("prompt") for _ in range(5)))
+        return results, time.monotonic() - start, fake, scheduler
+
+    results, elapsed, fake, scheduler = asyncio.run(run())
+    assert results == ["ok"] * 5
+    assert fake.calls == 5
+    assert elapsed < 0.1
+    assert scheduler.snapshot()[0]["granted"] == 5
+
+
+def test_calls_past_the_request_budget_are_paced():
+    async def run():
+        scheduler = llm_scheduler.LLMScheduler(LIMITS)
+        scheduler.budget("fake-model").requests.tokens = 0 # Burst already spent
+        client, _ = scheduled_client(scheduler)
+        start = time.monotonic()
+        await asyncio.gather(*(client.generate("prompt") for _ in range(3)))
+        return time.monotonic() - start, scheduler
+
+    elapsed, scheduler = asyncio.run(run())
+    assert elapsed >= 0.25
+    snapshot = scheduler.snapshot()[0]
+    assert snapshot["max_queue_depth"] == 3
+    assert snapshot["queue_depth"] == 0
+    assert snapshot["max_wait_s"] >= 0.25
+
+
+def test_calls_past_the_token_budget_are_paced():
+    async def run():
+        # 60,000 tokens/minute refill 1,000 tokens a second
+        scheduler = llm_scheduler.LLMScheduler({"fake-model": {"rpm": 600, "tpm": 60_000}})
+        scheduler.budget("fake-model").tokens.tokens = 0
+        client, _ = scheduled_client(scheduler)
+        start = time.monotonic()
+        await client.generate("x" * 400, {"max_output_tokens": 99}) # 200 tokens
+        return time.monotonic() - start
+
+    assert 0.15 <= asyncio.run(run()) < 1.0
+
+
+def test_owners_are_served_round_robin():
+    async def run():
+        scheduler = llm_scheduler.LLMScheduler(LIMITS)
+        scheduler.budget("fake-model").requests.tokens = 0
+        order = []
+
+        async def call(owner, label):
+            await scheduler.acquire("fake-model", 10, owner)
+            order.append(label)
+
+        # The busy chapter queues first, but the other chapter's call is not left behind all of it
+        tasks = [asyncio.create_task(call("busy_chapter", f"busy{i}")) for i in range(3)]
+        tasks.append(asyncio.create_task(call("other_chapter", "other")))
+        await asyncio.gather(*tasks)
+        return order
+
+    assert asyncio.run(run()) == ["busy0", "other", "busy1", "busy2"]
+
+
+def test_queue_depth_counts_the_waiter_being_paced():
+    async def run():
+        scheduler = llm_scheduler.LLMScheduler(LIMITS)
+        budget = scheduler.budget("fake-model")
+        budget.requests.tokens = 0
+        tasks = [asyncio.create_task(scheduler.acquire("fake-model", 10, "chapter")) for _ in range(3)]
+        await asyncio.sleep(0.01) # The dispatcher has taken the first waiter and sleeps until it fits
+        depth_while_paced = budget.snapshot()["queue_depth"]
+        tasks[0].cancel() # The waiter being paced
+        tasks[2].cancel() # A waiter still queued
+        await asyncio.gather(*tasks, return_exceptions=True)
+        await asyncio.sleep(0.15) # Let the dispatcher wake up and skip the cancelled waiters
+        return depth_while_paced, budget.snapshot()
+
+    depth_while_paced, snapshot = asyncio.run(run())
+    assert depth_while_paced == 3
+    assert snapshot["queue_depth"] == 0
+    assert snapshot["granted"] == 1
@@ -0,0 +1,97 @@
+import asyncio
+import os
+
+import httpx
+import pytest
+
+import page_cache
+
+URL = "https://en.wikisource.org/wiki/Test_Book/Book_1/Chapter_1"
+PAGE = "<html><body><p>Chapter one.</p></body></html>"
+
+
+class Server:
+    """httpx.MockTransport handler that serves one page with validators and records the requests."""
+    def __init__(self, status_code=200, body=PAGE, etag='"v1"', last_modified="Mon, 01 Jan 2024 00:00:00 GMT"):
+        self.status_code = status_code
+        self.body = body
+        self.etag = etag
+        self.last_modified = last_modified
+        self.requests = []
+
+    def __call__(self, request: httpx.Request) -> httpx.Response:
+        self.requests.append(request)
+        if self.etag and request.headers.get("If-None-Match") == self.etag:
+            return httpx.Response(304, headers={"ETag": self.etag})
+        headers = {"Content-Type": "text/html; charset=utf-8"}
+        if self.etag:
+            headers["ETag"] = self.etag
+        if self.last_modified:
+            headers["Last-Modified"] = self.last_modified
+        return httpx.Response(self.status_code, text=self.body, headers=headers)
+
+
+def fetch(cache, server, url=URL):
+    async def run():
+        async with httpx.AsyncClient(transport=httpx.MockTransport(server)) as client:
+            return await cache.fetch(client, url)
+    return asyncio.run(run())
+
+
+def test_cached_pages_are_revalidated_and_a_304_is_served_from_disk(tmp_path):
+    server = Server()
+    cache = page_cache.PageCache(str(tmp_path), offline=False)
+    assert fetch(cache, server) == (200, PAGE)
+    assert "If-None-Match" not in server.requests[0].headers
+
+    # A new process reads the same index and revalidates with the stored validators
+    reopened = page_cache.PageCache(str(tmp_path), offline=False)
+    assert fetch(reopened, server) == (200, PAGE)
+    assert server.requests[1].headers["If-None-Match"] == '"v1"'
+    assert server.requests[1].headers["If-Modified-Since"] == "Mon, 01 Jan 2024 00:00:00 GMT"
+    assert reopened.stats == {"hits_offline": 0, "revalidated": 1, "fetched": 0, "misses_offline": 0}
+    assert reopened.lookup(URL)["revalidated_at"]
+
+
+def test_changed_pages_are_fetched_again(tmp_path):
+    server = Server()
+    cache = page_cache.PageCache(str(tmp_path), offline=False)
+    fetch(cache, server)
+    server.etag, server.body = '"v2"', "<html><body><p>Chapter one, revised.</p></body></html>"
+    assert fetch(cache, server) == (200, server.body)
+    assert cache.lookup(URL)["etag"] == '"v2"'
+    assert cache.stats["fetched"] == 2
+
+
+def test_identical_bodies_are_stored_once(tmp_path):
+    cache = page_cache.PageCache(str(tmp_path), offline=False)
+    fetch(cache, Server(), URL)
+    fetch(cache, Server(), URL + "?oldid=1")
+    assert len(os.listdir(tmp_path / "objects")) == 1
+
+
+def test_missing_pages_are_cached_and_served_offline(tmp_path):
+    missing = "<html><body><h1>No such page</h1></body></html>"
+    fetch(page_cache.PageCache(str(tmp_path), offline=False), Server(status_code=404, body=missing, etag=None))
+
+    offline = page_cache.PageCache(str(tmp_path), offline=True)
+    unreachable = Server()
+    assert fetch(offline, unreachable) == (404, missing)
+    assert unreachable.requests == []
+    assert offline.stats["hits_offline"] == 1
+
+
+def test_offline_mode_raises_for_pages_never_cached(tmp_path):
+    cache = page_cache.PageCache(str(tmp_path), offline=True)
+    server = Server()
+    with pytest.raises(page_cache.PageCacheMiss):
+        fetch(cache, server)
+    assert server.requests == []
+    assert cache.stats["misses_offline"] == 1
+
+
+def test_server_errors_raise_and_are_not_cached(tmp_path):
+    cache = page_cache.PageCache(str(tmp_path), offline=False)
+    with pytest.raises(httpx.HTTPStatusError):
+        fetch(cache, Server(status_code=503))
+    assert cache.lookup(URL) is None
@@ -0,0 +1,105 @@
+import asyncio
+
+import pytest
+
+import llm_client
+import pipeline
+import prompt_manager
+import review
+import spin_write
+
+
+def fake(latency_s=0.0, responses=None):
+    return llm_client.FakeLLMClient("fake-model", latency_s=latency_s, jitter_s=0, error_rate=0, mode="canned",
+                                    responses=responses)
+
+
+@pytest.fixture(autouse=True)
+def prompt_scores_file(tmp_path, monkeypatch):
+    monkeypatch.setattr(prompt_manager, "PROMPTS_FILE", str(tmp_path / "prompt_scores.json"))
+
+
+def chapter_pipeline(review_latency_s=0.0, spin_writer=None, **kwargs):
+    spin_writer = spin_writer or spin_write.SpinWrite("fake-model", client=fake(responses=["Spun."]),
+                                                      summarize_client=fake(responses=["Summary."]))
+    reviewer = review.Review("fake-model", client=fake(review_latency_s, responses=["Reviewed."]))
+    return pipeline.ChapterPipeline(spin_writer, reviewer, **kwargs)
+
+
+async def chapters(count, fed=None, fail_after=None):
+    for chap_num in range(1, count + 1):
+        if chap_num == fail_after:
+            raise ConnectionError("scraper went away")
+        if fed is not None:
+            fed.append(chap_num)
+        yield {"book_name_slug": "Test_Book", "book_num": 1, "chap_num": chap_num, "title": f"Chapter {chap_num}",
+               "text": f"Text {chap_num}."}
+
+
+def run(chapter_pipeline, source):
+    return asyncio.run(asyncio.wait_for(chapter_pipeline.run(source), timeout=5))
+
+
+def test_every_chapter_goes_through_every_stage_in_order():
+    results = run(chapter_pipeline(workers=2), chapters(5))
+    assert [c["chap_num"] for c in results] == [1, 2, 3, 4, 5]
+    assert all((c["summary"], c["spun_text"], c["review_text"]) == ("Summary.", "Spun.", "Reviewed.")
+               for c in results)
+
+
+def test_a_slow_stage_holds_back_the_source():
+    fed, ahead = [], []
+    collected = 0
+
+    async def on_result(chapter):
+        nonlocal collected
+        collected += 1
+        ahead.append(len(fed) - collected)
+
+    bounded = chapter_pipeline(review_latency_s=0.01, queue_size=1, workers=1, on_result=on_result)
+    assert len(run(bounded, chapters(20, fed))) == 20
+    # Three queues of one, one chapter in each stage and one the source is waiting to put
+    assert max(ahead) <= 7
+    assert all(bounded.stats[name].max_queue_depth <= 1 for name in ("summarize", "spin", "review"))
+
+
+def test_each_worker_gets_one_shutdown_sentinel(monkeypatch):
+    queues = []
+
+    class RecordingQueue(asyncio.Queue):
+        def __init__(self, maxsize=0):
+            super().__init__(maxsize)
+            self.sentinels = 0
+            queues.append(self)
+
+        async def put(self, item):
+            self.sentinels += item is None
+            await super().put(item)
+
+    monkeypatch.setattr(pipeline.asyncio, "Queue", RecordingQueue)
+    # Fewer chapters than workers: idle workers must still be released
+    assert len(run(chapter_pipeline(workers=3), chapters(2))) == 2
+    assert [q.sentinels for q in queues] == [3, 3, 3, 1]
+    assert all(q.empty() for q in queues)
+
+
+def test_a_raising_stage_fails_only_its_chapter():
+    class FlakySpinWrite(spin_write.SpinWrite):
+        async def ai_spin_content(self, original_content, *args, **kwargs):
+            if original_content == "Text 2.":
+                raise RuntimeError("unexpected spin error")
+            return await super().ai_spin_content(original_content, *args, **kwargs)
+
+    spin_writer = FlakySpinWrite("fake-model", client=fake(responses=["Spun."]),
+                                 summarize_client=fake(responses=["Summary."]))
+    flaky = chapter_pipeline(spin_writer=spin_writer, workers=2)
+    results = run(flaky, chapters(3))
+    assert [c["chap_num"] for c in results] == [1, 2, 3]
+    assert results[1]["review_text"] is None
+    assert [c["review_text"] for c in (results[0], results[2])] == ["Reviewed.", "Reviewed."]
+    assert (flaky.stats["spin"].processed, flaky.stats["spin"].failed) == (2, 1)
+    assert flaky.stats["review"].failed == 1
+
+
+def test_a_raising_source_still_finishes_the_chapters_it_fed():
+    assert [c["chap_num"] for c in run(chapter_pipeline(), chapters(5, fail_after=3))] == [1, 2]
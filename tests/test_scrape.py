@@ -0,0 +1,162 @@
+import asyncio
+
+import httpx
+import pytest
+
+import config
+import page_cache
+import scrape
+import screenshots
+
+BOOK = "Test_Book"
+
+
+def chapter_page(title, *paragraphs):
+    """A Wikisource chapter page as served: paragraphs sit in the transcluded '.prp-pages-output' block."""
+    body = "".join(f"<p>{p}</p>" for p in paragraphs)
+    return (f'<html><body><h1 id="firstHeading"><span class="mw-page-title-main">{title}</span></h1>'
+            f'<div class="mw-parser-output"><p>Header notes are not chapter text.</p>'
+            f'<div class="prp-pages-output">{body}</div></div></body></html>')
+
+
+MISSING_PAGE = ('<html><body><h1 id="firstHeading"><span class="mw-page-title-main">Test Book/Book 1/Chapter 9'
+                '</span></h1><div class="mw-parser-output"><p>Wikisource does not have a text with this exact name.'
+                '</p></div></body></html>')
+
+
+class Wikisource:
+    """httpx.MockTransport handler serving chapter pages by chapter number; anything else is a 404."""
+    def __init__(self, pages):
+        self.pages = pages
+        self.requested = []
+
+    def __call__(self, request: httpx.Request) -> httpx.Response:
+        _, _, chap_num = scrape.book_chapter_info(request.url.path)
+        self.requested.append(chap_num)
+        page = self.pages.get(chap_num, MISSING_PAGE)
+        if isinstance(page, int):
+            return httpx.Response(page, text="")
+        return httpx.Response(404 if page is MISSING_PAGE else 200, text=page)
+
+
+@pytest.fixture
+def wikisource(tmp_path, monkeypatch):
+    """Routes the scraper's HTTP client to a fake Wikisource and gives it an empty page cache."""
+    monkeypatch.setattr(config, "SCREENSHOT_MODE", "off")
+
+    def install(pages):
+        server = Wikisource(pages)
+        monkeypatch.setattr(scrape, "_http_client", httpx.AsyncClient(transport=httpx.MockTransport(server)))
+        monkeypatch.setattr(page_cache, "_page_cache", page_cache.PageCache(str(tmp_path / "pages"), offline=False))
+        return server
+    return install
+
+
+def test_extract_chapter_from_html_reads_title_and_content_paragraphs():
+    html = chapter_page("Chapter 1", "  First <i>paragraph</i>.  ", "Second paragraph.")
+    assert scrape.extract_chapter_from_html(html) == ("Chapter 1", ["  First paragraph.  ", "Second paragraph."])
+    assert scrape.extract_chapter_from_html(MISSING_PAGE) == ("Test Book/Book 1/Chapter 9", None)
+    assert scrape.extract_chapter_from_html("<html><body><p>No heading.</p></body></html>") == (None, None)
+
+
+def test_build_chapter_text_applies_the_validity_rules():
+    url = scrape.construct_wikisource_url(BOOK, 1, 1)
+    css = ".mw-parser-output .dropinitial{float:left}"
+    html = chapter_page("Chapter 1", f"<style>{css}</style>", " First. ", "Second.")
+    assert scrape.build_chapter_text(url, *scrape.extract_chapter_from_html(html)) == ("First.\n\nSecond.", True)
+    assert scrape.build_chapter_text(url, None, None) == ("", False)
+    assert scrape.build_chapter_text(url, "No such page", ["Text."]) == ("", False)
+    assert scrape.build_chapter_text(url, "Chapter 1", None) == ("", False)
+    assert scrape.build_chapter_text(url, "Chapter 1", [css, "   "])[1] is False
+
+
+def test_scrape_content_fast_path_needs_no_browser(wikisource):
+    server = wikisource({1: chapter_page("Chapter 1", "It was a dark night.", "The end.")})
+
+    async def run():
+        return await scrape.scrape_content(BOOK, 1, 1, pool=None, save_to_file=False, screenshot_mode="off")
+
+    assert asyncio.run(run()) == ("It was a dark night.\n\nThe end.", "Chapter 1", None, True)
+    assert server.requested == [1]
+
+
+def test_scrape_content_reports_missing_and_failing_pages_as_invalid(wikisource):
+    wikisource({2: 500})
+
+    async def run():
+        missing = await scrape.scrape_content(BOOK, 1, 9, save_to_file=False, screenshot_mode="off")
+        failing = await scrape.scrape_content(BOOK, 1, 2, save_to_file=False, screenshot_mode="off")
+        return missing, failing
+
+    missing, failing = asyncio.run(run())
+    assert missing == ("", "Test Book/Book 1/Chapter 9", None, False)
+    assert failing[3] is False
+
+
+def crawl(max_concurrency):
+    return asyncio.run(scrape.crawl_book_chapters(BOOK, 1, max_concurrency))
+
+
+def test_crawl_stops_at_the_first_invalid_chapter(wikisource):
+    # Chapter 5 exists, but the book ends at the missing chapter 4
+    server = wikisource({n: chapter_page(f"Chapter {n}", f"Text {n}.") for n in (1, 2, 3, 5)})
+    chapters = crawl(max_concurrency=2)
+    assert [c["chap_num"] for c in chapters] == [1, 2, 3]
+    assert [c["text"] for c in chapters] == ["Text 1.", "Text 2.", "Text 3."]
+    assert all(c["screenshot_path"] is None for c in chapters)
+    # Nothing past the window following the invalid chapter is requested
+    assert max(server.requested) <= 4 + 2 - 1
+
+
+def test_crawl_ends_the_book_at_a_failing_chapter(wikisource):
+    wikisource({1: chapter_page("Chapter 1", "Text 1."), 2: 503, 3: chapter_page("Chapter 3", "Text 3.")})
+    assert [c["chap_num"] for c in crawl(max_concurrency=3)] == [1]
+
+
+def test_crawl_keeps_at_most_max_concurrency_chapters_in_flight(tmp_path, monkeypatch):
+    in_flight = peak = 0
+
+    async def handler(request):
+        nonlocal in_flight, peak
+        in_flight += 1
+        peak = max(peak, in_flight)
+        await asyncio.sleep(0.01)
+        in_flight -= 1
+        _, _, chap_num = scrape.book_chapter_info(request.url.path)
+        if chap_num > 8:
+            return httpx.Response(404, text=MISSING_PAGE)
+        return httpx.Response(200, text=chapter_page(f"Chapter {chap_num}", f"Text {chap_num}."))
+
+    monkeypatch.setattr(config, "SCREENSHOT_MODE", "off")
+    monkeypatch.setattr(scrape, "_http_client", httpx.AsyncClient(transport=httpx.MockTransport(handler)))
+    monkeypatch.setattr(page_cache, "_page_cache", page_cache.PageCache(str(tmp_path / "pages"), offline=False))
+    assert len(crawl(max_concurrency=3)) == 8
+    assert peak == 3
+
+
+class RecordingScreenshotQueue(screenshots.ScreenshotQueue):
+    """Records deferred captures instead of rendering them in a browser."""
+    def __init__(self):
+        super().__init__()
+        self.scheduled = []
+
+    def schedule(self, pool, url, path):
+        self.scheduled.append(path)
+
+
+def test_valid_chapters_get_a_deferred_screenshot_by_default(tmp_path, monkeypatch):
+    server = Wikisource({1: chapter_page("Chapter 1", "Text 1.")})
+    monkeypatch.setattr(scrape, "_http_client", httpx.AsyncClient(transport=httpx.MockTransport(server)))
+    monkeypatch.setattr(page_cache, "_page_cache", page_cache.PageCache(str(tmp_path / "pages"), offline=False))
+    queue = RecordingScreenshotQueue()
+    monkeypatch.setattr(screenshots, "_screenshot_queue", queue)
+
+    async def run():
+        valid = await scrape.scrape_content(BOOK, 1, 1, save_to_file=False)
+        missing = await scrape.scrape_content(BOOK, 1, 2, save_to_file=False)
+        return valid, missing
+
+    assert config.SCREENSHOT_MODE == "deferred"
+    valid, missing = asyncio.run(run())
+    assert valid[2] == queue.scheduled[0] == screenshots.screenshot_path_for(BOOK, 1, 1)
+    assert missing[2] is None and len(queue.scheduled) == 1
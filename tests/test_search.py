@@ -0,0 +1,70 @@
+import chroma_writer
+import lexical_index
+
+
+def metadata(doc_type, version, chapter_num=1, editor="ann"):
+    return {"type": doc_type, "book_title": "Test Book", "book_num": 1, "chapter_num": chapter_num,
+            "version": version, "editor": editor}
+
+
+def write(search_index, collection, store, versions):
+    """Writes (doc_id, text, metadata) versions through a write buffer indexed by search_index."""
+    writes = chroma_writer.WriteBehindBuffer(collection, flush_interval_s=0)
+    writes.add_flush_listener(search_index.on_flush)
+    writes.add([text for _, text, _ in versions], [md for _, _, md in versions], [doc_id for doc_id, _, _ in versions])
+    writes.flush()
+    return writes
+
+
+def test_parse_query_splits_terms_and_phrases():
+    assert lexical_index.tokenize("The Sea-King's ship!") == ["the", "sea", "king's", "ship"]
+    assert lexical_index.parse_query('ship "grey  Morning"') == (["ship", "grey", "morning"], ["grey morning"])
+    assert lexical_index.parse_query('"" gulls') == (["gulls"], [])
+
+
+def test_lexical_index_ranks_and_filters(tmp_path):
+    index = lexical_index.LexicalIndex(str(tmp_path / "lexical.db"))
+    index.index_version("A_v1_ai_spin", ["gulls gulls circled slowly over the grey reef", "a quiet harbour"], metadata("ai_spin", 1))
+    index.index_version("B_v2_human_edit", ["one gull over the reef"], metadata("human_edit", 2, editor="bob"))
+
+    # Same term frequency, so the shorter chunk ranks first
+    assert [row[0] for row in index.search(["reef"])] == ["B_v2_human_edit_c0", "A_v1_ai_spin_c0"]
+    assert [row[0] for row in index.search(["gulls"])] == ["A_v1_ai_spin_c0"]
+    assert [row[1] for row in index.search(["reef"], {"editor": "bob"})] == ["B_v2_human_edit"]
+    assert index.search(["reef"], {"$and": [{"editor": "bob"}, {"type": "ai_spin"}]}) == []
+
+    # Re-indexing a version replaces its postings
+    index.index_version("A_v1_ai_spin", ["a quiet harbour"], metadata("ai_spin", 1))
+    assert [row[1] for row in index.search(["reef"])] == ["B_v2_human_edit"]
+    assert index.count() == 2
+
+
+def test_lexical_search_matches_phrases_on_word_boundaries(search_index, collection, store):
+    write(search_index, collection, store, [
+        ("Test_Book_Book1_Chapter1_v1_ai_spin", "They walked down to the seaside at dawn.", metadata("ai_spin", 1)),
+        ("Test_Book_Book1_Chapter1_v2_human_edit", "They walked down to the sea at dawn.", metadata("human_edit", 2)),
+    ])
+
+    results = search_index.search('"the sea"', n_results=5, ranking="lexical")
+    assert [result["id"] for result in results] == ["Test_Book_Book1_Chapter1_v2_human_edit"]
+    assert results[0]["passage"] == "They walked down to the sea at dawn."
+    assert results[0]["score_name"] == "BM25"
+    assert len(search_index.search("walked dawn", n_results=5, ranking="lexical")) == 2
+
+
+def test_search_filters_apply_to_every_ranking(search_index, collection, store):
+    write(search_index, collection, store, [
+        ("Test_Book_Book1_Chapter1_v0_original", "The ship left the harbour.", metadata("original", 0)),
+        ("Test_Book_Book1_Chapter2_v0_original", "The ship reached the reef.", metadata("original", 0, chapter_num=2)),
+        ("Test_Book_Book1_Chapter2_v3_final", "The ship reached the reef at last.",
+         metadata("final_version", 3, chapter_num=2, editor="bob")),
+    ])
+
+    for ranking in ("lexical", "vector", "hybrid"):
+        results = search_index.search("ship", {"chapter_num": 2}, n_results=5, ranking=ranking)
+        assert {result["id"] for result in results} == {"Test_Book_Book1_Chapter2_v0_original",
+                                                       "Test_Book_Book1_Chapter2_v3_final"}, ranking
+        results = search_index.search("ship", {"$and": [{"chapter_num": 2}, {"editor": "bob"}]},
+                                      n_results=5, ranking=ranking)
+        assert [result["id"] for result in results] == ["Test_Book_Book1_Chapter2_v3_final"], ranking
+        assert search_index.search("ship", {"editor": "nobody"}, n_results=5, ranking=ranking) == [], ranking
@@ -0,0 +1,72 @@
+import chroma_writer
+import search_cache
+
+ORIGINAL_ID = "Test_Book_Book1_Chapter1_v0_original"
+
+
+def metadata(doc_type, version, editor="ann"):
+    return {"type": doc_type, "book_title": "Test Book", "book_num": 1, "chapter_num": 1, "version": version,
+            "editor": editor}
+
+
+def test_results_are_cached_until_the_generation_moves():
+    cache = search_cache.SearchResultCache(max_entries=2)
+    key = cache.make_key("ship", {"type": "original"}, 5, "hybrid")
+    assert cache.get(key) is None
+    cache.put(key, ["result"])
+    assert cache.get(cache.make_key("ship", {"type": "original"}, 5, "hybrid")) == ["result"]
+    assert cache.make_key("ship", {"type": "original"}, 3, "hybrid") != key
+
+    cache.bump(["some_id"], ["text"], [{}])
+    assert cache.get(cache.make_key("ship", {"type": "original"}, 5, "hybrid")) is None
+    assert cache.stats == {"hits": 1, "misses": 2, "generations": 1}
+
+
+def test_least_recently_used_results_are_evicted():
+    cache = search_cache.SearchResultCache(max_entries=2)
+    keys = [cache.make_key(query, None, 5, "lexical") for query in ("a", "b", "c")]
+    cache.put(keys[0], [0])
+    cache.put(keys[1], [1])
+    cache.get(keys[0])
+    cache.put(keys[2], [2])
+    assert cache.get(keys[1]) is None
+    assert cache.get(keys[0]) == [0] and cache.get(keys[2]) == [2]
+
+
+def test_filter_sets_split_where_clauses(collection):
+    collection.add(ids=["a", "b", "c"], documents=["one", "two", "three"],
+                   metadatas=[metadata("original", 0), metadata("final_version", 2), metadata("final_version", 3, "bob")])
+    filter_sets = search_cache.FilterSets(collection)
+
+    assert filter_sets.split(None) == (None, None)
+    assert filter_sets.split({"version": 2}) == (None, {"version": 2})
+    assert filter_sets.split({"type": "final_version"}) == ({"b", "c"}, None)
+    assert filter_sets.split({"$and": [{"type": "final_version"}, {"editor": "ann"}, {"version": 2}]}) == (
+        {"b"}, {"version": 2})
+
+    filter_sets.add(["a"], [metadata("original", 0, "bob")])
+    filter_sets.remove(["c"])
+    assert filter_sets.split({"editor": "bob"}) == ({"a"}, None)
+
+
+def test_writes_invalidate_cached_search_results(search_index, collection, store):
+    writes = chroma_writer.WriteBehindBuffer(collection, flush_interval_s=0)
+    writes.add_flush_listener(search_index.on_flush)
+    writes.add(["The ship left the harbour."], [metadata("original", 0)], [ORIGINAL_ID])
+    writes.flush()
+
+    first = search_index.search("harbour", {"editor": "ann"}, n_results=5, ranking="lexical")
+    assert [result["id"] for result in first] == [ORIGINAL_ID]
+    assert search_index.search("harbour", {"editor": "ann"}, n_results=5, ranking="lexical") is first
+
+    # A metadata update of a stored version is a write too: cached results, the lexical
+    # index and the chunk filter sets all follow it
+    writes.update_metadata(ORIGINAL_ID, {"editor": "bob"})
+    for ranking in ("lexical", "vector"):
+        assert search_index.search("harbour", {"editor": "ann"}, n_results=5, ranking=ranking) == []
+        results = search_index.search("harbour", {"editor": "bob"}, n_results=5, ranking=ranking)
+        assert [result["metadata"]["editor"] for result in results] == ["bob"]
+
+    writes.add(["The harbour was empty."], [metadata("human_edit", 1)], ["Test_Book_Book1_Chapter1_v1_human_edit"])
+    writes.flush()
+    assert len(search_index.search("harbour", n_results=5, ranking="lexical")) == 2
@@ -0,0 +1,105 @@
+import asyncio
+
+import pytest
+
+import llm_client
+import prompt_manager
+import review
+import speculation
+import spin_write
+
+
+def fake(mode="canned", responses=None, latency_s=0.0, error_rate=0.0):
+    return llm_client.FakeLLMClient("fake-model", latency_s=latency_s, jitter_s=0, error_rate=error_rate, mode=mode,
+                                    responses=responses)
+
+
+@pytest.fixture(autouse=True)
+def fresh_stats(tmp_path, monkeypatch):
+    monkeypatch.setattr(prompt_manager, "PROMPTS_FILE", str(tmp_path / "prompt_scores.json"))
+    monkeypatch.setattr(speculation, "stats", dict.fromkeys(speculation.stats, 0))
+
+
+def writer(spin_client):
+    spin_writer = spin_write.SpinWrite("fake-model", client=spin_client, summarize_client=fake())
+    spin_writer.prompt_scores = {
+        "vivid": {"template": "Make it vivid.\n\n", "score": 2.0},
+        "plain": {"template": "Make it plain.\n\n", "score": 1.0},
+        "retired": {"template": "Never chosen.\n\n", "score": -6.0},
+    }
+    return spin_writer
+
+
+def start(spin_writer, review_client=None):
+    reviewer = review.Review("fake-model", client=review_client or fake(responses=["Looks good."]))
+    return speculation.SpeculativeSpin(spin_writer, reviewer, "It was a dark night.", summary="A night.")
+
+
+def test_get_best_prompt_is_the_greedy_choice_without_side_effects():
+    scores = writer(fake()).prompt_scores
+    assert prompt_manager.get_best_prompt(scores) == ("vivid", "Make it vivid.\n\n")
+    assert prompt_manager.get_best_prompt({"retired": {"template": "x", "score": -6.0}}) == (None, None)
+
+
+def test_a_respin_with_the_guessed_prompt_uses_the_speculation():
+    spin_client = fake(mode="echo")
+
+    async def run():
+        speculative = start(writer(spin_client))
+        await asyncio.sleep(0.01) # The editor is still reading
+        assert speculative.ready()
+        return await speculative.take("vivid")
+
+    spun_text, review_text = asyncio.run(run())
+    assert spun_text.startswith("Make it vivid.") and spun_text.endswith("It was a dark night.")
+    assert review_text == "Looks good."
+    assert spin_client.calls == 1
+    assert speculation.stats["used"] == speculation.stats["used_ready"] == 1
+    assert speculation.stats["missed"] == 0
+
+
+def test_a_respin_with_another_prompt_drops_the_speculation():
+    spin_client = fake(mode="echo", latency_s=1.0)
+
+    async def run():
+        speculative = start(writer(spin_client))
+        result = await speculative.take("plain")
+        await asyncio.sleep(0) # Let the cancellation land
+        return speculative, result
+
+    speculative, result = asyncio.run(run())
+    assert result is None
+    assert speculative._task.cancelled()
+    assert speculation.stats["missed"] == 1
+    assert speculation.stats["used"] == 0
+
+
+def test_the_guess_is_checked_against_the_prompt_chosen_after_the_reward():
+    spin_writer = writer(fake(mode="echo"))
+
+    async def run():
+        speculative = start(spin_writer) # Guesses "vivid" while the editor reads
+        # The editor asks for a re-spin; its reward makes "plain" the better prompt
+        prompt_manager.update_prompt_score("vivid", -20.0, spin_writer.prompt_scores)
+        chosen_name, _ = prompt_manager.get_best_prompt(spin_writer.prompt_scores)
+        return chosen_name, await speculative.take(chosen_name)
+
+    assert asyncio.run(run()) == ("plain", None)
+    assert speculation.stats["missed"] == 1
+
+
+def test_discarded_and_failed_speculations_are_counted():
+    async def run():
+        discarded = start(writer(fake(mode="echo", latency_s=1.0)))
+        discarded.cancel() # The editor edited instead
+        failed = start(writer(fake(error_rate=1.0)))
+        failed_result = await failed.take("vivid")
+        review_failed = start(writer(fake(mode="echo")), review_client=fake(error_rate=1.0))
+        return failed_result, await review_failed.take("vivid")
+
+    failed_result, (spun_text, review_text) = asyncio.run(run())
+    assert failed_result is None
+    assert spun_text and review_text is None # A spin is still used without its review
+    assert speculation.stats == {"started": 3, "used": 1, "used_ready": 0, "missed": 0, "cancelled": 1,
+                                 "failed": 1, "wait_s": speculation.stats["wait_s"]}
+    assert "hit_rate=33%" in speculation.speculation_summary()
@@ -0,0 +1,81 @@
+import asyncio
+import re
+
+import pytest
+
+import config
+import llm_client
+import prompt_manager
+import spin_write
+
+
+def test_split_into_sections_packs_whole_paragraphs():
+    paragraphs = ["a" * 40, "b" * 40, "c" * 40, "d" * 150, "e" * 10]
+    sections = spin_write.split_into_sections("\n\n".join(paragraphs), max_chars=100)
+    assert sections == ["\n\n".join(paragraphs[:2]), paragraphs[2], paragraphs[3], paragraphs[4]]
+    # Nothing is lost or reordered, and only a single overlong paragraph exceeds the limit
+    assert "\n\n".join(sections) == "\n\n".join(paragraphs)
+    assert all(len(section) <= 100 for section in sections if "\n\n" in section)
+    assert spin_write.split_into_sections("One paragraph.", max_chars=100) == ["One paragraph."]
+
+
+class SectionClient(llm_client.FakeLLMClient):
+    """Answers 'part N of M' prompts with 'Spun N.'; later parts finish first, and fail_part raises."""
+    def __init__(self, fail_part=None):
+        super().__init__("fake-model", latency_s=0, jitter_s=0, error_rate=0)
+        self.fail_part = fail_part
+        self.prompts = []
+        self.finished = []
+        self.cancelled = 0
+
+    async def _generate(self, contents) -> str:
+        self.prompts.append(contents)
+        part, parts = map(int, re.search(r"part (\d+) of (\d+)", contents).groups())
+        try:
+            await asyncio.sleep(0.01 * (parts - part) + (1.0 if self.fail_part and part > self.fail_part else 0))
+        except asyncio.CancelledError:
+            self.cancelled += 1
+            raise
+        if part == self.fail_part:
+            raise llm_client.FakeLLMError(f"part {part} failed")
+        self.finished.append(part)
+        return f" Spun {part}. "
+
+
+@pytest.fixture
+def long_chapters(tmp_path, monkeypatch):
+    """Every chapter longer than 100 characters is spun in sections of at most 100."""
+    monkeypatch.setattr(prompt_manager, "PROMPTS_FILE", str(tmp_path / "prompt_scores.json"))
+    monkeypatch.setattr(config, "SPIN_CHUNK_THRESHOLD_CHARS", 100)
+    monkeypatch.setattr(config, "SPIN_SECTION_MAX_CHARS", 100)
+
+
+CHAPTER = "\n\n".join(f"Paragraph {n} " + "x" * 80 for n in range(1, 5)) # Four sections
+
+
+def spin(client):
+    spin_writer = spin_write.SpinWrite("fake-model", client=client, summarize_client=client)
+    streamed = []
+    spun_text, _ = asyncio.run(spin_writer.ai_spin_content(CHAPTER, "Rewrite.\n\n", summary="A summary.",
+                                                           on_chunk=streamed.append))
+    return spun_text, streamed
+
+
+def test_sections_are_spun_concurrently_and_streamed_in_order(long_chapters):
+    client = SectionClient()
+    spun_text, streamed = spin(client)
+    assert client.finished == [4, 3, 2, 1]
+    assert streamed == ["Spun 1.", "\n\nSpun 2.", "\n\nSpun 3.", "\n\nSpun 4."]
+    assert spun_text == "".join(streamed)
+    # Each section carries the template and the shared summary; no summarize call was made
+    assert len(client.prompts) == 4
+    assert all(p.startswith("Rewrite.") and "A summary." in p for p in client.prompts)
+
+
+def test_one_failed_section_fails_the_whole_spin(long_chapters):
+    client = SectionClient(fail_part=2)
+    spun_text, streamed = spin(client)
+    assert spun_text == spin_write.SPIN_ERROR_MESSAGE
+    assert spin_write.spin_failed(spun_text)
+    assert streamed == ["Spun 1."] # Sections before the failed one may already have been shown
+    assert client.cancelled == 2 # Parts 3 and 4 are not left running
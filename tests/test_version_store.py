@@ -0,0 +1,70 @@
+import version_store
+
+BASE_ID = "Test_Book_Book1_Chapter1"
+PARAGRAPHS = [f"Paragraph {i}: the ship sailed on through the grey morning, past the reef and the gulls."
+              for i in range(12)]
+
+
+def chapter_text(*edits):
+    paragraphs = list(PARAGRAPHS)
+    for index, text in edits:
+        paragraphs[index] = text
+    return "\n".join(paragraphs) + "\n"
+
+
+def test_delta_round_trip():
+    parent = chapter_text()
+    for text in (parent, chapter_text((3, "A new third paragraph.")), chapter_text((0, "Start")) + "An ending.\n",
+                 "", "No newline at the end"):
+        assert version_store.apply_delta(parent, version_store.make_delta(parent, text)) == text
+
+
+def test_delta_copies_unchanged_lines():
+    parent = chapter_text()
+    delta = version_store.make_delta(parent, chapter_text((5, "Only this paragraph changed.")))
+    inserted = [op[1] for op in delta if op[0] == "+"]
+    assert inserted == [["Only this paragraph changed.\n"]]
+
+
+def test_edits_are_stored_as_deltas_and_read_back(store):
+    texts = [chapter_text((i, f"Edit number {i}.")) for i in range(6)]
+    kinds = [store.put(f"{BASE_ID}_v{i + 1}_human_edit", text, {"type": "human_edit", "version": i + 1})
+             for i, text in enumerate(texts)]
+    # A snapshot starts the chain and another one every snapshot_interval versions
+    assert kinds == ["snapshot", "delta", "delta", "delta", "snapshot", "delta"]
+
+    reopened = version_store.VersionStore(store.path, cache_size=0)
+    for i, text in enumerate(texts):
+        assert reopened.get(f"{BASE_ID}_v{i + 1}_human_edit") == (text, {"type": "human_edit", "version": i + 1})
+    assert reopened.stats["deltas_applied"] > 0
+
+
+def test_reviews_are_chained_separately_from_chapter_text(store):
+    store.put(f"{BASE_ID}_v1_ai_spin", chapter_text(), {"type": "ai_spin"})
+    store.put(f"{BASE_ID}_v1_ai_review", "Too many gulls.", {"type": "ai_review"})
+    assert store.put(f"{BASE_ID}_v2_human_edit", chapter_text((1, "Fewer gulls.")), {"type": "human_edit"}) == "delta"
+    assert store.get(f"{BASE_ID}_v1_ai_review")[0] == "Too many gulls."
+
+
+def test_replacing_a_stored_version_keeps_its_children_readable(store):
+    store.put(f"{BASE_ID}_v1_ai_spin", chapter_text(), {"type": "ai_spin", "version": 1})
+    child = chapter_text((2, "Edited."))
+    assert store.put(f"{BASE_ID}_v2_human_edit", child, {"type": "human_edit", "version": 2}) == "delta"
+
+    store.put(f"{BASE_ID}_v1_ai_spin", "An entirely different spin.\n", {"type": "ai_spin", "version": 1})
+    reopened = version_store.VersionStore(store.path, cache_size=0)
+    assert reopened.get(f"{BASE_ID}_v1_ai_spin")[0] == "An entirely different spin.\n"
+    assert reopened.get(f"{BASE_ID}_v2_human_edit")[0] == child
+
+
+def test_chapter_documents_and_metadata_updates(store):
+    store.put(f"{BASE_ID}_v0_original", "Original.\n", {"type": "original", "version": 0})
+    store.put(f"{BASE_ID}_v1_ai_spin", "Spin.\n", {"type": "ai_spin", "version": 1})
+    store.put("Other_Book1_Chapter1_v0_original", "Other.\n", {"type": "original", "version": 0})
+
+    assert list(store.chapter_documents(BASE_ID)) == [f"{BASE_ID}_v0_original", f"{BASE_ID}_v1_ai_spin"]
+    assert store.stored_ids([f"{BASE_ID}_v1_ai_spin", f"{BASE_ID}_v2_ai_spin"]) == {f"{BASE_ID}_v1_ai_spin"}
+    assert store.update_metadata(f"{BASE_ID}_v0_original", {"reward": 1.0}) == {
+        "type": "original", "version": 0, "reward": 1.0}
+    assert store.get(f"{BASE_ID}_v0_original")[1]["reward"] == 1.0
+    assert store.update_metadata(f"{BASE_ID}_v9_ai_spin", {"reward": 1.0}) is None
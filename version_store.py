@@ -0,0 +1,248 @@
+# version_store.py
+import collections
+import difflib
+import json
+import os
+import re
+import sqlite3
+import time
+import config
+
+logger = config.logger
+
+VERSION_ID_PATTERN = re.compile(r"^(?P<chapter>.+)_v(?P<version>\d+)_(?P<kind>[a-z_]+)$")
+REVIEW_TYPES = ("ai_review", "ai_review_after_human")
+
+
+def make_delta(parent: str, text: str) -> list:
+    """
+    Line-level delta from parent to text: ["=", start, end] copies parent lines start:end,
+    ["+", lines] inserts new lines. Chapters are one paragraph per line, so an edited
+    paragraph costs its own length and untouched ones a few bytes each.
+    """
+    parent_lines = parent.splitlines(keepends=True)
+    lines = text.splitlines(keepends=True)
+    delta = []
+    matcher = difflib.SequenceMatcher(None, parent_lines, lines, autojunk=False)
+    for tag, i1, i2, j1, j2 in matcher.get_opcodes():
+        if tag == "equal":
+            delta.append(["=", i1, i2])
+        elif tag in ("replace", "insert"):
+            delta.append(["+", lines[j1:j2]])
+    return delta
+
+def apply_delta(parent: str, delta: list) -> str:
+    parent_lines = parent.splitlines(keepends=True)
+    out = []
+    for op in delta:
+        if op[0] == "=":
+            out.extend(parent_lines[op[1]:op[2]])
+        else:
+            out.extend(op[1])
+    return "".join(out)
+
+
+class VersionStore:
+    """
+    Every chapter version, stored in SQLite as either a full snapshot or a delta against
+    the chapter's previous version of the same kind (chapter text or review).
+
+    A version is stored as a snapshot when it starts a chapter, when the delta chain since
+    the last snapshot reaches snapshot_interval, or when its delta would not be smaller
+    than delta_max_ratio of the full text (a fresh AI spin shares little with the version
+    before it). Reading a delta walks back to the nearest snapshot or cached version and
+    replays the deltas; the last cache_size materialized versions are kept in an LRU.
+    """
+    def __init__(self, path: str = None, snapshot_interval: int = None, delta_max_ratio: float = None,
+                 cache_size: int = None):
+        self.path = path or config.VERSION_STORE_PATH
+        self.snapshot_interval = snapshot_interval or config.VERSION_SNAPSHOT_INTERVAL
+        self.delta_max_ratio = delta_max_ratio if delta_max_ratio is not None else config.VERSION_DELTA_MAX_RATIO
+        self.cache_size = cache_size if cache_size is not None else config.VERSION_CACHE_SIZE
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._conn = sqlite3.connect(self.path)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS versions ("
+            " seq INTEGER PRIMARY KEY AUTOINCREMENT, id TEXT UNIQUE, chapter_id TEXT, family TEXT,"
+            " kind TEXT, parent_id TEXT, chain_length INTEGER, body TEXT, metadata TEXT,"
+            " text_chars INTEGER, created_at REAL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS versions_chapter ON versions(chapter_id, family, seq)")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS versions_parent ON versions(parent_id)")
+        # Chapters whose versions written before the version store existed have been copied in
+        self._conn.execute("CREATE TABLE IF NOT EXISTS imported_chapters (chapter_id TEXT PRIMARY KEY, imported_at REAL)")
+        self._conn.commit()
+        self._cache = collections.OrderedDict() # id -> materialized text
+        self.stats = {"snapshots": 0, "deltas": 0, "text_chars": 0, "stored_chars": 0,
+                      "cache_hits": 0, "cache_misses": 0, "deltas_applied": 0}
+
+    @staticmethod
+    def chapter_id_of(doc_id: str) -> str:
+        match = VERSION_ID_PATTERN.match(doc_id)
+        return match.group("chapter") if match else doc_id
+
+    def put(self, doc_id: str, document: str, metadata: dict) -> str:
+        """Stores (or replaces) a version. Returns 'snapshot' or 'delta'."""
+        chapter_id = self.chapter_id_of(doc_id)
+        family = "review" if metadata.get("type") in REVIEW_TYPES else "text"
+        if self._conn.execute("SELECT 1 FROM versions WHERE id = ?", (doc_id,)).fetchone():
+            # Replacing a stored version: its children must not depend on the old text
+            self._detach_children(doc_id)
+            self._conn.execute("DELETE FROM versions WHERE id = ?", (doc_id,))
+            self._cache.pop(doc_id, None)
+
+        kind, parent_id, chain_length, body = "snapshot", None, 0, document
+        parent = self._conn.execute(
+            "SELECT id, chain_length FROM versions WHERE chapter_id = ? AND family = ? ORDER BY seq DESC LIMIT 1",
+            (chapter_id, family)).fetchone()
+        if parent is not None and parent[1] + 1 < self.snapshot_interval:
+            delta = json.dumps(make_delta(self._materialize(parent[0]), document), ensure_ascii=False)
+            if len(delta) < self.delta_max_ratio * len(document):
+                kind, parent_id, chain_length, body = "delta", parent[0], parent[1] + 1, delta
+
+        self._conn.execute(
+            "INSERT INTO versions (id, chapter_id, family, kind, parent_id, chain_length, body, metadata, text_chars, created_at)"
+            " VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            (doc_id, chapter_id, family, kind, parent_id, chain_length, body,
+             json.dumps(metadata, ensure_ascii=False), len(document), time.time()))
+        self._conn.commit()
+        self._remember(doc_id, document)
+        self.stats["snapshots" if kind == "snapshot" else "deltas"] += 1
+        self.stats["text_chars"] += len(document)
+        self.stats["stored_chars"] += len(body)
+        return kind
+
+    def put_many(self, ids: list, documents: list, metadatas: list):
+        for doc_id, document, metadata in zip(ids, documents, metadatas):
+            self.put(doc_id, document, metadata)
+
+    def get(self, doc_id: str):
+        """The (document, metadata) of a stored version, or None."""
+        row = self._conn.execute("SELECT metadata FROM versions WHERE id = ?", (doc_id,)).fetchone()
+        if row is None:
+            return None
+        return self._materialize(doc_id), json.loads(row[0])
+
+    def get_many(self, ids: list) -> dict:
+        """id -> (document, metadata) for the ids that are stored."""
+        found = {}
+        for doc_id in ids:
+            entry = self.get(doc_id)
+            if entry is not None:
+                found[doc_id] = entry
+        return found
+
+    def stored_ids(self, ids: list) -> set:
+        """The subset of ids that are stored, without materializing them."""
+        marks = ",".join("?" * len(ids))
+        return {row[0] for row in self._conn.execute(f"SELECT id FROM versions WHERE id IN ({marks})", ids)}
+
+    def chapter_documents(self, chapter_id: str) -> dict:
+        """id -> (document, metadata) for every stored version of a chapter, oldest first."""
+        rows = self._conn.execute(
+            "SELECT id, metadata FROM versions WHERE chapter_id = ? ORDER BY seq", (chapter_id,)).fetchall()
+        # Oldest first, so each delta's parent is normally materialized (and cached) just before it
+        return {doc_id: (self._materialize(doc_id), json.loads(metadata)) for doc_id, metadata in rows}
+
+    def all_metadata(self) -> list:
+        """(id, metadata) of every stored version, oldest first."""
+        rows = self._conn.execute("SELECT id, metadata FROM versions ORDER BY seq").fetchall()
+        return [(doc_id, json.loads(metadata)) for doc_id, metadata in rows]
+
+    def update_metadata(self, doc_id: str, metadata: dict) -> dict:
+        """Merges metadata into a stored version and returns the merged metadata (None if not stored)."""
+        row = self._conn.execute("SELECT metadata FROM versions WHERE id = ?", (doc_id,)).fetchone()
+        if row is None:
+            return None
+        merged = {**json.loads(row[0]), **metadata}
+        self._conn.execute("UPDATE versions SET metadata = ? WHERE id = ?", (json.dumps(merged, ensure_ascii=False), doc_id))
+        self._conn.commit()
+        return merged
+
+    def is_imported(self, chapter_id: str) -> bool:
+        return self._conn.execute(
+            "SELECT 1 FROM imported_chapters WHERE chapter_id = ?", (chapter_id,)).fetchone() is not None
+
+    def import_chapter(self, chapter_id: str, documents: dict) -> int:
+        """
+        Copies in a chapter's versions stored elsewhere before the version store existed
+        (id -> (document, metadata)), skipping ids it already holds, and marks the chapter
+        imported. Returns how many were copied.
+        """
+        stored = self.stored_ids(list(documents)) if documents else set()
+        rows = sorted(((doc_id, entry) for doc_id, entry in documents.items() if doc_id not in stored),
+                      key=lambda row: (row[1][1].get("version", 0), row[1][1].get("type") in REVIEW_TYPES))
+        for doc_id, (document, metadata) in rows:
+            self.put(doc_id, document, metadata)
+        self._conn.execute("INSERT OR REPLACE INTO imported_chapters (chapter_id, imported_at) VALUES (?, ?)",
+                           (chapter_id, time.time()))
+        self._conn.commit()
+        return len(rows)
+
+    def _materialize(self, doc_id: str) -> str:
+        if doc_id in self._cache:
+            self._cache.move_to_end(doc_id)
+            self.stats["cache_hits"] += 1
+            return self._cache[doc_id]
+        self.stats["cache_misses"] += 1
+        # Walk back to a snapshot or a cached version, then replay the deltas forward
+        chain = []
+        current = doc_id
+        while True:
+            if current in self._cache:
+                text = self._cache[current]
+                break
+            kind, parent_id, body = self._conn.execute(
+                "SELECT kind, parent_id, body FROM versions WHERE id = ?", (current,)).fetchone()
+            if kind == "snapshot":
+                text = body
+                break
+            chain.append(body)
+            current = parent_id
+        for body in reversed(chain):
+            text = apply_delta(text, json.loads(body))
+            self.stats["deltas_applied"] += 1
+        self._remember(doc_id, text)
+        return text
+
+    def _remember(self, doc_id: str, text: str):
+        if not self.cache_size:
+            return
+        self._cache[doc_id] = text
+        self._cache.move_to_end(doc_id)
+        while len(self._cache) > self.cache_size:
+            self._cache.popitem(last=False)
+
+    def _detach_children(self, doc_id: str):
+        """Rewrites the versions stored as deltas of doc_id as snapshots."""
+        children = self._conn.execute("SELECT id FROM versions WHERE parent_id = ?", (doc_id,)).fetchall()
+        for (child_id,) in children:
+            self._detach_children(child_id)
+            text = self._materialize(child_id)
+            self._conn.execute(
+                "UPDATE versions SET kind = 'snapshot', parent_id = NULL, chain_length = 0, body = ? WHERE id = ?",
+                (text, child_id))
+
+    def summary(self) -> str:
+        ratio = self.stats["stored_chars"] / self.stats["text_chars"] if self.stats["text_chars"] else 0.0
+        return (f"snapshots={self.stats['snapshots']} deltas={self.stats['deltas']} "
+                f"stored={self.stats['stored_chars']}/{self.stats['text_chars']} chars ({ratio:.0%}) "
+                f"cache_hits={self.stats['cache_hits']} cache_misses={self.stats['cache_misses']} "
+                f"deltas_applied={self.stats['deltas_applied']}")
+
+
+def is_searchable(metadata: dict) -> bool:
+    """Whether a version is embedded in ChromaDB (see config.SEARCHABLE_VERSION_TYPES)."""
+    return metadata.get("type") in config.SEARCHABLE_VERSION_TYPES
+
+
+_version_store = None
+
+def get_version_store() -> VersionStore:
+    """Returns the process-wide version store."""
+    global _version_store
+    if _version_store is None:
+        _version_store = VersionStore()
+    return _version_store